@@ -2,35 +2,97 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+# babel, dateutil, forms (WTForms), importer, export, series, matviews and jobs are imported where
+# they are used, so a worker does not pay for them before it needs them (see create_app)
 import json
-from operator import truediv
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import os
+from flask import Blueprint, Flask, current_app, g, render_template, request, Response, flash, redirect, url_for, abort, jsonify, session, stream_with_context
 import logging
-from logging import ERROR, Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-import datetime
-from datetime import datetime
+from logging import Formatter, FileHandler
+from flask.cli import AppGroup
+import click
+from datetime import datetime, timedelta
 import sys
-import models
-from models import db, Venue, Artist, Show
+import threading
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import contains_eager
+from models import db, Venue, Artist, Show, ShowSeries, DeletionJob, Job, Genre, venue_genre, artist_genre
+import search
+import counters
+import cache
+import instrumentation
+import metrics
+import snapshot
+import autocomplete
+import bookings
+import assets
+import formatting
+import routing
+import deletions
+
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-# TODO: connect to a local postgresql database
-# from https://stackoverflow.com/questions/9692962/flask-sqlalchemy-import-context-issue/9695045#9695045
-db.init_app(app)
-migrate = Migrate(app, db)
+# commands are registered at the top level (`flask import`, not `flask main import`)
+bp = Blueprint('main', __name__, cli_group=None)
+# the page cache's backend, and the index's budget, come from the config in create_app()
+page_cache = cache.Cache(None)
+home_snapshot = snapshot.Snapshot(snapshot.build_home)
+name_index = autocomplete.PrefixIndex(None)
+# set to have this worker's job runner look for due jobs right away (e.g. a deletion's)
+jobs_wake = threading.Event()
+
+
+def create_app(config=None):
+    """
+    Builds the app from config.py, with the settings in the config mapping
+    (if any) applied on top.
+    """
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if config:
+        app.config.update(config)
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        # compiled templates are kept on disk, so new workers skip compiling them;
+        # this has to be set before app.jinja_env is first used
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(
+            app.config['JINJA_BYTECODE_CACHE_DIR']))
+    # TODO: connect to a local postgresql database
+    # from https://stackoverflow.com/questions/9692962/flask-sqlalchemy-import-context-issue/9695045#9695045
+    replicas = routing.init_app(app)
+    db.init_app(app)
+    # Flask-Migrate imports alembic, which only the `flask db` commands need
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    page_cache.backend = cache.create_backend(app.config)
+    # a replica lagging behind an edit could otherwise put the edited page's old version back
+    page_cache.hold = app.config['REPLICA_PIN_SECONDS'] if replicas else 0
+    fragment_cache = cache.init_fragment_cache(app, page_cache)
+    instrumentation.init_app(app)
+    metrics.init_app(app, db, {'page': page_cache, 'fragment': fragment_cache})
+    name_index.max_entries = app.config['AUTOCOMPLETE_MAX_ENTRIES']
+    assets.init_app(app)
+    app.register_blueprint(bp)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    if app.config['PREWARM_TEMPLATES']:
+        # compile (or load from the bytecode cache) every template now rather than on first use
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+    return app
 
 
 #----------------------------------------------------------------------------#
@@ -38,112 +100,203 @@ migrate = Migrate(app, db)
 #----------------------------------------------------------------------------#
 
 
+@bp.before_app_request
+def load_display_settings():
+    g.locale, g.timezone = formatting.request_settings(
+        current_app.config, request.cookies, request.accept_languages)
+
+
+def default_display():
+    # pages rendered in another locale or time zone must not be served from (or stored in) the page cache
+    config = current_app.config
+    return g.locale == config['DEFAULT_LOCALE'] and g.timezone == config['SHOW_TIMEZONE']
+
+
+@bp.app_template_global()
+def display_settings():
+    # part of the {% cache %} key of fragments containing formatted dates
+    config = current_app.config
+    return f"{g.get('locale', config['DEFAULT_LOCALE'])}/{g.get('timezone', config['SHOW_TIMEZONE'])}"
+
+
+@bp.app_template_filter('datetime')
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    # shows' naive start times are in SHOW_TIMEZONE; outside a request the defaults apply
+    config = current_app.config
+    return formatting.format_datetime(
+        value, format, locale=g.get('locale', config['DEFAULT_LOCALE']),
+        timezone=g.get('timezone'), stored_timezone=config['SHOW_TIMEZONE'])
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
 
-app.jinja_env.filters['datetime'] = format_datetime
+
+def search_page(data, total, offset, limit):
+    # offsets for the previous/next result pages, None when there is no such page
+    return {
+        "count": total,
+        "data": data,
+        "prev_offset": max(offset - limit, 0) if offset > 0 else None,
+        "next_offset": offset + limit if offset + limit < total else None
+    }
+
+
+def keyset_page(query, keys, after, before, limit):
+    """
+    Returns (rows, has_prev, has_next) for one page of query ordered by the
+    key columns, starting after the key tuple `after` or ending before the key
+    tuple `before`. Only limit + 1 rows are ever read, however deep the page.
+    """
+    key = db.tuple_(*keys)
+    if before is not None:
+        rows = query.filter(key < before).order_by(
+            *[column.desc() for column in keys]).limit(limit + 1).all()
+        return rows[:limit][::-1], len(rows) > limit, True
+    if after is not None:
+        query = query.filter(key > after)
+    rows = query.order_by(*keys).limit(limit + 1).all()
+    return rows[:limit], after is not None, len(rows) > limit
+
+
+def page_cursor(arg, *types):
+    # cursors are the key values joined with '_', e.g. ?after=2021-09-27T20:00:00_42
+    value = request.args.get(arg)
+    if value is None:
+        return None
+    try:
+        parts = value.split('_')
+        if len(parts) != len(types):
+            raise ValueError(value)
+        return tuple(parse(part) for parse, part in zip(types, parts))
+    except ValueError:
+        abort(400)
+
+
+def make_cursor(*values):
+    return '_'.join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values)
+
+
+def page_keys(kind, entity_ids):
+    """
+    Returns the page cache keys of the venues (kind 'venue') or artists with
+    entity_ids, and of the artists or venues they have shows with, whose
+    pages show their names and images.
+    """
+    if kind == 'venue':
+        column, other_kind, other_column = Show.venue_id, 'artist', Show.artist_id
+    else:
+        column, other_kind, other_column = Show.artist_id, 'venue', Show.venue_id
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return []
+    other_ids = [other_id for other_id, in db.session.query(other_column).filter(column.in_(entity_ids)).distinct()]
+    # SQL: SELECT DISTINCT artist_id FROM show WHERE venue_id IN ({IDS});
+    return [f'{kind}:{entity_id}' for entity_id in entity_ids] + [f'{other_kind}:{other_id}' for other_id in other_ids]
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@bp.route('/')
 def index():
-    now = datetime.now()
-    # also db.desc(), from https://github.com/pallets/flask-sqlalchemy/issues/451
-    artists = Artist.query.order_by(Artist.id.desc()).limit(10).all()
-    # SQL: SELECT * FROM artist LIMIT 10 ORDER BY id DESC;
-    venues = Venue.query.order_by(Venue.id.desc()).limit(10).all()
-    # SQL: SELECT * FROM venue LIMIT 10 ORDER BY id DESC;
-    artist_data = [{"id": artist.id, "name": artist.name}
-                   for artist in artists]
-    venue_data = [{"id": venue.id, "name": venue.name, "num_upcoming_shows": Show.query.filter_by(
-        venue_id=venue.id).filter(Show.start_time > now).count()} for venue in venues]
-    # SQL: SELECT COUNT(*) FROM show WHERE venue_id={VENUE_ID} AND start_time={START_TIME};
-    return render_template('pages/home.html', artist_data=artist_data, venue_data=venue_data)
+    # served from the snapshot kept by the background refresher, so this never queries the database
+    config = current_app.config
+    data = home_snapshot.get(config['HOME_SNAPSHOT_FIRST_WAIT'], config['HOME_SNAPSHOT_MAX_STALENESS'])
+    if data is None:
+        abort(503)
+    return render_template('pages/home.html', artist_data=data['artist_data'], venue_data=data['venue_data'])
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
 def venues():
     # TODO: replace with real venues data.
     #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
 
     data = []
-    citystates = db.session.query(
-        Venue.state, Venue.city).distinct(Venue.state, Venue.city).all()
-    # SQL: SELECT DISTINCT state, city FROM venue;
-    now = datetime.now()
-    for cstate in citystates:
-        venues = db.session.query(
-            Venue.id, Venue.name).filter_by(city=cstate[1], state=cstate[0]).all()
-        # SQL: SELECT id, name FROM venue WHERE city='{CITY}' AND state={STATE};
-        data.append({
-            "city": cstate[1],
-            "state": cstate[0],
-            "venues": [{"id": venue.id, "name": venue.name, "num_upcoming_shows": Show.query.filter_by(venue_id=venue.id).filter(Show.start_time > now).count()} for venue in venues]
-        })
+    from_views = False
+    if current_app.config['LISTINGS_FROM_VIEWS']:
+        import matviews
+        from_views = matviews.available()
+    if from_views:
+        summary = matviews.VenueAreaSummary
+        rows = db.session.query(
+            summary.state, summary.city, summary.venue_id, summary.venue_name, summary.version,
+            summary.upcoming_shows_count).filter(summary.venue_id.notin_(
+                db.session.query(Venue.id).filter(Venue.deleted_at.isnot(None)))).order_by(
+            summary.state, summary.city, summary.venue_id).all()
+        # the view is only refreshed periodically, so venues deleted since are left out here
+        # SQL: SELECT state, city, venue_id, venue_name, version, upcoming_shows_count FROM venue_area_summary
+        # WHERE venue_id NOT IN (SELECT id FROM venue WHERE deleted_at IS NOT NULL) ORDER BY state, city, venue_id;
+    else:
+        rows = db.session.query(
+            Venue.state, Venue.city, Venue.id, Venue.name, Venue.version, Venue.upcoming_shows_count).filter(
+            Venue.deleted_at.is_(None)).order_by(Venue.state, Venue.city, Venue.id).all()
+        # SQL: SELECT state, city, id, name, version, upcoming_shows_count FROM venue WHERE deleted_at IS NULL
+        # ORDER BY state, city, id;
+    # rows arrive sorted by (state, city), so areas can be grouped in a single pass
+    for state, city, venue_id, name, version, num_upcoming_shows in rows:
+        if not data or data[-1]['state'] != state or data[-1]['city'] != city:
+            data.append({
+                "city": city,
+                "state": state,
+                "venues": []
+            })
+        data[-1]['venues'].append(
+            {"id": venue_id, "name": name, "version": version, "num_upcoming_shows": num_upcoming_shows})
     return render_template('pages/venues.html', areas=data)
 
 
-@app.route('/venues/search', methods=['POST'])
+@bp.route('/venues/search', methods=['POST'])
+@routing.read_only
 def search_venues():
-    error = True
     try:
         # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
         # search for Hop should return "The Musical Hop".
         # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-        # from https://stackoverflow.com/questions/40535547/flask-sqlalchemy-filter-by-value-or-another/40546355
-        search_term = str(request.form.get('search_term', '')) 
-        if len(search_term.split(',')) > 1:
-            rsearch = str(request.form.get('search_term', '')).split(',')
-            csearch = f'%{rsearch[0]}%'
-            ssearch = f'%{rsearch[1]}%'
-            venues = Venue.query.filter(Venue.city.ilike(
-                csearch) | Venue.state.ilike(ssearch)).all()
-        else:
-            param = f'%{search_term}%'
-            venues = Venue.query.filter(Venue.name.ilike(
-                param) | Venue.city.ilike(param) | Venue.state.ilike(param)).all()
-
-        # SQL: SELECT * FROM venue WHERE name LIKE '%{SEARCH}%';
-        data = []
-        now = datetime.now()
-        data = [{"id": venue.id, "name": venue.name, "num_upcoming_shows": Show.query.filter_by(
-            venue_id=venue.id).filter(Show.start_time > now).count()} for venue in venues]
-        # SQL: SELECT * FROM show WHERE venue_id={VENUE_ID} AND start_time > NOW();
-        response = {
-            "count": len(data),
-            "data": data
-        }
-        return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+        search_term = str(request.form.get('search_term', ''))
+        offset = request.form.get('offset', 0, type=int)
+        limit = current_app.config['SEARCH_PAGE_SIZE']
+        venues, total = search.search(
+            Venue, search_term, limit=limit, offset=offset)
+        data = [{"id": venue.id, "name": venue.name,
+                 "num_upcoming_shows": venue.upcoming_shows_count} for venue in venues]
+        response = search_page(data, total, offset, limit)
+        return render_template('pages/search_venues.html', results=response, search_term=search_term)
     except:
         abort(500)
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
     # show venue, venue shows and venue artist
+    key = f'venue:{venue_id}'
+    # a page rendered with pending flash messages belongs to one user, so it bypasses the cache,
+    # as does one rendered in another locale or time zone
+    cacheable = not session.get('_flashes') and default_display()
+    # a client pinned to the primary after a write must not be served a page cached from a replica
+    page = page_cache.get(key) if cacheable and not routing.pinned() else None
+    if page is not None:
+        return page
     try:
-        db_venue = Venue.query.filter_by(id=venue_id).first()
+        # the first row carries the venue with all of its shows and their artists
+        db_venue = Venue.query.outerjoin(Venue.shows).outerjoin(Show.artist).options(
+            contains_eager(Venue.shows).contains_eager(Show.artist)).filter(
+            Venue.id == venue_id, Venue.deleted_at.is_(None)).order_by(Show.start_time).all()[0]
+        # SQL: SELECT * FROM venue LEFT OUTER JOIN show ON show.venue_id = venue.id
+        # LEFT OUTER JOIN artist ON artist.id = show.artist_id WHERE venue.id={VENUE_ID} AND venue.deleted_at IS NULL
+        # ORDER BY show.start_time;
         now = datetime.now()
-        past_shows = Show.query.filter_by(
-            venue_id=venue_id).filter(Show.start_time < now).join('artist').all()
-        # SQL: SELECT * FROM show WHERE venue_id={VENUE_ID} AND start_time < NOW();
-        upcoming_shows = Show.query.filter_by(
-            venue_id=venue_id).filter(Show.start_time > now).join('artist').all()
-        # SQL: SELECT * FROM show WHERE venue_id={VENUE_ID} AND start_time > NOW();
+        # shows of a deleted artist are still there until their remove-deleted job reaches them
+        shows = [show for show in db_venue.shows if show.artist.deleted_at is None]
+        past_shows = [show for show in shows if show.start_time <= now]
+        upcoming_shows = [show for show in shows if show.start_time > now]
         venue = {
             "id": venue_id,
             "name": db_venue.name,
@@ -158,31 +311,36 @@ def show_venue(venue_id):
             "seeking_description": db_venue.seeking_description,
             "image_link": db_venue.image_link,
             "past_shows": [{"artist_id": show.artist.id, "artist_name": show.artist.name, "artist_image_link": show.artist.image_link, "start_time": show.start_time} for show in past_shows],
-            "upcoming_shows": [{"artist_id": show.artist.id, "artist_name": show.artist.name, "artist_image_link": show.artist.image_link, "start_time": show.start_time} for show in past_shows],
+            "upcoming_shows": [{"artist_id": show.artist.id, "artist_name": show.artist.name, "artist_image_link": show.artist.image_link, "start_time": show.start_time} for show in upcoming_shows],
             "past_shows_count": len(past_shows),
             "upcoming_shows_count": len(upcoming_shows),
         }
-        return render_template('pages/show_venue.html', venue=venue)
+        page = render_template('pages/show_venue.html', venue=venue)
     except:
         abort(404)
+    if cacheable:
+        page_cache.set(key, page, replace_invalidated=not routing.on_replica())
+    return page
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
 
     # on successful db insert, flash success
+    from forms import VenueForm
     form = VenueForm()
     error = False
 
@@ -200,12 +358,16 @@ def create_venue_submission():
             seeking_talent = form.seeking_talent.data
             seeking_description = form.seeking_description.data
             venue = Venue(name=name, genres=genres, city=city, state=state, address=address, phone=phone,
-                          website_link=website_link, image_link=image_link, facebook_link=facebook_link, seeking_talent=seeking_talent, seeking_description=seeking_description)
+                          website_link=website_link, image_link=image_link, facebook_link=facebook_link, seeking_talent=seeking_talent, seeking_description=seeking_description,
+                          genre_list=Genre.from_names(form.genres.data))
             # SQL: INSERT INTO venue (name, genres, city, state, address, phone, website_link, image_link, facebook_link, seeking_talent, seeking_description)
             # VALUES({NAME},{GENRES},{CITY},{STATE},{ADDRESS},{PHONE},{WEBSITE_LINK},{IMAGE_LINK},{FACEBOOK_LINK},{SEEKING_TALENT},{SEEKING_DESCRIPTION})
             db.session.add(venue)
             db.session.commit()
             db.session.refresh(venue)
+            search.index_entity(venue)
+            name_index.update(venue)
+            home_snapshot.refresh_soon()
             data = venue
             flash(f'Venue {data.name} was successfully created!')
         else:
@@ -226,94 +388,176 @@ def create_venue_submission():
         if error:
             abort(500)
         else:
-            return redirect(url_for('venues'))
+            return redirect(url_for('.venues'))
+
 
+def queue_deletion(entity_type, entity_id, list_url):
+    """
+    Soft-deletes the venue or artist and hides it everywhere right away; a
+    remove-deleted job then removes its shows in batches. The response carries
+    the URL of the job's progress.
+    """
+    model = deletions.ENTITIES[entity_type][0]
+    error = False
+    job = None
+    response = {'url': '', 'error': 0}
+    try:
+        # read before the shows start going away
+        keys = page_keys(entity_type, [entity_id])
+        job = deletions.soft_delete(entity_type, entity_id, datetime.now())
+        if job is not None:
+            db.session.commit()
+            response['status_url'] = url_for('.deletion_status', job_id=job.id)
+            search.unindex_entity(model, entity_id)
+            name_index.remove(model, entity_id)
+            page_cache.invalidate(*keys)
+            home_snapshot.refresh_soon()
+            jobs_wake.set()
+    except:
+        db.session.rollback()
+        error = True
+    finally:
+        db.session.close()
+
+    if not error and job is None:
+        abort(404)
+    if not error:
+        response['url'] = list_url
+    else:
+        response['error'] = 1
+    return jsonify(response), 500 if error else 202
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
     # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
     # clicking that button delete it from the db then redirect the user to the homepage
+    return queue_deletion('venue', venue_id, '/venues')
+
+
+@bp.route('/deletions/<int:job_id>')
+def deletion_status(job_id):
+    deletion = DeletionJob.query.get_or_404(job_id)
+    # SQL: SELECT * FROM deletion_job WHERE id={JOB_ID};
+    # deletions finished before they ran as jobs, or whose job was archived, have none
+    job = deletion.job or Job(status='done', attempts=0)
+    # SQL: SELECT * FROM job WHERE id={DELETION_JOB_JOB_ID};
+    status = 'done' if deletion.finished_at else job.status
+    return jsonify({
+        "id": deletion.id,
+        "type": deletion.entity_type,
+        "entity_id": deletion.entity_id,
+        "status": status,
+        "total_shows": deletion.total_shows,
+        "removed_shows": deletion.removed_shows,
+        "attempts": job.attempts,
+        "retry_at": job.run_at.isoformat() if status == 'pending' and job.error else None,
+        "error": job.error,
+        "created_at": deletion.created_at.isoformat(),
+        "started_at": deletion.started_at.isoformat() if deletion.started_at else None,
+        "finished_at": deletion.finished_at.isoformat() if deletion.finished_at else None,
+    })
+
+
+@bp.route('/deletions/<int:job_id>/retry', methods=['POST'])
+def retry_deletion(job_id):
+    # gives a deletion that failed for good another round of attempts
+    import jobs
+    deletion = DeletionJob.query.get_or_404(job_id)
     error = False
-    response = {'url': '', 'error': 0}
+    requeued = False
     try:
-        Venue.query.filter_by(id=venue_id).delete()
-        # SQL: DELETE FROM venue WHERE id={ID};
+        requeued = jobs.requeue(deletion.job_id, datetime.now())
         db.session.commit()
     except:
         db.session.rollback()
         error = True
     finally:
         db.session.close()
+    if requeued:
+        jobs_wake.set()
+    response = {'status_url': url_for('.deletion_status', job_id=job_id), 'error': 1 if error else 0}
+    if error:
+        return jsonify(response), 500
+    # only failed jobs can be retried
+    return jsonify(response), 202 if requeued else 409
+
 
-    if not error:
-        response['url'] = '/venues'
-    else:
-        response['error'] = 1
-    return jsonify(response)
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@bp.route('/artists')
 def artists():
+    after = page_cursor('after', int)
+    before = page_cursor('before', int)
     try:
         # TODO: replace with real data returned from querying the database
-        artists = Artist.query.all()
-        # SQL: SELECT * FROM artist;
-        data = [{"id": artist.id, "name": artist.name} for artist in artists]
-        return render_template('pages/artists.html', artists=data)
+        artists, has_prev, has_next = keyset_page(
+            db.session.query(Artist.id, Artist.name, Artist.version).filter(Artist.deleted_at.is_(None)), [Artist.id],
+            after, before, current_app.config['PAGE_SIZE'])
+        # SQL: SELECT id, name, version FROM artist WHERE deleted_at IS NULL AND id > {AFTER} ORDER BY id LIMIT {PAGE_SIZE} + 1;
+        data = [{"id": artist.id, "name": artist.name, "version": artist.version} for artist in artists]
+        pages = {
+            "prev": url_for('.artists', before=make_cursor(artists[0].id)) if artists and has_prev else None,
+            "next": url_for('.artists', after=make_cursor(artists[-1].id)) if artists and has_next else None
+        }
+        return render_template('pages/artists.html', artists=data, pages=pages)
     except:
         abort(500)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
+@routing.read_only
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
     try:
-        search_term = str(request.form.get('search_term', '')) 
-        if len(search_term.split(',')) > 1:
-            rsearch = search_term.split(',')
-            csearch = f'%{rsearch[0]}%'
-            ssearch = f'%{rsearch[1]}%'
-            artists = Artist.query.filter(Artist.city.ilike(
-                csearch) | Artist.state.ilike(ssearch)).all()
-        else:
-            param = f'%{search_term}%'
-            artists = Artist.query.filter(Artist.name.ilike(
-                param) | Artist.city.ilike(param) | Artist.state.ilike(param)).all()
-        # SQL: SELECT * FROM artist WHERE name LIKE '%{SEARCH}%';
-        now = datetime.now()
-        data = [{"id": artist.id, "name": artist.name, "num_upcoming_shows": Show.query.filter_by(artist_id=artist.id).filter(Show.start_time > now).count()}
+        search_term = str(request.form.get('search_term', ''))
+        offset = request.form.get('offset', 0, type=int)
+        limit = current_app.config['SEARCH_PAGE_SIZE']
+        artists, total = search.search(
+            Artist, search_term, limit=limit, offset=offset)
+        data = [{"id": artist.id, "name": artist.name, "num_upcoming_shows": artist.upcoming_shows_count}
                 for artist in artists]
-        # SQL: SELECT * FROM show WHERE artist_id={ARTIST_ID} AND start_time > NOW();
-
-        response = {
-            "count": len(data),
-            "data": data
-        }
-        return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+        response = search_page(data, total, offset, limit)
+        return render_template('pages/search_artists.html', results=response, search_term=search_term)
     except:
         abort(500)
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/autocomplete')
+def autocomplete_names():
+    # served from this worker's prefix index; no database access
+    # empty until the first build finishes
+    suggestions = name_index.lookup(request.args.get('q', ''), current_app.config['AUTOCOMPLETE_LIMIT'])
+    return jsonify(suggestions=suggestions)
+
+
+@bp.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     # TODO: replace with real artist data from the artist table, using artist_id
+    key = f'artist:{artist_id}'
+    cacheable = not session.get('_flashes') and default_display()
+    # a client pinned to the primary after a write must not be served a page cached from a replica
+    page = page_cache.get(key) if cacheable and not routing.pinned() else None
+    if page is not None:
+        return page
     try:
-        db_artist = Artist.query.filter_by(id=artist_id).first()
-        # SQL: SELECT * FROM artist WHERE id={ID} LIMIT 1;
+        db_artist = Artist.query.outerjoin(Artist.shows).outerjoin(Show.venue).options(
+            contains_eager(Artist.shows).contains_eager(Show.venue)).filter(
+            Artist.id == artist_id, Artist.deleted_at.is_(None)).order_by(Show.start_time).all()[0]
+        # SQL: SELECT * FROM artist LEFT OUTER JOIN show ON show.artist_id = artist.id
+        # LEFT OUTER JOIN venue ON venue.id = show.venue_id WHERE artist.id={ARTIST_ID} AND artist.deleted_at IS NULL
+        # ORDER BY show.start_time;
         now = datetime.now()
-        past_shows = Show.query.filter_by(artist_id=artist_id).filter(
-            Show.start_time < now).join('venue').all()
-        # SQL: SELECT * FROM show INNER JOIN venue ON show.venue_id = venue.id WHERE artist_id = {ARTIST_ID} AN start_time < NOW();
-        upcoming_shows = Show.query.filter_by(artist_id=artist_id).filter(
-            Show.start_time > now).join('venue').all()
-        # SQL: SELECT * FROM show INNER JOIN venue ON show.venue_id = venue.id WHERE artist_id = {ARTIST_ID} AN start_time > NOW();
+        shows = [show for show in db_artist.shows if show.venue.deleted_at is None]
+        past_shows = [show for show in shows if show.start_time <= now]
+        upcoming_shows = [show for show in shows if show.start_time > now]
 
         data = {
             "id": db_artist.id,
@@ -327,26 +571,35 @@ def show_artist(artist_id):
             "seeking_venue": db_artist.seeking_venue,
             "seeking_description": db_artist.seeking_description,
             "image_link": db_artist.image_link,
-            "past_shows": [{"venue_id": show.venue.id, "venue_name": show.venue.name, "venue_image_link": show.venue.image_link, "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S")} for show in past_shows],
-            "upcoming_shows": [{"venue_id": show.venue.id, "venue_name": show.venue.name, "venue_image_link": show.venue.image_link, "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S")} for show in upcoming_shows],
+            "past_shows": [{"venue_id": show.venue.id, "venue_name": show.venue.name, "venue_image_link": show.venue.image_link, "start_time": show.start_time} for show in past_shows],
+            "upcoming_shows": [{"venue_id": show.venue.id, "venue_name": show.venue.name, "venue_image_link": show.venue.image_link, "start_time": show.start_time} for show in upcoming_shows],
             "past_shows_count": len(past_shows),
             "upcoming_shows_count": len(upcoming_shows),
         }
-        return render_template('pages/show_artist.html', artist=data)
+        page = render_template('pages/show_artist.html', artist=data)
     except:
         abort(404)
+    if cacheable:
+        page_cache.set(key, page, replace_invalidated=not routing.on_replica())
+    return page
+
+
+@bp.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    return queue_deletion('artist', artist_id, '/artists')
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     # TODO: populate form with fields from artist with ID <artist_id>
     error = False
     try:
+        from forms import ArtistForm
         form = ArtistForm()
-        db_artist = Artist.query.filter_by(id=artist_id).first()
-        # SQL: SELECT * FROM artist WHERE id={ID} LIMIT 1;
+        db_artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first()
+        # SQL: SELECT * FROM artist WHERE id={ID} AND deleted_at IS NULL LIMIT 1;
         artist = {
             "id": db_artist.id,
             "name": db_artist.name,
@@ -372,18 +625,20 @@ def edit_artist(artist_id):
             abort(404)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # # artist record with ID <artist_id> using the new attributes
     error = False
+    from forms import ArtistForm
     form = ArtistForm()
     try:
         if form.validate():
-            artist = Artist.query.filter_by(id=artist_id).first()
-            # SQL: SELECT * FROM artist WHERE id={ARTIST_ID} LIMIT 1;
+            artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first()
+            # SQL: SELECT * FROM artist WHERE id={ARTIST_ID} AND deleted_at IS NULL LIMIT 1;
             artist.name = form.name.data
             artist.genres = ','.join(form.genres.data)
+            artist.genre_list = Genre.from_names(form.genres.data)
             artist.city = form.city.data
             artist.state = form.state.data
             artist.phone = form.phone.data
@@ -392,10 +647,15 @@ def edit_artist_submission(artist_id):
             artist.image_link = form.image_link.data
             artist.seeking_venue = form.seeking_venue.data
             artist.seeking_description = form.seeking_description.data
-            # UPDATE artist SET name={NAME}, genres={GENRES}, city={CITY}, state={STATE}, phone={PHONE},website_link={WEBSITE_LINK},
+            artist.version = Artist.version + 1
+            # UPDATE artist SET version = version + 1, name={NAME}, genres={GENRES}, city={CITY}, state={STATE}, phone={PHONE},website_link={WEBSITE_LINK},
             # facebook_link={FACEBOOK_LINK}, image_link={IMAGE_LINK}, seeking_venue={SEEKING_VENUE}, seeking_description={SEEKING_DESCRIPTION}
             # WHERE id={ID};
             db.session.commit()
+            search.index_entity(artist)
+            name_index.update(artist)
+            page_cache.invalidate(*page_keys('artist', [artist_id]))
+            home_snapshot.refresh_soon()
             flash(f'Artist {form.name.data} was successfully modified!')
         else:
             flash(f'The input had the following errors: {form.errors}')
@@ -407,19 +667,20 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
         if not error:
-            return redirect(url_for('show_artist', artist_id=artist_id))
+            return redirect(url_for('.show_artist', artist_id=artist_id))
         else:
             abort(500)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # TODO: populate form with values from venue with ID <venue_id>
     error = False
     try:
+        from forms import VenueForm
         form = VenueForm()
-        db_venue = Venue.query.filter_by(id=venue_id).first()
-        # SQL: SELECT * FROM venue WHERE id={ID} LIMIT 1;
+        db_venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first()
+        # SQL: SELECT * FROM venue WHERE id={ID} AND deleted_at IS NULL LIMIT 1;
         venue = {
             "id": venue_id,
             "name": db_venue.name,
@@ -446,18 +707,20 @@ def edit_venue(venue_id):
             abort(404)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
     error = False
+    from forms import VenueForm
     form = VenueForm()
     try:
         if form.validate():
-            venue = Venue.query.filter_by(id=venue_id).first()
-            # SQL: SELECT * FROM venue WHERE id={ID} LIMIT 1;
+            venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first()
+            # SQL: SELECT * FROM venue WHERE id={ID} AND deleted_at IS NULL LIMIT 1;
             venue.name = form.name.data
             venue.genres = ','.join(form.genres.data)
+            venue.genre_list = Genre.from_names(form.genres.data)
             venue.city = form.city.data
             venue.state = form.state.data
             venue.address = form.address.data
@@ -467,10 +730,15 @@ def edit_venue_submission(venue_id):
             venue.facebook_link = form.facebook_link.data
             venue.seeking_talent = form.seeking_talent.data
             venue.seeking_description = form.seeking_description.data
-            # UPDATE venue SET name={NAME}, genres={GENRES}, city={CITY}, state={STATE}, address={ADDRESS}, phone={PHONE},
+            venue.version = Venue.version + 1
+            # UPDATE venue SET version = version + 1, name={NAME}, genres={GENRES}, city={CITY}, state={STATE}, address={ADDRESS}, phone={PHONE},
             # website_link={WEBSITE_LINK}, image_link={IMAGE_LINK}, facebook_link={FACEBOOK_LINK}, seeking_talent={SEEKING_TALENT},
             # seeking_description = {SEEKING_DESCRIPTION} WHERE id={ID};
             db.session.commit()
+            search.index_entity(venue)
+            name_index.update(venue)
+            page_cache.invalidate(*page_keys('venue', [venue_id]))
+            home_snapshot.refresh_soon()
             flash(f'Venue {form.name.data} was successfully modified!')
         else:
             flash(f'The input had the following errors: {form.errors}')
@@ -482,7 +750,7 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
         if not error:
-            return redirect(url_for('show_venue', venue_id=venue_id))
+            return redirect(url_for('.show_venue', venue_id=venue_id))
         else:
             abort(500)
 
@@ -490,18 +758,20 @@ def edit_venue_submission(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
     error = False
+    from forms import ArtistForm
     form = ArtistForm()
     try:
         if form.validate():
@@ -516,12 +786,16 @@ def create_artist_submission():
             seeking_venue = form.seeking_venue.data
             seeking_description = form.seeking_description.data
             artist = Artist(name=name, city=city, state=state, phone=phone, genres=genres,
-                            website_link=website_link, image_link=image_link, facebook_link=facebook_link, seeking_venue=seeking_venue, seeking_description=seeking_description)
+                            website_link=website_link, image_link=image_link, facebook_link=facebook_link, seeking_venue=seeking_venue, seeking_description=seeking_description,
+                            genre_list=Genre.from_names(form.genres.data))
             db.session.add(artist)
             # SQL: INSERT INTO artist(name, city, state, phone, genres, website_link, image_link, facebook_link, seeking_venue, seeking_description)
             # VALUES({NAME},{CITY},{STATE},{PHONE},{GENRES},{WEBSITE_LINK},{IMAGE_LINK},{FACEBOOK_LINK},{SEEKING_VENUE},{SEEKING_DESCRIPTION});
             db.session.commit()
             db.session.refresh(artist)
+            search.index_entity(artist)
+            name_index.update(artist)
+            home_snapshot.refresh_soon()
             data = artist
 
             # on successful db insert, flash success
@@ -543,7 +817,7 @@ def create_artist_submission():
     finally:
         db.session.close()
     if not error:
-        return redirect(url_for('artists'))
+        return redirect(url_for('.artists'))
     else:
         abort(500)
 
@@ -551,53 +825,123 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
 def shows():
     # displays list of shows at /shows
-    # TODO: replace with real venues data.
+    after = page_cursor('after', datetime.fromisoformat, int)
+    before = page_cursor('before', datetime.fromisoformat, int)
     try:
-        shows = Show.query.join('artist').join('venue').all()
-        # SQL: SELECT * FROM show INNER JOIN artist ON show.artist_id = artist.id INNER JOIN venue ON show.venue_id = venue.id;
+        query = db.session.query(Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+                                 Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+                                 Show.version, Artist.version.label('artist_version'),
+                                 Venue.version.label('venue_version')).join(
+            Artist, Show.artist_id == Artist.id).join(Venue, Show.venue_id == Venue.id).filter(
+            Artist.deleted_at.is_(None), Venue.deleted_at.is_(None))
+        shows, has_prev, has_next = keyset_page(
+            query, [Show.start_time, Show.id], after, before, current_app.config['PAGE_SIZE'])
+        # SQL: SELECT show.id, show.start_time, show.venue_id, venue.name, show.artist_id, artist.name, artist.image_link,
+        # show.version, artist.version, venue.version FROM show INNER JOIN artist ON show.artist_id = artist.id INNER JOIN venue ON show.venue_id = venue.id
+        # WHERE artist.deleted_at IS NULL AND venue.deleted_at IS NULL AND (show.start_time, show.id) > ({START_TIME}, {ID})
+        # ORDER BY show.start_time, show.id LIMIT {PAGE_SIZE} + 1;
         data = []
         for show in shows:
             data.append({
-                "venue_id": show.venue.id,
-                "venue_name": show.venue.name,
-                "artist_id": show.artist.id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": show.start_time.strftime("%Y-%m-%dT%H:%M:%S")
+                "id": show.id,
+                # the card shows the artist and the venue too, so it changes with any of the three
+                "version": f'{show.version}.{show.artist_version}.{show.venue_version}',
+                "venue_id": show.venue_id,
+                "venue_name": show.venue_name,
+                "artist_id": show.artist_id,
+                "artist_name": show.artist_name,
+                "artist_image_link": show.artist_image_link,
+                "start_time": show.start_time
             })
-        return render_template('pages/shows.html', shows=data)
+        pages = {
+            "prev": url_for('.shows', before=make_cursor(shows[0].start_time, shows[0].id)) if shows and has_prev else None,
+            "next": url_for('.shows', after=make_cursor(shows[-1].start_time, shows[-1].id)) if shows and has_next else None
+        }
+        return render_template('pages/shows.html', shows=data, pages=pages)
     except:
         abort(500)
 
 
-@app.route('/shows/create')
+@bp.route('/shows/calendar')
+def shows_calendar():
+    try:
+        start_time = datetime.fromisoformat(request.args['start']) if 'start' in request.args else datetime.now()
+        end_time = datetime.fromisoformat(request.args['end']) if 'end' in request.args else (
+            start_time + timedelta(days=current_app.config['CALENDAR_DEFAULT_DAYS']))
+        venue_id, artist_id = [int(request.args[arg]) if arg in request.args else None
+                               for arg in ('venue_id', 'artist_id')]
+    except ValueError:
+        abort(400)
+    if not start_time < end_time <= start_time + timedelta(days=current_app.config['CALENDAR_MAX_DAYS']):
+        abort(400)
+    limit = current_app.config['CALENDAR_MAX_SHOWS']
+    rows = bookings.calendar(start_time, end_time, venue_id=venue_id, artist_id=artist_id,
+                             city=request.args.get('city'), state=request.args.get('state'), limit=limit + 1)
+    return jsonify({
+        "start": start_time.isoformat(),
+        "end": end_time.isoformat(),
+        "shows": [{
+            "id": row.id,
+            "start_time": row.start_time.isoformat(),
+            "end_time": row.end_time.isoformat(),
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "city": row.city,
+            "state": row.state,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link
+        } for row in rows[:limit]],
+        # more shows than CALENDAR_MAX_SHOWS overlap the window; narrow it to see the rest
+        "truncated": len(rows) > limit
+    })
+
+
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
+    from forms import ShowForm
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
     error = False
+    from forms import ShowForm
     form = ShowForm()
     try:
         if form.validate():
             artist_id = form.artist_id.data
             venue_id = form.venue_id.data
             start_time = form.start_time.data
-            show = Show(artist_id=artist_id, venue_id=venue_id,
-                        start_time=start_time)
-            db.session.add(show)
-            # SQL: INSERT INTO show(artist_id, venue_id, start_time) VALUES({ARTIST_ID}, {VENUE_ID}, {START_TIME});
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Show was successfully listed!')
+            end_time = bookings.end_time_for(start_time, form.duration.data)
+            conflicts = bookings.find_conflicts(venue_id, artist_id, start_time, end_time)
+            if not deletions.bookable(venue_id, artist_id):
+                flash('The venue or the artist does not exist.')
+                error = True
+            elif conflicts:
+                flash('The show overlaps ' + ', '.join(
+                    f'a show {"at the venue" if kind == "venue" else "by the artist"} '
+                    f'from {show.start_time:%Y-%m-%d %H:%M} to {show.end_time:%Y-%m-%d %H:%M}'
+                    for kind, show in conflicts) + '.')
+                error = True
+            else:
+                show = Show(artist_id=artist_id, venue_id=venue_id,
+                            start_time=start_time, end_time=end_time)
+                db.session.add(show)
+                # SQL: INSERT INTO show(artist_id, venue_id, start_time, end_time) VALUES({ARTIST_ID}, {VENUE_ID}, {START_TIME}, {END_TIME});
+                counters.record_new_show(show, datetime.now())
+                db.session.commit()
+                page_cache.invalidate(f'venue:{venue_id}', f'artist:{artist_id}')
+                home_snapshot.refresh_soon()
+                # on successful db insert, flash success
+                flash('Show was successfully listed!')
         else:
             flash(f'The input had the following errors: {form.errors}')
             error = True
@@ -611,31 +955,475 @@ def create_show_submission():
     finally:
         db.session.close()
         if not error:
-            return redirect(url_for('shows'))
+            return redirect(url_for('.shows'))
         else:
             abort(500)
 
 
-@app.errorhandler(404)
+#  Show series
+#  ----------------------------------------------------------------
+
+def describe_conflicts(conflicts):
+    # one line per left-out occurrence, for flash messages
+    reasons = {'venue': 'overlaps a show at the venue', 'artist': 'overlaps a show by the artist',
+               'series': 'overlaps another date of the series'}
+    return '; '.join(f'{start:%Y-%m-%d %H:%M} ' + ', '.join(sorted({reasons[kind] for kind, _ in found}))
+                     for start, found in sorted(conflicts.items()))
+
+
+@bp.route('/series/create', methods=['GET'])
+def create_series_form():
+    from forms import ShowSeriesForm
+    form = ShowSeriesForm()
+    return render_template('forms/new_series.html', form=form)
+
+
+@bp.route('/series/create', methods=['POST'])
+def create_series_submission():
+    # expands the recurrence rule and inserts every occurrence in one statement
+    import series
+    from forms import ShowSeriesForm
+    form = ShowSeriesForm()
+    if not form.validate():
+        flash(f'The input had the following errors: {form.errors}')
+        return render_template('forms/new_series.html', form=form), 400
+    artist_id, venue_id = form.artist_id.data, form.venue_id.data
+    start_time = form.start_time.data
+    if not deletions.bookable(venue_id, artist_id):
+        flash('The venue or the artist does not exist.')
+        return render_template('forms/new_series.html', form=form), 400
+    try:
+        dates = series.parse_dates(form.dates.data or '', start_time) if form.frequency.data == 'dates' else ()
+        show_series, created, conflicts = series.create(
+            artist_id, venue_id, form.frequency.data, start_time,
+            bookings.end_time_for(start_time, form.duration.data) - start_time,
+            every=form.every.data or 1, until=form.until.data, count=form.count.data, dates=dates,
+            limit=current_app.config['SERIES_MAX_OCCURRENCES'])
+        if not created:
+            db.session.rollback()
+            flash('No show of the series could be listed: ' + describe_conflicts(conflicts) + '.')
+            return render_template('forms/new_series.html', form=form), 409
+        db.session.commit()
+        series_id = show_series.id
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e))
+        return render_template('forms/new_series.html', form=form), 400
+    except:
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+    page_cache.invalidate(f'venue:{venue_id}', f'artist:{artist_id}')
+    home_snapshot.refresh_soon()
+    flash(f'{created} shows were successfully listed!')
+    if conflicts:
+        flash('These dates were left out: ' + describe_conflicts(conflicts) + '.')
+    return redirect(url_for('.show_series', series_id=series_id))
+
+
+@bp.route('/series/<int:series_id>')
+def show_series(series_id):
+    db_series = ShowSeries.query.get_or_404(series_id)
+    # SQL: SELECT * FROM show_series WHERE id={SERIES_ID};
+    shows = Show.query.filter(Show.series_id == series_id).order_by(Show.start_time).all()
+    # SQL: SELECT * FROM show WHERE series_id={SERIES_ID} ORDER BY start_time;
+    now = datetime.now()
+    data = {
+        "id": db_series.id,
+        "artist_id": db_series.artist_id,
+        "artist_name": db_series.artist.name,
+        "venue_id": db_series.venue_id,
+        "venue_name": db_series.venue.name,
+        "frequency": db_series.frequency,
+        "every": db_series.every,
+        "duration": db_series.duration,
+        "cancelled_at": db_series.cancelled_at,
+        "upcoming_shows": [{"id": show.id, "start_time": show.start_time, "end_time": show.end_time}
+                           for show in shows if show.start_time > now],
+        "past_shows": [{"id": show.id, "start_time": show.start_time, "end_time": show.end_time}
+                       for show in shows if show.start_time <= now],
+    }
+    return render_template('pages/show_series.html', series=data)
+
+
+@bp.route('/series/<int:series_id>/edit', methods=['GET'])
+def edit_series(series_id):
+    from forms import SeriesEditForm
+    db_series = ShowSeries.query.get_or_404(series_id)
+    form = SeriesEditForm(duration=db_series.duration, time_of_day=db_series.start_time.time())
+    return render_template('forms/edit_series.html', form=form, series=db_series)
+
+
+@bp.route('/series/<int:series_id>/edit', methods=['POST'])
+def edit_series_submission(series_id):
+    # changes the time and duration of every upcoming occurrence at once
+    import series
+    from forms import SeriesEditForm
+    form = SeriesEditForm()
+    db_series = ShowSeries.query.get_or_404(series_id)
+    if db_series.cancelled_at is not None or not form.validate():
+        flash('A cancelled series cannot be edited.' if db_series.cancelled_at is not None
+              else f'The input had the following errors: {form.errors}')
+        return render_template('forms/edit_series.html', form=form, series=db_series), 400
+    venue_id, artist_id = db_series.venue_id, db_series.artist_id
+    try:
+        updated, conflicts = series.update(
+            db_series, timedelta(minutes=form.duration.data), form.time_of_day.data, datetime.now())
+        if conflicts:
+            db.session.rollback()
+            flash('The series was not changed: ' + describe_conflicts(conflicts) + '.')
+            return render_template('forms/edit_series.html', form=form, series=db_series), 409
+        db.session.commit()
+    except:
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+    page_cache.invalidate(f'venue:{venue_id}', f'artist:{artist_id}')
+    home_snapshot.refresh_soon()
+    flash(f'{updated} upcoming shows were successfully modified!')
+    return redirect(url_for('.show_series', series_id=series_id))
+
+
+@bp.route('/series/<int:series_id>', methods=['DELETE'])
+def cancel_series(series_id):
+    # removes the upcoming occurrences; past shows stay listed
+    import series
+    error = False
+    response = {'url': '', 'error': 0}
+    db_series = ShowSeries.query.get_or_404(series_id)
+    venue_id, artist_id = db_series.venue_id, db_series.artist_id
+    try:
+        response['deleted'] = series.cancel(db_series, datetime.now())
+        db.session.commit()
+        page_cache.invalidate(f'venue:{venue_id}', f'artist:{artist_id}')
+        home_snapshot.refresh_soon()
+    except:
+        db.session.rollback()
+        error = True
+    finally:
+        db.session.close()
+
+    if not error:
+        response['url'] = url_for('.show_series', series_id=series_id)
+    else:
+        response['error'] = 1
+    return jsonify(response), 500 if error else 200
+
+
+#  Genres
+#  ----------------------------------------------------------------
+
+def genre_listing(genre_name, model, link_table, link_column):
+    after = page_cursor('after', int)
+    before = page_cursor('before', int)
+    genre = Genre.query.filter_by(name=genre_name).first()
+    # SQL: SELECT * FROM genre WHERE name={NAME} LIMIT 1;
+    if genre is None:
+        abort(404)
+    query = db.session.query(model.id, model.name, model.city, model.state).join(
+        link_table, link_column == model.id).filter(link_table.c.genre_id == genre.id, model.deleted_at.is_(None))
+    rows, has_prev, has_next = keyset_page(
+        query, [model.id], after, before, current_app.config['PAGE_SIZE'])
+    # SQL: SELECT venue.id, venue.name, venue.city, venue.state FROM venue INNER JOIN venue_genre ON venue_genre.venue_id = venue.id
+    # WHERE venue_genre.genre_id={GENRE_ID} AND venue.deleted_at IS NULL AND venue.id > {AFTER} ORDER BY venue.id LIMIT {PAGE_SIZE} + 1;
+    endpoint = request.endpoint
+    pages = {
+        "prev": url_for(endpoint, genre_name=genre_name, before=make_cursor(rows[0].id)) if rows and has_prev else None,
+        "next": url_for(endpoint, genre_name=genre_name, after=make_cursor(rows[-1].id)) if rows and has_next else None
+    }
+    return render_template('pages/genre.html', genre=genre.name, kind=model.__tablename__,
+                           items=[row._asdict() for row in rows], pages=pages)
+
+
+@bp.route('/genres/<genre_name>/venues')
+def genre_venues(genre_name):
+    return genre_listing(genre_name, Venue, venue_genre, venue_genre.c.venue_id)
+
+
+@bp.route('/genres/<genre_name>/artists')
+def genre_artists(genre_name):
+    return genre_listing(genre_name, Artist, artist_genre, artist_genre.c.artist_id)
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@bp.route('/export/<kind>.<fmt>')
+def export_data(kind, fmt):
+    import export
+    if kind not in export.QUERIES or fmt not in export.FORMATS:
+        abort(404)
+    try:
+        since, until = [datetime.fromisoformat(request.args[arg]) if arg in request.args else None
+                        for arg in ('since', 'until')]
+    except ValueError:
+        abort(400)
+    chunks = export.generate(kind, fmt, since=since, until=until)
+    # the body depends on Accept-Encoding unless ?gzip=1 or ?gzip=0 decides
+    headers = {'Content-Disposition': f'attachment; filename={kind}.{fmt}', 'Vary': 'Accept-Encoding'}
+    compress = request.args.get('gzip', type=int)
+    if compress is None:
+        compress = 'gzip' in request.accept_encodings
+    if compress:
+        chunks = export.gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    # stream_with_context keeps the session (and its server-side cursor) open while the body is sent
+    return Response(stream_with_context(chunks), mimetype=export.FORMATS[fmt], headers=headers)
+
+
+#  Batch API
+#  ----------------------------------------------------------------
+
+def batch_upsert(kind, model, key):
+    # takes a JSON array of records (or {"records": [...]}) with the create form's fields
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get('records')
+    if not isinstance(rows, list):
+        return jsonify(error='Expected a JSON array of records.'), 400
+    limit = current_app.config['API_BATCH_MAX_RECORDS']
+    if len(rows) > limit:
+        return jsonify(error=f'At most {limit} records can be sent at once.'), 413
+    import importer
+    try:
+        results = importer.upsert(kind, rows)
+        saved = [result for result in results if result['status'] != 'failed']
+        if saved:
+            for entity in model.query.filter(model.id.in_([result['id'] for result in saved])).all():
+                # SQL: SELECT * FROM venue WHERE id IN ({IDS});
+                search.index_entity(entity)
+                name_index.update(entity)
+            page_cache.invalidate(*page_keys(key, [result['id'] for result in saved if result['status'] == 'updated']))
+            home_snapshot.refresh_soon()
+    except:
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+    counts = {status: sum(result['status'] == status for result in results)
+              for status in ('created', 'updated', 'failed')}
+    return jsonify(results=results, **counts)
+
+
+@bp.route('/api/venues:batch', methods=['POST'])
+def batch_venues():
+    return batch_upsert('venues', Venue, 'venue')
+
+
+@bp.route('/api/artists:batch', methods=['POST'])
+def batch_artists():
+    return batch_upsert('artists', Artist, 'artist')
+
+
+#  Cache
+#  ----------------------------------------------------------------
+
+@bp.route('/cache/stats')
+def cache_stats():
+    # hit/miss counts are per worker process
+    return jsonify(page_cache.stats())
+
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the upcoming show counters.')
+
+
+@counters_cli.command('expire')
+@click.option('--since', type=click.DateTime(), required=True, help='Recount entities with shows started after this time.')
+def expire_counters(since):
+    updated = counters.expire_started_shows(since, datetime.now())
+    click.echo(f'Recounted {updated} venues and artists.')
+
+
+@counters_cli.command('check')
+@click.option('--fix', is_flag=True, help='Correct any drift that is found.')
+def check_counters(fix):
+    drift = counters.check_counters(datetime.now(), fix=fix)
+    for table, entity_id, stored, actual in drift:
+        click.echo(f'{table} {entity_id}: stored {stored}, actual {actual}')
+    click.echo(f'{len(drift)} counters drifted{" and were corrected" if fix and drift else ""}.')
+    if drift and not fix:
+        sys.exit(1)
+
+
+bp.cli.add_command(counters_cli)
+
+
+assets_cli = AppGroup('assets', help='Build the static asset bundles.')
+
+
+@assets_cli.command('build')
+def build_assets():
+    """Bundle, minify, fingerprint and precompress the static assets."""
+    manifest = assets.build(current_app.static_folder)
+    for name, filename in manifest.items():
+        click.echo(f'{name} -> {assets.DIST}/{filename}')
+    if assets.brotli is None:
+        click.echo('brotli is not installed; only gzip variants were written.')
+    click.echo('Restart the app to serve the new bundles.')
+
+
+bp.cli.add_command(assets_cli)
+
+
+jobs_cli = AppGroup('jobs', help='Inspect and queue background jobs.')
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(['pending', 'running', 'done', 'failed']), help='Only jobs with this status.')
+@click.option('--limit', default=50, show_default=True, help='Most recent jobs shown.')
+def list_jobs(status, limit):
+    """List the most recent jobs, newest first."""
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    for job in query.order_by(Job.id.desc()).limit(limit):
+        # SQL: SELECT * FROM job WHERE status={STATUS} ORDER BY id DESC LIMIT {LIMIT};
+        click.echo(f'{job.id:>6}  {job.status:<8} {job.name:<16} attempts {job.attempts}/{job.max_attempts}  '
+                   f'run at {job.run_at:%Y-%m-%d %H:%M:%S}'
+                   f'{f"  on {job.locked_by}" if job.status == "running" else ""}'
+                   f'{f"  error: {job.error}" if job.error else ""}')
+    counts = db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all()
+    # SQL: SELECT status, COUNT(id) FROM job GROUP BY status;
+    click.echo(', '.join(f'{count} {status}' for status, count in sorted(counts)) or 'No jobs.')
+
+
+@jobs_cli.command('tasks')
+def list_tasks():
+    """List the tasks jobs can run, and how often scheduled ones are queued."""
+    import jobs
+    for name in sorted(jobs.TASKS):
+        interval = current_app.config['JOBS_SCHEDULE'].get(name)
+        click.echo(f'{name}{f"  every {interval}s" if interval else ""}')
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--args', 'args_json', default='{}', help='The task\'s keyword arguments, as a JSON object.')
+@click.option('--at', 'run_at', type=click.DateTime(), help='Run no earlier than this time.')
+def enqueue_job(name, args_json, run_at):
+    """Queue a one-off run of a task."""
+    import jobs
+    if name not in jobs.TASKS:
+        raise click.ClickException(f'Unknown task {name}; see `flask jobs tasks`.')
+    try:
+        args = json.loads(args_json)
+    except ValueError:
+        raise click.ClickException('--args must be a JSON object.')
+    if not isinstance(args, dict):
+        raise click.ClickException('--args must be a JSON object.')
+    job = jobs.enqueue(name, args, run_at=run_at)
+    db.session.commit()
+    click.echo(f'Queued job {job.id}.')
+
+
+@jobs_cli.command('retry')
+@click.argument('job_id', type=int)
+def retry_job(job_id):
+    """Give a failed job another round of attempts, starting now."""
+    import jobs
+    retried = jobs.requeue(job_id, datetime.now())
+    db.session.commit()
+    if not retried:
+        raise click.ClickException(f'No failed job {job_id}.')
+    click.echo(f'Job {job_id} will run again.')
+
+
+@jobs_cli.command('work')
+@click.option('--workers', type=int, help='Threads running jobs; defaults to JOBS_WORKERS.')
+def work_jobs(workers):
+    """Run jobs in this process until interrupted."""
+    import jobs
+    app = current_app._get_current_object()
+    workers = workers or app.config['JOBS_WORKERS'] or 1
+    runner = jobs.Runner()
+    thread = runner.start(app, workers, app.config['JOBS_POLL_INTERVAL'])
+    click.echo(f'Running jobs on {workers} threads as {runner.worker_id}.')
+    thread.join()
+
+
+bp.cli.add_command(jobs_cli)
+
+deletions_cli = AppGroup('deletions', help='Retry the removal of deleted venues and artists.')
+
+
+@deletions_cli.command('retry')
+@click.argument('job_id', type=int)
+def retry_deletion_job(job_id):
+    """Give a failed deletion another round of attempts, starting now."""
+    import jobs
+    deletion = DeletionJob.query.get(job_id)
+    requeued = deletion is not None and jobs.requeue(deletion.job_id, datetime.now())
+    db.session.commit()
+    if not requeued:
+        raise click.ClickException(f'No failed deletion {job_id}.')
+    click.echo(f'Deletion {job_id} will run again.')
+
+
+bp.cli.add_command(deletions_cli)
+
+
+@bp.cli.command('refresh-views')
+@click.option('--blocking', is_flag=True, help='Refresh without CONCURRENTLY, locking out readers.')
+def refresh_views_command(blocking):
+    """Refresh the materialized views."""
+    import matviews
+    if not matviews.available():
+        raise click.ClickException('Materialized views require PostgreSQL.')
+    names = matviews.refresh_views(concurrently=not blocking)
+    if not names:
+        raise click.ClickException('Another refresh is already running.')
+    click.echo(f'Refreshed {", ".join(names)}.')
+
+
+@bp.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per statement.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False, writable=True),
+              help='Write rejected rows here as JSONL instead of to stderr.')
+def import_data(kind, path, fmt, batch_size, errors_path):
+    """Bulk load venues, artists or shows from a CSV or JSONL file."""
+    import importer
+    report = importer.import_file(kind, path, fmt=fmt, batch_size=batch_size)
+    lines = [json.dumps({"line": line_no, "errors": errors}) for line_no, errors in sorted(report.errors, key=lambda error: error[0])]
+    if errors_path:
+        with open(errors_path, 'w') as f:
+            f.writelines(line + '\n' for line in lines)
+    else:
+        for line in lines:
+            click.echo(line, err=True)
+    click.echo(f'Imported {report.inserted} {kind}, rejected {len(report.errors)} rows.')
+
+
+@bp.before_app_first_request
+def start_background_threads():
+    # started with the first request so that CLI commands such as `flask db upgrade` don't run them
+    app = current_app._get_current_object()
+    if not app.config['BACKGROUND_THREADS']:
+        return
+    home_snapshot.start(app, app.config['HOME_SNAPSHOT_INTERVAL'])
+    # counter expiry, view refreshes and deletions run as jobs (see JOBS_SCHEDULE)
+    if app.config['JOBS_WORKERS']:
+        import jobs
+        jobs.Runner(jobs_wake).start(app, app.config['JOBS_WORKERS'], app.config['JOBS_POLL_INTERVAL'])
+    name_index.start(app, app.config['AUTOCOMPLETE_REBUILD_INTERVAL'])
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -643,11 +1431,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,179 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from flask import abort, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# bundle name: source files under static/, in load order
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    'form.css': ['css/bootstrap.min.css', 'css/bootstrap-theme.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'jquery.js': ['js/libs/jquery-1.11.1.min.js'],
+    'main.js': ['js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js', 'js/script.js'],
+}
+
+# bundles loaded with defer, which run in page order once the page is parsed (so after jquery.js,
+# which is loaded synchronously at the end of the body for inline scripts that need it)
+DEFERRED = {'main.js'}
+
+# bundles are written to static/DIST and listed in static/DIST/MANIFEST
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+
+# precompressed variants, in order of preference: (Accept-Encoding token, file suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+#----------------------------------------------------------------------------#
+# Minification.
+#----------------------------------------------------------------------------#
+
+CSS_STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_URL_RE = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+SOURCE_MAP_RE = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.M)
+
+
+def minify_css(text):
+    # comments are removed and whitespace collapsed outside of string literals; /*! licences are kept
+    parts = CSS_STRING_RE.split(CSS_COMMENT_RE.sub('', text))
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        parts[i] = re.sub(r'\s*([{};,>])\s*', r'\1', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    # without a JavaScript parser only whole-line comments and indentation can be removed safely
+    lines = (line.strip() for line in SOURCE_MAP_RE.sub('', text).splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def _absolute_urls(text, source):
+    # url()s are relative to the source file, which the bundle does not share a directory with
+    def rewrite(match):
+        url = match.group(2)
+        if re.match(r'^([a-z]+:|/|#)', url):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join('/static', posixpath.dirname(source), url))
+        return f'url("{path}")'
+    return CSS_URL_RE.sub(rewrite, text)
+
+
+def bundle(static_folder, name):
+    contents = []
+    for source in BUNDLES[name]:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            contents.append(_absolute_urls(text if source.endswith('.min.css') else minify_css(text), source))
+        else:
+            text = SOURCE_MAP_RE.sub('', text) if source.endswith('.min.js') else minify_js(text)
+            # the separator stops a file without a trailing semicolon from running into the next one
+            contents.append(text.strip() + '\n;')
+    return '\n'.join(contents).encode('utf-8')
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+
+def build(static_folder):
+    """
+    Writes every bundle to static/dist as name.<hash>.ext, with .gz and (when
+    the brotli package is installed) .br variants, and returns the manifest
+    mapping bundle names to file names. Files from earlier builds are removed.
+    """
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name in BUNDLES:
+        data = bundle(static_folder, name)
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        variants = {'': data, '.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, content in variants.items():
+            with open(os.path.join(dist, filename + suffix), 'wb') as f:
+                f.write(content)
+        manifest[name] = filename
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    current = {filename + suffix for filename in manifest.values() for suffix in ('', '.gz', '.br')}
+    for filename in os.listdir(dist):
+        if filename != MANIFEST and filename not in current:
+            os.remove(os.path.join(dist, filename))
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+def _tag(name, url):
+    if name.endswith('.css'):
+        return f'<link type="text/css" rel="stylesheet" href="{escape(url)}" />'
+    defer = ' defer' if name in DEFERRED else ''
+    return f'<script type="text/javascript" src="{escape(url)}"{defer}></script>'
+
+
+def init_app(app):
+    """
+    Adds the asset_tags(name) template function and the /assets route that
+    serves built bundles. Until `flask assets build` has been run, or when
+    ASSETS_USE_BUNDLES is off, asset_tags links the source files instead.
+    """
+    manifest = load_manifest(app.static_folder) if app.config['ASSETS_USE_BUNDLES'] else {}
+    dist = os.path.join(app.static_folder, DIST)
+
+    @app.template_global()
+    def asset_tags(name):
+        if name in manifest:
+            return Markup(_tag(name, url_for('asset_file', filename=manifest[name])))
+        return Markup('\n'.join(_tag(name, url_for('static', filename=source)) for source in BUNDLES[name]))
+
+    @app.route('/assets/<path:filename>')
+    def asset_file(filename):
+        if filename not in manifest.values():
+            abort(404)
+        mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+        encoding = next((token for token, suffix in ENCODINGS
+                         if token in request.accept_encodings
+                         and os.path.exists(os.path.join(dist, filename + suffix))), None)
+        suffix = dict(ENCODINGS)[encoding] if encoding else ''
+        response = send_from_directory(dist, filename + suffix, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        # the file name changes whenever the content does, so browsers never need to revalidate
+        response.headers['Cache-Control'] = f'public, max-age={app.config["ASSETS_MAX_AGE"]}, immutable'
+        return response
+
+    return manifest
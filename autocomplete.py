@@ -0,0 +1,206 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from bisect import bisect_left
+from models import db, Venue, Artist
+from search import TOKEN_RE
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+
+# entries scanned per lookup, as a multiple of the number of suggestions returned
+SCAN_FACTOR = 20
+
+
+def _normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def _keys(label):
+    """
+    Returns the (key, rank) pairs for label: the whole label with rank 0, and
+    the text from each later word onwards with rank 1, so "hop" finds
+    "The Musical Hop" after names starting with "hop".
+    """
+    key = _normalize(label)
+    return [(key, 0)] + [(key[match.start():], 1) for match in TOKEN_RE.finditer(key) if match.start()]
+
+
+class PrefixIndex:
+
+    """
+    An in-process sorted array of venue names, artist names and city/state
+    pairs, answering prefix lookups with a binary search
+    ...
+
+    Attributes
+    ----------
+    max_entries : int
+        the memory budget; once reached, only whole-label keys are added
+    entries : list
+        sorted (key, rank, kind, id) tuples; id is (city, state) for areas
+    docs : dict
+        maps (kind, id) to (label, area, entries) for every indexed entity
+    areas : dict
+        maps (city, state) to the number of entities located there
+    built_at : float
+        time.monotonic() of the last full build, or None before the first
+    truncated : bool
+        True if the budget forced keys to be left out
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = []
+        self.docs = {}
+        self.areas = {}
+        self.built_at = None
+        self.truncated = False
+        self.pending = None
+
+    def _budget(self, keys):
+        room = self.max_entries - len(self.entries)
+        if len(keys) > room:
+            self.truncated = True
+            keys = [key for key in keys if key[1] == 0][:max(room, 0)]
+        return keys
+
+    def _insert(self, entries, bulk):
+        if bulk:
+            self.entries.extend(entries)
+        else:
+            for entry in entries:
+                self.entries.insert(bisect_left(self.entries, entry), entry)
+
+    def _delete(self, entries):
+        for entry in entries:
+            i = bisect_left(self.entries, entry)
+            if i < len(self.entries) and self.entries[i] == entry:
+                self.entries.pop(i)
+
+    def _add(self, kind, entity_id, name, city, state, bulk=False):
+        area = (city, state)
+        entries = [(key, rank, kind, entity_id) for key, rank in self._budget(_keys(name))]
+        self._insert(entries, bulk)
+        self.docs[(kind, entity_id)] = (name, area, entries)
+        self.areas[area] = self.areas.get(area, 0) + 1
+        if self.areas[area] == 1:
+            label = f'{city}, {state}'
+            area_entries = [(key, rank, 'area', area) for key, rank in self._budget(_keys(label))]
+            self._insert(area_entries, bulk)
+            self.docs[('area', area)] = (label, None, area_entries)
+
+    def _remove(self, kind, entity_id):
+        doc = self.docs.pop((kind, entity_id), None)
+        if doc is None:
+            return
+        _, area, entries = doc
+        self._delete(entries)
+        self.areas[area] -= 1
+        if not self.areas[area]:
+            del self.areas[area]
+            self._delete(self.docs.pop(('area', area))[2])
+
+    def build(self):
+        """
+        Rebuilds the index from the database. Updates made while the rows are
+        being read are replayed on top of the new index.
+        """
+        with self.lock:
+            self.pending = []
+        try:
+            rows = {}
+            for model, kind in KINDS.items():
+                rows[kind] = db.session.query(model.id, model.name, model.city, model.state).filter(
+                    model.deleted_at.is_(None)).all()
+                # SQL: SELECT id, name, city, state FROM venue WHERE deleted_at IS NULL;
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+        fresh = PrefixIndex(self.max_entries)
+        for kind, kind_rows in rows.items():
+            for row in kind_rows:
+                fresh._add(kind, row.id, row.name, row.city, row.state, bulk=True)
+        fresh.entries.sort()
+        with self.lock:
+            self.entries, self.docs, self.areas = fresh.entries, fresh.docs, fresh.areas
+            self.truncated = fresh.truncated
+            for operation, args in self.pending:
+                operation(*args)
+            self.pending = None
+            self.built_at = time.monotonic()
+
+    def _apply(self, operation, *args):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((operation, args))
+            if self.built_at is not None:
+                operation(*args)
+
+    def update(self, entity):
+        kind = KINDS[type(entity)]
+        self._apply(self._replace, kind, entity.id, entity.name, entity.city, entity.state)
+
+    def _replace(self, kind, entity_id, name, city, state):
+        self._remove(kind, entity_id)
+        self._add(kind, entity_id, name, city, state)
+
+    def remove(self, model, entity_id):
+        self._apply(self._remove, KINDS[model], int(entity_id))
+
+    def lookup(self, text, limit):
+        """
+        Returns up to limit suggestions for the prefix text, whole-label
+        matches first, then alphabetically.
+        """
+        prefix = _normalize(text)
+        if not prefix:
+            return []
+        found = {}
+        with self.lock:
+            i = bisect_left(self.entries, (prefix,))
+            end = min(len(self.entries), i + limit * SCAN_FACTOR)
+            while i < end and self.entries[i][0].startswith(prefix):
+                key, rank, kind, entity_id = self.entries[i]
+                if (kind, entity_id) not in found or rank < found[(kind, entity_id)][0]:
+                    found[(kind, entity_id)] = (rank, self.docs[(kind, entity_id)][0])
+                i += 1
+        best = sorted((rank, label.lower(), kind, entity_id, label)
+                      for (kind, entity_id), (rank, label) in found.items())[:limit]
+        suggestions = []
+        for _, _, kind, entity_id, label in best:
+            if kind == 'area':
+                suggestions.append({"type": kind, "label": label, "city": entity_id[0], "state": entity_id[1]})
+            else:
+                suggestions.append({"type": kind, "label": label, "id": entity_id})
+        return suggestions
+
+    def start(self, app, interval):
+        """
+        Builds the index in a background thread, then rebuilds it every
+        interval seconds so that writes made by other workers show up.
+        """
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        self.build()
+                        if self.truncated:
+                            app.logger.warning(
+                                'Autocomplete index reached AUTOCOMPLETE_MAX_ENTRIES; some keys were left out.')
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Autocomplete index build failed.')
+                    finally:
+                        db.session.remove()
+                time.sleep(interval)
+
+        threading.Thread(target=run, name='autocomplete', daemon=True).start()
@@ -0,0 +1,70 @@
+"""
+Measures rendering a list of show dates with the datetime filter, as /shows,
+the venue pages and the artist pages do, in three ways:
+
+    legacy     strftime'd strings, parsed back with dateutil for every row
+    datetime   datetime objects formatted with the cached babel pattern
+    timezone   the same, converted to another zone as a `tz` cookie asks for
+
+Run it from the repository root:
+
+    python benchmarks/datetime_filter.py --rows 10000 --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from jinja2 import Environment
+import formatting
+
+TEMPLATE = '{% for show in shows %}<h4>{{ show.start_time|datetime("full") }}</h4>\n{% endfor %}'
+
+
+def legacy_filter(value, format='medium'):
+    # the filter as it was before datetime objects were accepted
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, formatting.FORMATS.get(format, format), locale='en')
+
+
+def cases(rows):
+    start = datetime(2030, 1, 1, 20, 0)
+    times = [start + timedelta(hours=3 * i) for i in range(rows)]
+    strings = [{"start_time": value.strftime("%Y-%m-%dT%H:%M:%S")} for value in times]
+    objects = [{"start_time": value} for value in times]
+    return {
+        'legacy': (legacy_filter, strings),
+        'datetime': (formatting.format_datetime, objects),
+        'timezone': (lambda value, format='medium': formatting.format_datetime(
+            value, format, timezone='America/New_York'), objects),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, (datetime_filter, shows) in cases(args.rows).items():
+        env = Environment()
+        env.filters['datetime'] = datetime_filter
+        template = env.from_string(TEMPLATE)
+        template.render(shows=shows[:10])
+        timings = []
+        for _ in range(args.runs):
+            begun = time.perf_counter()
+            template.render(shows=shows)
+            timings.append((time.perf_counter() - begun) * 1000)
+        print(f'{name:>9}: median {statistics.median(timings):8.2f} ms  min {min(timings):8.2f}  '
+              f'max {max(timings):8.2f}  ({args.rows} rows)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures how long a fresh worker takes to import the app, build it with
+create_app() and serve its first (and second) request.
+
+Every run is a new Python process, so nothing is shared between runs except
+what a real worker would share: the Jinja bytecode cache on disk. Run it from
+the repository root:
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --runs 10 --no-bytecode-cache
+    python benchmarks/startup.py --runs 10 --prewarm --json
+
+The requests go to a throwaway SQLite database, so no server is needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the child process; prints one JSON object of timings in milliseconds
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as fyyur
+imported = time.perf_counter()
+app = fyyur.create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+with app.app_context():
+    fyyur.db.create_all()
+client = app.test_client()
+timings = {"import_ms": imported - started, "create_app_ms": created - imported}
+for name in ("first_request_ms", "second_request_ms"):
+    begun = time.perf_counter()
+    response = client.get(sys.argv[2])
+    timings[name] = time.perf_counter() - begun
+    assert response.status_code == 200, response.status_code
+print(json.dumps({key: round(value * 1000, 2) for key, value in timings.items()}))
+'''
+
+
+def run_once(config, path):
+    output = subprocess.run([sys.executable, '-c', CHILD, json.dumps(config), path], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/shows/create', help='the page requested by each worker')
+    parser.add_argument('--prewarm', action='store_true', help='set PREWARM_TEMPLATES')
+    parser.add_argument('--no-bytecode-cache', action='store_true', help='unset JINJA_BYTECODE_CACHE_DIR')
+    parser.add_argument('--json', action='store_true', help='print every run as a JSON line')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'PREWARM_TEMPLATES': args.prewarm,
+            'JINJA_BYTECODE_CACHE_DIR': None if args.no_bytecode_cache else os.path.join(tmp, 'jinja'),
+            'PAGE_CACHE_BACKEND': 'memory',
+            'METRICS_DIR': os.path.join(tmp, 'metrics'),
+            'JOBS_WORKERS': 0,
+        }
+        # the first run fills the bytecode cache, as the first worker after a deploy would
+        results = [run_once(config, args.path) for _ in range(args.runs + 1)][1:]
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    for key in results[0]:
+        values = [result[key] for result in results]
+        print(f'{key:>18}: median {statistics.median(values):8.2f}  min {min(values):8.2f}  max {max(values):8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from bisect import bisect_left
+from datetime import timedelta
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Range queries.
+#----------------------------------------------------------------------------#
+
+
+def end_time_for(start_time, duration):
+    # duration is the ShowForm duration in minutes; empty means the default
+    return start_time + (timedelta(minutes=duration) if duration else DEFAULT_SHOW_DURATION)
+
+
+def _overlapping(query, start_time, end_time):
+    # a show overlapping [start_time, end_time) must start less than MAX_SHOW_DURATION before
+    # start_time, so the (venue_id|artist_id, start_time) indexes are only scanned over that
+    # bounded range, however many shows the venue or artist has
+    return query.filter(Show.start_time > start_time - MAX_SHOW_DURATION,
+                        Show.start_time < end_time, Show.end_time > start_time)
+
+
+def find_conflicts(venue_id, artist_id, start_time, end_time, exclude_id=None):
+    """
+    Returns the shows that overlap [start_time, end_time) at the venue or by
+    the artist, as a list of ('venue' or 'artist', show) pairs.
+
+    On postgres the XC_Show_*_Overlap exclusion constraints also reject
+    overlaps, so two concurrent bookings cannot both succeed.
+    """
+    conflicts = []
+    for kind, column, entity_id in (('venue', Show.venue_id, venue_id), ('artist', Show.artist_id, artist_id)):
+        query = _overlapping(Show.query.filter(column == entity_id), start_time, end_time)
+        if exclude_id is not None:
+            query = query.filter(Show.id != exclude_id)
+        conflicts.extend((kind, show) for show in query.order_by(Show.start_time).all())
+        # SQL: SELECT * FROM show WHERE venue_id={VENUE_ID} AND start_time > {START} - interval '24 hours'
+        # AND start_time < {END} AND end_time > {START} ORDER BY start_time;
+    return conflicts
+
+
+def find_conflicts_many(venue_id, artist_id, ranges, exclude_series_id=None):
+    """
+    Like find_conflicts, for many [start_time, end_time) ranges at once, as a
+    series of shows needs. Returns {start_time: [(kind, show), ...]} for the
+    ranges with conflicts, where kind is 'venue', 'artist' or 'series' (two
+    of the ranges overlap each other).
+
+    Only one query per venue/artist is run, over the span of all the ranges;
+    the ranges are then checked against its rows in-process.
+    """
+    conflicts = {}
+    if not ranges:
+        return conflicts
+    ranges = sorted(ranges)
+    span_start, span_end = ranges[0][0], max(end_time for _, end_time in ranges)
+    for kind, column, entity_id in (('venue', Show.venue_id, venue_id), ('artist', Show.artist_id, artist_id)):
+        query = _overlapping(Show.query.filter(column == entity_id), span_start, span_end)
+        if exclude_series_id is not None:
+            query = query.filter(db.or_(Show.series_id.is_(None), Show.series_id != exclude_series_id))
+        shows = query.order_by(Show.start_time).all()
+        # SQL: SELECT * FROM show WHERE venue_id={VENUE_ID} AND start_time > {FIRST_START} - interval '24 hours'
+        # AND start_time < {LAST_END} AND end_time > {FIRST_START} ORDER BY start_time;
+        starts = [show.start_time for show in shows]
+        for start_time, end_time in ranges:
+            # as in _overlapping, only shows starting within MAX_SHOW_DURATION before start_time can overlap
+            i = bisect_left(starts, start_time - MAX_SHOW_DURATION)
+            while i < len(shows) and shows[i].start_time < end_time:
+                if shows[i].end_time > start_time:
+                    conflicts.setdefault(start_time, []).append((kind, shows[i]))
+                i += 1
+    latest_end = None
+    for start_time, end_time in ranges:
+        if latest_end is not None and start_time < latest_end:
+            conflicts.setdefault(start_time, []).append(('series', None))
+        latest_end = max(latest_end or end_time, end_time)
+    return conflicts
+
+
+def calendar(start_time, end_time, venue_id=None, artist_id=None, city=None, state=None, limit=None):
+    """
+    Returns the shows overlapping [start_time, end_time), optionally only
+    those at a venue, by an artist, or in a city/state, ordered by start time.
+    """
+    query = db.session.query(
+        Show.id, Show.start_time, Show.end_time, Show.venue_id, Venue.name.label('venue_name'),
+        Venue.city, Venue.state, Show.artist_id, Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).join(
+        Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id).filter(
+        Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if state is not None:
+        query = query.filter(Venue.state == state)
+    if city is not None:
+        query = query.filter(Venue.city == city)
+    query = _overlapping(query, start_time, end_time).order_by(Show.start_time, Show.id)
+    # SQL: SELECT show.id, show.start_time, show.end_time, ... FROM show JOIN venue ON ... JOIN artist ON ...
+    # WHERE venue.deleted_at IS NULL AND artist.deleted_at IS NULL AND venue.state={STATE} AND venue.city={CITY}
+    # AND show.start_time > {START} - interval '24 hours'
+    # AND show.start_time < {END} AND show.end_time > {START} ORDER BY show.start_time, show.id LIMIT {LIMIT};
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
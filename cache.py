@@ -0,0 +1,337 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# A backend stores values under string keys until they expire. get() returns
+# None for missing or expired keys. namespace() returns a backend of the same
+# kind with its own keys and size budget, so one kind of entry can't evict another.
+
+
+class MemoryBackend:
+
+    """
+    An in-process LRU cache with a per-entry time to live
+    ...
+
+    Attributes
+    ----------
+    maxsize : int
+        the number of entries kept before the least recently used is evicted
+    ttl : int
+        seconds an entry stays valid after it is set
+    entries : OrderedDict
+        maps a key to (expires_at, value), least recently used first
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def namespace(self, name, maxsize):
+        # each worker has its own memory, so the namespace is a separate LRU
+        return MemoryBackend(maxsize, self.ttl)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileBackend:
+
+    """
+    A cache stored as one file per key in a directory shared by all workers
+    ...
+
+    Attributes
+    ----------
+    directory : str
+        the directory holding the cache files; each file's mtime is set to
+        when its entry expires
+    ttl : int
+        seconds an entry stays valid after it is set
+    maxsize : int
+        the number of entries kept by sweep(), soonest to expire removed
+        first; None for no limit
+    next_sweep : float
+        when this worker next removes the expired entries nobody read again
+    """
+
+    # entries being written are named *.tmp until they are renamed into place
+    TMP_SUFFIX = '.tmp'
+    # a *.tmp file this old was left behind by a worker that died while writing it
+    TMP_MAX_AGE = 60
+
+    def __init__(self, directory, ttl=300, maxsize=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.next_sweep = time.time() + ttl
+        # entries this worker wrote since its last sweep
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        # write to a temporary file and rename it, so readers never see a partial entry
+        now = time.time()
+        expires_at = now + (ttl or self.ttl)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=self.TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f)
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        self.writes += 1
+        # with a budget, sweep often enough that the directory never grows much past it
+        if now >= self.next_sweep or (self.maxsize and self.writes >= max(self.maxsize // 4, 1)):
+            self.next_sweep = now + self.ttl
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        """
+        Removes the expired entries, which get() only removes when they are
+        read, temporary files left behind by writers that died, and then the
+        entries closest to expiring beyond maxsize. Uses the files' mtimes,
+        so no entry is read. Returns the number removed.
+        """
+        now = now or time.time()
+        self.writes = 0
+        removed = 0
+        kept = []
+        for entry in os.scandir(self.directory):
+            try:
+                # namespaces are subdirectories, swept by their own backends
+                if entry.is_dir():
+                    continue
+                if entry.name.endswith(self.TMP_SUFFIX):
+                    expired = entry.stat().st_ctime < now - self.TMP_MAX_AGE
+                else:
+                    expired = entry.stat().st_mtime < now
+                if expired:
+                    # an entry rewritten since the stat is lost too, which only costs a miss
+                    os.unlink(entry.path)
+                    removed += 1
+                elif not entry.name.endswith(self.TMP_SUFFIX):
+                    kept.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+        if self.maxsize and len(kept) > self.maxsize:
+            kept.sort()
+            for _, path in kept[:len(kept) - self.maxsize]:
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def namespace(self, name, maxsize):
+        return FileBackend(os.path.join(self.directory, name), self.ttl, maxsize)
+
+    def __len__(self):
+        return sum(entry.is_file() and not entry.name.endswith(self.TMP_SUFFIX)
+                   for entry in os.scandir(self.directory))
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+# left in place of an invalidated entry for Cache.hold seconds
+INVALIDATED = ('invalidated',)
+
+
+class Cache:
+
+    """
+    A cache in front of a backend that counts hits and misses
+    ...
+
+    Attributes
+    ----------
+    backend : MemoryBackend or FileBackend
+        where entries are stored
+    hits : int
+        the number of get() calls that found an entry in this process
+    misses : int
+        the number of get() calls that found nothing in this process
+    hold : int
+        seconds an invalidated key keeps a marker that only set(...,
+        replace_invalidated=True) replaces; 0 deletes the entry outright
+    """
+
+    def __init__(self, backend, hold=0):
+        self.backend = backend
+        self.hold = hold
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value == INVALIDATED:
+            value = None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None, replace_invalidated=True):
+        # pages read from a lagging replica pass replace_invalidated=False, so they can't put back
+        # what an invalidation less than hold seconds ago removed
+        if not replace_invalidated and self.hold and self.backend.get(key) == INVALIDATED:
+            return
+        self.backend.set(key, value, ttl)
+
+    def invalidate(self, *keys):
+        for key in keys:
+            if self.hold:
+                self.backend.set(key, INVALIDATED, self.hold)
+            else:
+                self.backend.delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None
+        }
+
+
+def create_backend(config):
+    if config['PAGE_CACHE_BACKEND'] == 'filesystem':
+        return FileBackend(config['PAGE_CACHE_DIR'], ttl=config['PAGE_CACHE_TTL'])
+    elif config['PAGE_CACHE_BACKEND'] == 'memory':
+        return MemoryBackend(config['PAGE_CACHE_SIZE'], ttl=config['PAGE_CACHE_TTL'])
+    raise ValueError(f"Unknown PAGE_CACHE_BACKEND {config['PAGE_CACHE_BACKEND']!r}")
+
+
+def create_cache(config):
+    return Cache(create_backend(config))
+
+#----------------------------------------------------------------------------#
+# Template fragments.
+#----------------------------------------------------------------------------#
+
+
+class FragmentCacheExtension(Extension):
+
+    """
+    Adds a {% cache key, ttl %}...{% endcache %} block to Jinja, which renders
+    its body once and then serves it from environment.fragment_cache until
+    ttl seconds (default FRAGMENT_CACHE_TTL) have passed
+    ...
+
+    The key is a string or a tuple. Giving it the kind, the entity id and
+    the entity's version, e.g. ('venue-card', venue.id, venue.version), makes
+    an edited entity render under a new key, so fragments never need
+    invalidating and the old ones expire on their own.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        fragment_cache = self.environment.fragment_cache
+        if fragment_cache is None:
+            return caller()
+        if isinstance(key, (tuple, list)):
+            # quoted, so that a ':' inside a part can't make two keys collide
+            key = ':'.join(quote(str(part), safe='') for part in key)
+        value = fragment_cache.get(key)
+        if value is None:
+            value = str(caller())
+            fragment_cache.set(key, value, ttl or self.environment.fragment_cache_ttl)
+        return Markup(value)
+
+
+def init_fragment_cache(app, page_cache):
+    """
+    Enables {% cache %} in app's templates. Fragments are kept in their own
+    namespace of page_cache's backend, with FRAGMENT_CACHE_SIZE entries, so a
+    listing with many cards can't evict cached pages, and are counted
+    separately from pages in the returned Cache.
+    """
+    fragment_cache = Cache(page_cache.backend.namespace('fragments', app.config['FRAGMENT_CACHE_SIZE']))
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = fragment_cache
+    app.jinja_env.fragment_cache_ttl = app.config['FRAGMENT_CACHE_TTL']
+    return fragment_cache
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count and Artist.upcoming_shows_count hold the number of
+# shows starting after now. Writes adjust them inside the caller's transaction;
+# expire_started_shows() catches up on shows that have since started, and
+# check_counters() recomputes everything from the show table.
+
+COUNTED_MODELS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def record_new_show(show, now):
+    if show.start_time <= now:
+        return
+    for model, column in COUNTED_MODELS:
+        model.query.filter_by(id=getattr(show, column.key)).update(
+            {model.upcoming_shows_count: model.upcoming_shows_count + 1, model.version: model.version + 1},
+            synchronize_session=False)
+        # SQL: UPDATE venue SET upcoming_shows_count = upcoming_shows_count + 1, version = version + 1 WHERE id={VENUE_ID};
+
+
+def _recount(model, column, now, entity_ids=None):
+    upcoming = db.session.query(db.func.count(Show.id)).filter(
+        column == model.id, Show.start_time > now).scalar_subquery()
+    # only rows whose count changes are written, so only their version (and cached cards) move on
+    query = model.query.filter(model.upcoming_shows_count != upcoming)
+    if entity_ids is not None:
+        query = query.filter(model.id.in_(entity_ids))
+    # SQL: UPDATE venue SET upcoming_shows_count = (SELECT COUNT(*) FROM show WHERE venue_id=venue.id AND start_time > NOW()),
+    # version = version + 1 WHERE id IN ({ENTITY_IDS}) AND upcoming_shows_count != (SELECT COUNT(*) ...);
+    return query.update({model.upcoming_shows_count: upcoming, model.version: model.version + 1},
+                        synchronize_session=False)
+
+
+def recount(venue_id, artist_id, now):
+    # for writes that add or remove many shows of one venue and artist at once (show series)
+    _recount(Venue, Show.venue_id, now, [venue_id])
+    _recount(Artist, Show.artist_id, now, [artist_id])
+
+
+def recount_entities(model, entity_ids, now):
+    # for shows removed in batches (see deletions.py): the other side of each removed show
+    return _recount(model, dict(COUNTED_MODELS)[model], now, entity_ids) if entity_ids else 0
+
+
+def expire_started_shows(since, now):
+    """
+    Recounts the venues and artists with shows that started in (since, now].
+
+    Counts are recomputed rather than decremented, so overlapping runs from
+    several workers cannot double count. Returns the number of counts that
+    changed.
+    """
+    updated = 0
+    for model, column in COUNTED_MODELS:
+        started = db.session.query(column).filter(
+            Show.start_time > since, Show.start_time <= now)
+        updated += _recount(model, column, now, started)
+    db.session.commit()
+    return updated
+
+
+def check_counters(now, fix=False):
+    """
+    Recomputes the counters from the show table and returns the drift as a
+    list of (table, id, stored, actual). With fix=True the stored counts are
+    corrected in the same pass.
+    """
+    drift = []
+    for model, column in COUNTED_MODELS:
+        actual = db.session.query(model.id, model.upcoming_shows_count, db.func.count(Show.id)).outerjoin(
+            Show, db.and_(column == model.id, Show.start_time > now)).group_by(
+            model.id, model.upcoming_shows_count).all()
+        # SQL: SELECT venue.id, venue.upcoming_shows_count, COUNT(show.id) FROM venue
+        # LEFT OUTER JOIN show ON show.venue_id = venue.id AND show.start_time > NOW() GROUP BY venue.id;
+        drift.extend((model.__tablename__, entity_id, stored, count)
+                     for entity_id, stored, count in actual if stored != count)
+    if fix and drift:
+        for model, column in COUNTED_MODELS:
+            _recount(model, column, now, [entity_id for table, entity_id, _, _ in drift
+                                          if table == model.__tablename__])
+        db.session.commit()
+    return drift
@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+from datetime import datetime
+from models import db, Venue, Artist, Show, DeletionJob
+import counters
+
+#----------------------------------------------------------------------------#
+# Soft delete.
+#----------------------------------------------------------------------------#
+
+# entity_type: (model, the show column pointing at it, the model on the other side of its shows)
+ENTITIES = {
+    'venue': (Venue, Show.venue_id, Artist),
+    'artist': (Artist, Show.artist_id, Venue),
+}
+
+
+def soft_delete(entity_type, entity_id, now):
+    """
+    Marks the venue or artist deleted and records a DeletionJob, with a
+    remove-deleted job that removes its shows and then the row itself.
+    Returns the DeletionJob, or None if there is no such (undeleted) entity.
+    The caller commits.
+    """
+    import jobs
+    model, column, _ = ENTITIES[entity_type]
+    marked = model.query.filter(model.id == entity_id, model.deleted_at.is_(None)).update(
+        {model.deleted_at: now}, synchronize_session=False)
+    # SQL: UPDATE venue SET deleted_at={NOW} WHERE id={ID} AND deleted_at IS NULL;
+    if not marked:
+        return None
+    total = db.session.query(db.func.count(Show.id)).filter(column == entity_id).scalar()
+    # SQL: SELECT COUNT(show.id) FROM show WHERE venue_id={ID};
+    deletion = DeletionJob(entity_type=entity_type, entity_id=entity_id, total_shows=total,
+                           removed_shows=0, created_at=now)
+    db.session.add(deletion)
+    db.session.flush()
+    deletion.job = jobs.enqueue('remove-deleted', {'deletion_id': deletion.id}, key=f'deletion:{deletion.id}', now=now)
+    return deletion
+
+
+def bookable(venue_id, artist_id):
+    # shows may only be added between a venue and an artist that exist and are not deleted
+    found = db.session.query(
+        db.session.query(Venue.id).filter(Venue.id == venue_id, Venue.deleted_at.is_(None)).exists(),
+        db.session.query(Artist.id).filter(Artist.id == artist_id, Artist.deleted_at.is_(None)).exists()).one()
+    # SQL: SELECT EXISTS (SELECT id FROM venue WHERE id={VENUE_ID} AND deleted_at IS NULL),
+    # EXISTS (SELECT id FROM artist WHERE id={ARTIST_ID} AND deleted_at IS NULL);
+    return all(found)
+
+
+def deleted_names(model, names):
+    # names still taken by soft-deleted rows, which the unique index keeps until the row is removed
+    if not names:
+        return set()
+    taken = {name for name, in db.session.query(model.name).filter(
+        model.name.in_(names), model.deleted_at.isnot(None))}
+    # SQL: SELECT name FROM venue WHERE name IN ({NAMES}) AND deleted_at IS NOT NULL;
+    return taken
+
+#----------------------------------------------------------------------------#
+# Background removal.
+#----------------------------------------------------------------------------#
+
+
+def run_job(job, batch_size, pause):
+    """
+    Removes the shows of the job's entity batch_size at a time, committing
+    (and so releasing its locks on show) after each batch and sleeping pause
+    seconds between batches, then deletes the entity. The counters of the
+    venues/artists on the other side of the removed shows are recounted as
+    it goes. Runs as the remove-deleted task; after a failed attempt the
+    shows already removed stay removed and the next attempt carries on.
+    """
+    model, column, other_model = ENTITIES[job.entity_type]
+    other_column = Show.artist_id if job.entity_type == 'venue' else Show.venue_id
+    if job.started_at is None:
+        job.started_at = datetime.now()
+        db.session.commit()
+    while True:
+        rows = db.session.query(Show.id, other_column).filter(column == job.entity_id).order_by(
+            Show.id).limit(batch_size).all()
+        # SQL: SELECT id, artist_id FROM show WHERE venue_id={ID} ORDER BY id LIMIT {BATCH_SIZE};
+        if not rows:
+            break
+        Show.query.filter(Show.id.in_([show_id for show_id, _ in rows])).delete(synchronize_session=False)
+        # SQL: DELETE FROM show WHERE id IN ({IDS});
+        now = datetime.now()
+        counters.recount_entities(other_model, {other_id for _, other_id in rows}, now)
+        job.removed_shows += len(rows)
+        db.session.commit()
+        time.sleep(pause)
+    # genre links and show series go with the row (ON DELETE CASCADE)
+    model.query.filter(model.id == job.entity_id).delete(synchronize_session=False)
+    # SQL: DELETE FROM venue WHERE id={ID};
+    job.finished_at = datetime.now()
+    db.session.commit()
@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Export queries.
+#----------------------------------------------------------------------------#
+
+# rows fetched from the server-side cursor, and written out, per chunk
+CHUNK_SIZE = 1000
+
+
+def _venue_query(since, until):
+    # SQL: SELECT id, name, genres, city, ... FROM venue WHERE deleted_at IS NULL ORDER BY id;
+    return db.session.query(
+        Venue.id, Venue.name, Venue.genres, Venue.city, Venue.state, Venue.address, Venue.phone,
+        Venue.website_link, Venue.image_link, Venue.facebook_link, Venue.seeking_talent,
+        Venue.seeking_description, Venue.upcoming_shows_count).filter(Venue.deleted_at.is_(None)).order_by(Venue.id)
+
+
+def _artist_query(since, until):
+    # SQL: SELECT id, name, genres, city, ... FROM artist WHERE deleted_at IS NULL ORDER BY id;
+    return db.session.query(
+        Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state, Artist.phone,
+        Artist.website_link, Artist.image_link, Artist.facebook_link, Artist.seeking_venue,
+        Artist.seeking_description, Artist.upcoming_shows_count).filter(Artist.deleted_at.is_(None)).order_by(
+        Artist.id)
+
+
+def _show_query(since, until):
+    query = db.session.query(
+        Show.id, Show.start_time, Show.end_time, Show.artist_id, Artist.name.label('artist_name'),
+        Show.venue_id, Venue.name.label('venue_name')).join(
+        Artist, Show.artist_id == Artist.id).join(Venue, Show.venue_id == Venue.id).filter(
+        Artist.deleted_at.is_(None), Venue.deleted_at.is_(None))
+    if since is not None:
+        query = query.filter(Show.start_time >= since)
+    if until is not None:
+        query = query.filter(Show.start_time < until)
+    # SQL: SELECT show.id, show.start_time, show.end_time, show.artist_id, artist.name, show.venue_id, venue.name
+    # FROM show JOIN artist ON ... JOIN venue ON ... WHERE artist.deleted_at IS NULL AND venue.deleted_at IS NULL
+    # AND start_time >= {SINCE} AND start_time < {UNTIL}
+    # ORDER BY start_time, id;
+    return query.order_by(Show.start_time, Show.id)
+
+
+# since/until only apply to shows, the only table with a start_time
+QUERIES = {'venues': _venue_query, 'artists': _artist_query, 'shows': _show_query}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _chunks(rows, fmt, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(columns)
+    count = 0
+    for row in rows:
+        if fmt == 'csv':
+            writer.writerow([_value(value) for value in row])
+        else:
+            buffer.write(json.dumps({column: _value(value) for column, value in zip(columns, row)}))
+            buffer.write('\n')
+        count += 1
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def generate(kind, fmt, since=None, until=None):
+    """
+    Yields the export of kind ('venues', 'artists' or 'shows') as CSV or NDJSON text.
+
+    Rows are read through a server-side cursor CHUNK_SIZE at a time, so
+    memory use does not grow with the size of the table.
+    """
+    query = QUERIES[kind](since, until)
+    columns = [column['name'] for column in query.column_descriptions]
+    rows = query.execution_options(stream_results=True).yield_per(CHUNK_SIZE)
+    yield from _chunks(rows, fmt, columns)
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
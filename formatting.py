@@ -0,0 +1,93 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+# babel is imported on the first formatted date rather than with the app
+from datetime import datetime
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# named formats accepted by the datetime filter; anything else is used as a babel pattern
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=256)
+def compiled_pattern(format, locale):
+    """
+    Returns the parsed babel pattern and Locale for a (format, locale) pair,
+    so both are looked up once per worker instead of once per formatted date.
+    """
+    from babel.core import Locale
+    from babel.dates import parse_pattern
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=256)
+def get_timezone(name):
+    # None for names babel does not know, so a bad tz cookie falls back to the default zone
+    from babel.dates import get_timezone
+    try:
+        return get_timezone(name)
+    except LookupError:
+        return None
+
+
+def _localize(value, zone):
+    # pytz zones (babel < 2.12) need localize(); zoneinfo zones are simply attached
+    localize = getattr(zone, 'localize', None)
+    return localize(value) if localize else value.replace(tzinfo=zone)
+
+
+def to_timezone(value, stored_timezone, timezone):
+    """
+    Converts value, a naive datetime in stored_timezone (or an aware one), to
+    a naive datetime in timezone.
+    """
+    if value.tzinfo is None:
+        if timezone == stored_timezone:
+            return value
+        value = _localize(value, get_timezone(stored_timezone))
+    return value.astimezone(get_timezone(timezone)).replace(tzinfo=None)
+
+
+def format_datetime(value, format='medium', locale='en', timezone=None, stored_timezone='UTC'):
+    """
+    Formats value, a datetime (or an ISO 8601 string), with the named format
+    or babel pattern in locale, converted to timezone when one is given.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            import dateutil.parser
+            value = dateutil.parser.parse(value)
+    if timezone is not None:
+        value = to_timezone(value, stored_timezone, timezone)
+    pattern, babel_locale = compiled_pattern(format, locale)
+    return pattern.apply(value, babel_locale)
+
+#----------------------------------------------------------------------------#
+# Per-request settings.
+#----------------------------------------------------------------------------#
+
+
+def request_settings(config, cookies, accept_languages):
+    """
+    Returns the (locale, timezone) a request's dates are shown in: the
+    `locale` cookie or the best Accept-Language match among SUPPORTED_LOCALES,
+    and the `tz` cookie when it names a known zone, else the defaults.
+    """
+    supported = config['SUPPORTED_LOCALES']
+    locale = cookies.get('locale')
+    if locale not in supported:
+        locale = accept_languages.best_match(supported) or config['DEFAULT_LOCALE']
+    timezone = cookies.get('tz')
+    if not timezone or get_timezone(timezone) is None:
+        timezone = config['SHOW_TIMEZONE']
+    return locale, timezone
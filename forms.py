@@ -1,7 +1,26 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, DateField, TimeField, TextAreaField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, Optional, NumberRange
+from models import db, Genre, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+
+# genres always offered, so that a database created without the genre migration's seed data still has them
+DEFAULT_GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+]
+
+
+def default_genre_choices():
+    return [(name, name) for name in DEFAULT_GENRES]
+
+
+def genre_choices():
+    names = {name for name, in db.session.query(Genre.name)}
+    # SQL: SELECT name FROM genre;
+    return [(name, name) for name in sorted(names.union(DEFAULT_GENRES))]
+
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -15,6 +34,78 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # minutes
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=int(MAX_SHOW_DURATION.total_seconds()) // 60)],
+        default=int(DEFAULT_SHOW_DURATION.total_seconds()) // 60
+    )
+
+
+# the largest id a postgres integer column holds
+MAX_ID = 2 ** 31 - 1
+
+
+class ShowSeriesForm(ShowForm):
+    # numbers, so that a non-numeric id fails validation rather than the lookups that follow it
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired(), NumberRange(min=1, max=MAX_ID)]
+    )
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired(), NumberRange(min=1, max=MAX_ID)]
+    )
+    # start_time is the first occurrence
+    frequency = SelectField(
+        'frequency', validators=[DataRequired()],
+        choices=[
+            ('weekly', 'Weekly'),
+            ('monthly', 'Monthly'),
+            ('dates', 'On the dates below'),
+        ]
+    )
+    # weeks or months between occurrences
+    every = IntegerField(
+        'every', validators=[Optional(), NumberRange(min=1, max=52)], default=1
+    )
+    until = DateField(
+        'until', validators=[Optional()]
+    )
+    count = IntegerField(
+        'count', validators=[Optional(), NumberRange(min=1)]
+    )
+    # one date (or date and time) per line
+    dates = TextAreaField(
+        'dates', validators=[Optional()]
+    )
+
+    def validate(self, *args, **kwargs):
+        # which of until, count and dates is required depends on the frequency
+        valid = super().validate(*args, **kwargs)
+        if self.frequency.data == 'dates':
+            import series
+            try:
+                if not series.parse_dates(self.dates.data or '', self.start_time.data or datetime.today()):
+                    self.dates.errors.append('Enter at least one date.')
+                    valid = False
+            except ValueError:
+                self.dates.errors.append('Dates must look like YYYY-MM-DD or YYYY-MM-DD HH:MM.')
+                valid = False
+        elif self.until.data is None and self.count.data is None:
+            self.until.errors.append('Enter an end date or a number of occurrences.')
+            valid = False
+        return valid
+
+
+class SeriesEditForm(Form):
+    # empty keeps each occurrence's start time
+    time_of_day = TimeField(
+        'time_of_day', validators=[Optional()], format='%H:%M'
+    )
+    # minutes
+    duration = IntegerField(
+        'duration',
+        validators=[DataRequired(), NumberRange(min=1, max=int(MAX_SHOW_DURATION.total_seconds()) // 60)]
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -96,27 +187,7 @@ class VenueForm(Form):
     genres = SelectMultipleField(
         # TODO implement enum restriction
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=default_genre_choices()
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL()]
@@ -131,6 +202,11 @@ class VenueForm(Form):
         'seeking_description'
     )
 
+    def __init__(self, *args, genre_options=None, **kwargs):
+        # genre_options lets callers validating many rows load the choices once
+        super().__init__(*args, **kwargs)
+        self.genres.choices = genre_options or genre_choices()
+
 
 
 class ArtistForm(Form):
@@ -210,27 +286,7 @@ class ArtistForm(Form):
     )
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=default_genre_choices()
      )
     facebook_link = StringField(
         # TODO implement enum restriction
@@ -247,3 +303,7 @@ class ArtistForm(Form):
             'seeking_description'
      )
 
+    def __init__(self, *args, genre_options=None, **kwargs):
+        # genre_options lets callers validating many rows load the choices once
+        super().__init__(*args, **kwargs)
+        self.genres.choices = genre_options or genre_choices()
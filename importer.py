@@ -0,0 +1,419 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm, genre_choices
+from models import db, Venue, Artist, Show, Genre, venue_genre, artist_genre
+import counters
+import bookings
+import deletions
+
+#----------------------------------------------------------------------------#
+# Reading rows.
+#----------------------------------------------------------------------------#
+
+FALSE_VALUES = ('', 'false', 'f', '0', 'no', 'n')
+
+
+def read_rows(path, fmt=None):
+    """
+    Yields (line number, row dict) from a CSV file with a header row, or from a
+    JSONL file with one object per line. The format is taken from the file
+    extension unless fmt is given.
+    """
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+
+
+def to_formdata(row):
+    # converts a row into the form data a browser would have posted for it
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key.startswith('seeking_') and key != 'seeking_description':
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(key, 'y')
+        elif isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        elif key == 'genres':
+            for item in str(value).split(','):
+                data.add(key, item.strip())
+        elif key == 'start_time':
+            data.add(key, str(value).replace('T', ' ')[:19])
+        else:
+            data.add(key, str(value))
+    return data
+
+#----------------------------------------------------------------------------#
+# Row validation.
+#----------------------------------------------------------------------------#
+
+
+class ImportReport:
+
+    """
+    The outcome of an import
+    ...
+
+    Attributes
+    ----------
+    inserted : int
+        the number of rows written to the database
+    errors : list
+        (line number, {field: [messages]}) for every rejected row
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def reject(self, line_no, errors):
+        self.errors.append((line_no, errors))
+
+
+class EntityLoader:
+
+    """
+    Validates venue or artist rows with the same form the create page uses
+    ...
+
+    Attributes
+    ----------
+    model : db.Model
+        Venue or Artist
+    form_class : type
+        VenueForm or ArtistForm
+    link_table : db.Table
+        the genre association table for the model
+    columns : list
+        the model columns filled from the form
+    """
+
+    def __init__(self, model, form_class, link_table, columns):
+        self.model = model
+        self.form_class = form_class
+        self.link_table = link_table
+        self.link_column = f'{model.__tablename__}_id'
+        self.columns = columns
+        self.genre_options = genre_choices()
+
+    def validate(self, row):
+        form = self.form_class(formdata=to_formdata(row), meta={'csrf': False},
+                               genre_options=self.genre_options)
+        if not form.validate():
+            return None, form.errors
+        record = {column: getattr(form, column).data for column in self.columns}
+        record['genres'] = ','.join(form.genres.data)
+        return record, None
+
+    def after_insert(self, records, ids=None):
+        # genre links need the ids the database assigned, looked up by the unique name
+        # unless the caller already has them (a {name: id} dict)
+        if ids is None:
+            ids = dict(db.session.query(self.model.name, self.model.id).filter(
+                self.model.name.in_([record['name'] for record in records])))
+            # SQL: SELECT name, id FROM venue WHERE name IN ({NAMES});
+        genres = Genre.from_names(
+            sorted({genre for record in records for genre in record['genres'].split(',')}))
+        db.session.flush()
+        genre_ids = {genre.name: genre.id for genre in genres}
+        links = [{self.link_column: ids[record['name']], 'genre_id': genre_ids[genre]}
+                 for record in records for genre in set(record['genres'].split(','))]
+        if links:
+            db.session.execute(self.link_table.insert(), links)
+            # SQL: INSERT INTO venue_genre(venue_id, genre_id) VALUES ({VENUE_ID}, {GENRE_ID}), ...;
+
+
+class ShowLoader:
+
+    """
+    Validates show rows with ShowForm, resolving artists and venues by id or name
+    ...
+
+    Attributes
+    ----------
+    artists : dict
+        maps artist names to ids, loaded once per import
+    venues : dict
+        maps venue names to ids, loaded once per import
+    """
+
+    model = Show
+    columns = ['artist_id', 'venue_id', 'start_time', 'end_time']
+
+    def __init__(self):
+        self.artists = dict(db.session.query(Artist.name, Artist.id).filter(Artist.deleted_at.is_(None)))
+        # SQL: SELECT name, id FROM artist WHERE deleted_at IS NULL;
+        self.venues = dict(db.session.query(Venue.name, Venue.id).filter(Venue.deleted_at.is_(None)))
+        # SQL: SELECT name, id FROM venue WHERE deleted_at IS NULL;
+        self.artist_ids = set(self.artists.values())
+        self.venue_ids = set(self.venues.values())
+
+    def resolve(self, row, kind, names, ids):
+        # a row names the artist/venue either by {kind}_id or by {kind} (its name)
+        if row.get(f'{kind}_id') not in (None, ''):
+            try:
+                entity_id = int(row[f'{kind}_id'])
+            except ValueError:
+                return None, f'{kind}_id must be a number.'
+            return (entity_id, None) if entity_id in ids else (None, f'No {kind} with id {entity_id}.')
+        if row.get(kind):
+            entity_id = names.get(row[kind])
+            return (entity_id, None) if entity_id is not None else (None, f'No {kind} named {row[kind]}.')
+        return None, f'{kind}_id or {kind} is required.'
+
+    def validate(self, row):
+        errors = {}
+        row = dict(row)
+        for kind, names, ids in (('artist', self.artists, self.artist_ids), ('venue', self.venues, self.venue_ids)):
+            entity_id, error = self.resolve(row, kind, names, ids)
+            if error:
+                errors[f'{kind}_id'] = [error]
+            row[f'{kind}_id'] = entity_id
+            row.pop(kind, None)
+        form = ShowForm(formdata=to_formdata(row), meta={'csrf': False})
+        if not form.validate():
+            for field, messages in form.errors.items():
+                errors.setdefault(field, messages)
+        if errors:
+            return None, errors
+        # overlapping shows are rejected by the exclusion constraints on postgres
+        return {'artist_id': int(form.artist_id.data), 'venue_id': int(form.venue_id.data),
+                'start_time': form.start_time.data,
+                'end_time': bookings.end_time_for(form.start_time.data, form.duration.data)}, None
+
+    def after_insert(self, records):
+        pass
+
+
+def venue_loader():
+    return EntityLoader(Venue, VenueForm, venue_genre, [
+        'name', 'city', 'state', 'address', 'phone', 'website_link', 'image_link',
+        'facebook_link', 'seeking_talent', 'seeking_description'])
+
+
+def artist_loader():
+    return EntityLoader(Artist, ArtistForm, artist_genre, [
+        'name', 'city', 'state', 'phone', 'website_link', 'image_link',
+        'facebook_link', 'seeking_venue', 'seeking_description'])
+
+
+LOADERS = {'venues': venue_loader, 'artists': artist_loader, 'shows': ShowLoader}
+# kinds that have a unique name to upsert on
+UPSERT_LOADERS = {'venues': venue_loader, 'artists': artist_loader}
+
+#----------------------------------------------------------------------------#
+# Batch inserts.
+#----------------------------------------------------------------------------#
+
+
+def _copy(table, records):
+    # postgres: stream the batch through COPY ... FROM STDIN, much faster than INSERT
+    columns = list(records[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([record[column] for column in columns])
+    buffer.seek(0)
+    quote = db.engine.dialect.identifier_preparer.quote
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {quote(table.name)} ({", ".join(quote(c) for c in columns)}) '
+                           'FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_batch(loader, batch, report):
+    table = loader.model.__table__
+    records = [record for _, record in batch]
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            _copy(table, records)
+        else:
+            db.session.execute(table.insert(), records)
+            # SQL: INSERT INTO show(artist_id, venue_id, start_time, end_time) VALUES (...), (...), ...; (executemany)
+        loader.after_insert(records)
+        db.session.commit()
+        report.inserted += len(records)
+        return
+    except Exception:
+        db.session.rollback()
+    # the batch failed as a whole (e.g. a duplicate name), so insert row by row to find the bad rows
+    for line_no, record in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), [record])
+                loader.after_insert([record])
+            report.inserted += 1
+        except Exception as e:
+            report.reject(line_no, {'row': [str(getattr(e, 'orig', e)).strip()]})
+    db.session.commit()
+
+
+def import_file(kind, path, fmt=None, batch_size=5000):
+    """
+    Validates and inserts every row of path as a venue, artist or show, and
+    returns an ImportReport. Rows are inserted batch_size at a time.
+    """
+    loader = LOADERS[kind]()
+    report = ImportReport()
+    batch = []
+    for line_no, row in read_rows(path, fmt):
+        record, errors = loader.validate(row)
+        if errors:
+            report.reject(line_no, errors)
+            continue
+        batch.append((line_no, record))
+        if len(batch) >= batch_size:
+            _insert_batch(loader, batch, report)
+            batch = []
+    if batch:
+        _insert_batch(loader, batch, report)
+    if kind == 'shows' and report.inserted:
+        counters.check_counters(datetime.now(), fix=True)
+    return report
+
+#----------------------------------------------------------------------------#
+# Upserts.
+#----------------------------------------------------------------------------#
+
+
+def _upsert_statement(table, records):
+    # INSERT ... ON CONFLICT (name) DO UPDATE, or None on databases without it; counters such as
+    # upcoming_shows_count are not in the records, so existing rows keep them
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    statement = insert(table).values(records)
+    values = {column: statement.excluded[column] for column in records[0] if column != 'name'}
+    # updated rows render differently, so their cached cards must not be served
+    values['version'] = table.c.version + 1
+    return statement.on_conflict_do_update(index_elements=[table.c.name], set_=values)
+
+
+def _upsert(loader, records):
+    """
+    Upserts records in one statement and returns {name: (id, created)}.
+    """
+    table = loader.model.__table__
+    names = [record['name'] for record in records]
+    statement = _upsert_statement(table, records)
+    if db.engine.dialect.name == 'postgresql':
+        # xmax is 0 only on row versions written by an INSERT, so it tells created rows from updated ones
+        rows = db.session.execute(statement.returning(
+            table.c.name, table.c.id, db.literal_column('xmax = 0').label('created'))).all()
+        # SQL: INSERT INTO venue (name, genres, city, ...) VALUES ({NAME}, {GENRES}, {CITY}, ...), (...), ...
+        # ON CONFLICT (name) DO UPDATE SET genres = excluded.genres, city = excluded.city, ...
+        # RETURNING name, id, xmax = 0 AS created;
+        return {row.name: (row.id, row.created) for row in rows}
+    # without RETURNING, the names that already exist are read before the upsert and the ids after it
+    existing = {name for name, in db.session.query(table.c.name).filter(table.c.name.in_(names))}
+    # SQL: SELECT name FROM venue WHERE name IN ({NAMES});
+    if statement is not None:
+        db.session.execute(statement)
+    else:
+        # no ON CONFLICT: new names are inserted and the rest updated one by one; a name inserted
+        # by someone else in between fails the batch, which upsert() then retries row by row
+        new = [record for record in records if record['name'] not in existing]
+        if new:
+            db.session.execute(table.insert(), new)
+            # SQL: INSERT INTO venue (name, genres, city, ...) VALUES ({NAME}, {GENRES}, {CITY}, ...);
+        for record in records:
+            if record['name'] in existing:
+                values = {column: value for column, value in record.items() if column != 'name'}
+                values['version'] = table.c.version + 1
+                db.session.execute(table.update().where(table.c.name == record['name']).values(values))
+                # SQL: UPDATE venue SET genres={GENRES}, city={CITY}, ..., version=version + 1 WHERE name={NAME};
+    ids = dict(db.session.query(table.c.name, table.c.id).filter(table.c.name.in_(names)))
+    # SQL: SELECT name, id FROM venue WHERE name IN ({NAMES});
+    return {name: (entity_id, name not in existing) for name, entity_id in ids.items()}
+
+
+def _write_upsert(loader, records):
+    # upserts records and replaces the genre links of the rows that already existed
+    saved = _upsert(loader, records)
+    updated_ids = [entity_id for entity_id, created in saved.values() if not created]
+    if updated_ids:
+        db.session.execute(loader.link_table.delete().where(
+            loader.link_table.c[loader.link_column].in_(updated_ids)))
+        # SQL: DELETE FROM venue_genre WHERE venue_id IN ({IDS});
+    loader.after_insert(records, ids={name: entity_id for name, (entity_id, _) in saved.items()})
+    return saved
+
+
+def upsert(kind, rows):
+    """
+    Validates rows as venues or artists (kind) and upserts the valid ones by
+    name in a single INSERT ... ON CONFLICT (name) statement (on databases
+    without one, an INSERT of the new names and an UPDATE per existing
+    name). Returns one
+    result per row, in order: {"status": "created" or "updated", "id": id} or
+    {"status": "failed", "errors": {field: [messages]}}.
+
+    Sending the same rows again updates the same records, so a batch can be
+    retried safely. Only when the statement fails as a whole (e.g. a value
+    too long for its column) are the rows written one at a time, to find the
+    ones to blame.
+    """
+    loader = UPSERT_LOADERS[kind]()
+    results = [None] * len(rows)
+    batch = {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[i] = {"status": "failed", "errors": {"row": ['Must be an object.']}}
+            continue
+        record, errors = loader.validate(row)
+        if not errors and record['name'] in batch:
+            # one statement cannot update the same row twice
+            errors = {'name': ['Appears earlier in this batch.']}
+        if errors:
+            results[i] = {"status": "failed", "errors": errors}
+            continue
+        batch[record['name']] = (i, record)
+    # a deleted venue or artist keeps its name until its remove-deleted job removes the row; an
+    # upsert would update that row, which stays hidden and is then removed with the changes
+    for name in deletions.deleted_names(loader.model, list(batch)):
+        i, _ = batch.pop(name)
+        results[i] = {"status": "failed", "errors": {"name": ['Belongs to a record that is being deleted.']}}
+    if not batch:
+        return results
+
+    records = [record for _, record in batch.values()]
+    try:
+        saved = _write_upsert(loader, records)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        saved = {}
+        for i, record in batch.values():
+            try:
+                with db.session.begin_nested():
+                    saved.update(_write_upsert(loader, [record]))
+            except Exception as e:
+                results[i] = {"status": "failed", "errors": {"row": [str(getattr(e, 'orig', e)).strip()]}}
+        db.session.commit()
+    for name, (i, _) in batch.items():
+        if name in saved:
+            entity_id, created = saved[name]
+            results[i] = {"status": "created" if created else "updated", "id": entity_id}
+    return results
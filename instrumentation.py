@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import heapq
+import json
+import time
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# SQL statement timing.
+#----------------------------------------------------------------------------#
+
+
+class RequestStats:
+
+    """
+    The SQL activity of one request
+    ...
+
+    Attributes
+    ----------
+    started : float
+        perf_counter() when the request began
+    queries : int
+        the number of statements executed
+    db_time : float
+        seconds spent executing statements
+    slowest : list
+        a min-heap of the (seconds, statement) pairs for the slowest statements
+    """
+
+    def __init__(self, keep):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []
+        self.keep = keep
+
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (elapsed, statement))
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed, statement))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    # statements run outside a request (CLI commands, background threads) are not tracked
+    stats = g.get('sql_stats') if has_app_context() else None
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+#----------------------------------------------------------------------------#
+# Request hooks.
+#----------------------------------------------------------------------------#
+
+
+def init_app(app):
+    """
+    Counts the statements each request runs, reports them in a Server-Timing
+    header, and logs requests slower than SLOW_REQUEST_MS or running more than
+    SLOW_REQUEST_QUERIES statements, with their slowest statements.
+    """
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = RequestStats(app.config['SLOW_REQUEST_STATEMENTS'])
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        response.headers.add(
+            'Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.queries} queries", total;dur={total_ms:.1f}')
+        if total_ms > app.config['SLOW_REQUEST_MS'] or stats.queries > app.config['SLOW_REQUEST_QUERIES']:
+            app.logger.warning('slow request %s', json.dumps({
+                "method": request.method,
+                "path": request.full_path.rstrip('?'),
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "duration_ms": round(total_ms, 1),
+                "db_ms": round(db_ms, 1),
+                "queries": stats.queries,
+                "slowest": [{"ms": round(elapsed * 1000, 1), "sql": statement}
+                            for elapsed, statement in sorted(stats.slowest, reverse=True)]
+            }))
+        return response
@@ -0,0 +1,330 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, Job, JobArchive, DeletionJob
+import counters
+import deletions
+
+#----------------------------------------------------------------------------#
+# Tasks.
+#----------------------------------------------------------------------------#
+
+# name: (function, max_attempts or None for JOBS_MAX_ATTEMPTS)
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """
+    Registers the decorated function as the task name. Jobs call it with
+    their args as keyword arguments, inside an app context; it commits its
+    own work, and raising makes the job try again later.
+    """
+    def register(function):
+        TASKS[name] = (function, max_attempts)
+        return function
+    return register
+
+
+@task('expire-counters', max_attempts=1)
+def expire_counters_task():
+    # recounts the venues/artists whose shows started since about two runs ago, so a late run
+    # misses nothing; anything older (no worker was up) is caught up by check-counters
+    now = datetime.now()
+    every = current_app.config['JOBS_SCHEDULE'].get('expire-counters', 60)
+    counters.expire_started_shows(now - timedelta(seconds=2 * every), now)
+
+
+@task('check-counters')
+def check_counters_task():
+    drift = counters.check_counters(datetime.now(), fix=True)
+    if drift:
+        current_app.logger.warning(f'Corrected {len(drift)} upcoming show counters.')
+
+
+@task('refresh-views', max_attempts=1)
+def refresh_views_task(concurrently=True):
+    # a missed refresh is made up by the next scheduled one
+    import matviews
+    if matviews.available():
+        matviews.refresh_views(concurrently=concurrently)
+
+
+@task('remove-deleted')
+def remove_deleted_task(deletion_id):
+    deletion = DeletionJob.query.get(deletion_id)
+    if deletion is not None and deletion.finished_at is None:
+        config = current_app.config
+        deletions.run_job(deletion, config['DELETION_BATCH_SIZE'], config['DELETION_BATCH_PAUSE'])
+
+
+@task('archive-jobs')
+def archive_jobs_task(days=None, batch_size=1000):
+    """
+    Moves the jobs that finished more than days (default JOBS_KEEP_DAYS)
+    ago from the job table to job_archive, batch_size at a time. Jobs of
+    deletions that have not finished stay, since retrying them needs the job.
+    """
+    now = datetime.now()
+    before = now - timedelta(days=current_app.config['JOBS_KEEP_DAYS'] if days is None else days)
+    columns = [column.name for column in JobArchive.__table__.columns if column.name != 'archived_at']
+    while True:
+        ids = [job_id for job_id, in db.session.query(Job.id).filter(
+            Job.status.in_(('done', 'failed')), Job.finished_at < before,
+            ~db.session.query(DeletionJob.id).filter(
+                DeletionJob.job_id == Job.id, DeletionJob.finished_at.is_(None)).exists()).order_by(
+            Job.id).limit(batch_size).with_for_update(skip_locked=True)]
+        # SQL: SELECT id FROM job WHERE status IN ('done', 'failed') AND finished_at < {BEFORE} AND NOT EXISTS
+        # (SELECT id FROM deletion_job WHERE job_id=job.id AND finished_at IS NULL) ORDER BY id LIMIT {BATCH_SIZE}
+        # FOR UPDATE SKIP LOCKED;
+        if not ids:
+            break
+        db.session.execute(JobArchive.__table__.insert().from_select(
+            columns + ['archived_at'],
+            db.select([getattr(Job, name) for name in columns] + [db.literal(now)]).where(Job.id.in_(ids))))
+        # SQL: INSERT INTO job_archive(id, name, ..., finished_at, archived_at)
+        # SELECT id, name, ..., finished_at, {NOW} FROM job WHERE id IN ({IDS});
+        Job.query.filter(Job.id.in_(ids)).delete(synchronize_session=False)
+        # SQL: DELETE FROM job WHERE id IN ({IDS});
+        db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Queue.
+#----------------------------------------------------------------------------#
+
+
+def enqueue(name, args=None, run_at=None, key=None, max_attempts=None, now=None):
+    """
+    Adds a job running the task name with args once run_at (default now) has
+    passed, and returns it. A key already used by another job makes the
+    flush raise IntegrityError. The caller commits.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name}.')
+    now = now or datetime.now()
+    job = Job(name=name, args=json.dumps(args or {}), key=key, status='pending', attempts=0,
+              max_attempts=max_attempts or TASKS[name][1] or current_app.config['JOBS_MAX_ATTEMPTS'],
+              run_at=run_at or now, created_at=now)
+    db.session.add(job)
+    db.session.flush()
+    # SQL: INSERT INTO job(name, args, key, status, attempts, max_attempts, run_at, created_at)
+    # VALUES ({NAME}, {ARGS}, {KEY}, 'pending', 0, {MAX_ATTEMPTS}, {RUN_AT}, {NOW}) RETURNING id;
+    return job
+
+
+def schedule_slot(interval, now):
+    # scheduled runs fall on multiples of interval seconds since the epoch, the same for every worker
+    return datetime.fromtimestamp(int(now.timestamp()) // interval * interval)
+
+
+def enqueue_scheduled(name, interval, now):
+    """
+    Queues the run of the scheduled task name for the current slot, unless
+    some worker already has; the slot is part of the job's unique key.
+    Returns the slot. Runs missed while no worker was up are not made up.
+    """
+    slot = schedule_slot(interval, now)
+    try:
+        with db.session.begin_nested():
+            enqueue(name, run_at=slot, key=f'{name}@{slot.isoformat()}', now=now)
+    except IntegrityError:
+        pass
+    db.session.commit()
+    return slot
+
+
+def requeue(job_id, now):
+    """
+    Gives a failed job another round of attempts, starting now. Returns
+    False if there is no failed job job_id. The caller commits.
+    """
+    requeued = Job.query.filter(Job.id == job_id, Job.status == 'failed').update(
+        {Job.status: 'pending', Job.attempts: 0, Job.run_at: now, Job.finished_at: None},
+        synchronize_session=False)
+    # SQL: UPDATE job SET status='pending', attempts=0, run_at={NOW}, finished_at=NULL WHERE id={ID} AND status='failed';
+    return bool(requeued)
+
+
+def backoff(attempts, base, cap):
+    # seconds before the next attempt: base after the first failure, doubling up to cap
+    return min(cap, base * 2 ** (attempts - 1))
+
+
+def claim(worker_id, now, lease, limit):
+    """
+    Marks up to limit due jobs as running on worker_id for lease and returns
+    their ids. Running jobs whose lease ran out (their worker stopped) are
+    due again, or failed if they have no attempts left. Each claim is a
+    conditional UPDATE on the attempts seen, so only one worker wins a job.
+    """
+    candidates = Job.query.filter(db.or_(
+        db.and_(Job.status == 'pending', Job.run_at <= now),
+        db.and_(Job.status == 'running', Job.locked_until < now))).order_by(
+        Job.run_at, Job.id).limit(limit).all()
+    # SQL: SELECT * FROM job WHERE (status='pending' AND run_at <= {NOW}) OR (status='running' AND locked_until < {NOW})
+    # ORDER BY run_at, id LIMIT {LIMIT};
+    claimed = []
+    for job in candidates:
+        seen = Job.query.filter(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts)
+        if job.status == 'running' and job.attempts >= job.max_attempts:
+            seen.update({Job.status: 'failed', Job.error: f'{job.locked_by} stopped while running the job.',
+                         Job.finished_at: now, Job.locked_by: None, Job.locked_until: None},
+                        synchronize_session=False)
+        elif seen.update({Job.status: 'running', Job.attempts: Job.attempts + 1, Job.locked_by: worker_id,
+                          Job.locked_until: now + lease, Job.started_at: now}, synchronize_session=False):
+            # SQL: UPDATE job SET status='running', attempts=attempts + 1, locked_by={WORKER_ID},
+            # locked_until={NOW} + {LEASE}, started_at={NOW} WHERE id={ID} AND status={STATUS} AND attempts={ATTEMPTS};
+            claimed.append(job.id)
+        db.session.commit()
+    return claimed
+
+
+def execute(job_id, worker_id, now=None):
+    """
+    Runs a job claimed by worker_id and records the outcome: done, pending
+    again after a backoff, or failed once max_attempts is reached. Nothing is
+    recorded if another worker took the job over after this one's lease ran
+    out. Returns the job's new status, or None.
+    """
+    job = Job.query.get(job_id)
+    attempts = job.attempts
+    error = None
+    try:
+        if job.name not in TASKS:
+            raise LookupError(f'Unknown task {job.name}.')
+        TASKS[job.name][0](**json.loads(job.args))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception(f'Job {job_id} ({job.name}) failed.')
+        error = f'{type(e).__name__}: {e}'
+    now = now or datetime.now()
+    config = current_app.config
+    if error is None:
+        values = {Job.status: 'done', Job.error: None, Job.finished_at: now}
+    elif attempts >= job.max_attempts or job.name not in TASKS:
+        values = {Job.status: 'failed', Job.error: error, Job.finished_at: now}
+    else:
+        values = {Job.status: 'pending', Job.error: error, Job.run_at: now + timedelta(
+            seconds=backoff(attempts, config['JOBS_RETRY_BASE'], config['JOBS_RETRY_MAX']))}
+    values.update({Job.locked_by: None, Job.locked_until: None})
+    updated = Job.query.filter(Job.id == job_id, Job.locked_by == worker_id, Job.attempts == attempts).update(
+        values, synchronize_session=False)
+    # SQL: UPDATE job SET status={STATUS}, error={ERROR}, ..., locked_by=NULL, locked_until=NULL
+    # WHERE id={ID} AND locked_by={WORKER_ID} AND attempts={ATTEMPTS};
+    db.session.commit()
+    return values[Job.status] if updated else None
+
+#----------------------------------------------------------------------------#
+# Runner.
+#----------------------------------------------------------------------------#
+
+
+class Runner:
+
+    """
+    Runs the jobs of the job table on a pool of threads in this worker,
+    alongside those of every other worker sharing the database
+    ...
+
+    Attributes
+    ----------
+    worker_id : str
+        identifies this worker in job.locked_by, set when the runner starts
+    wake : threading.Event
+        set to have the dispatcher look for due jobs right away, e.g. after
+        queueing one
+    running : set
+        the ids of the jobs this worker is running
+    schedule : dict
+        maps the tasks of JOBS_SCHEDULE to their intervals in seconds
+    scheduled : dict
+        maps each scheduled task to the last slot this worker queued it for
+    """
+
+    def __init__(self, wake=None):
+        self.worker_id = None
+        self.wake = wake or threading.Event()
+        self.lock = threading.Lock()
+        self.running = set()
+        self.schedule = {}
+        self.scheduled = {}
+
+    def dispatch(self, app, executor, workers):
+        """
+        Queues the scheduled tasks that are due, renews the leases on this
+        worker's running jobs and claims due jobs for its free threads.
+        """
+        config = app.config
+        now = datetime.now()
+        for name, interval in self.schedule.items():
+            if self.scheduled.get(name) != schedule_slot(interval, now):
+                self.scheduled[name] = enqueue_scheduled(name, interval, now)
+        lease = timedelta(seconds=config['JOBS_LEASE'])
+        with self.lock:
+            running = list(self.running)
+        if running:
+            Job.query.filter(Job.id.in_(running), Job.locked_by == self.worker_id).update(
+                {Job.locked_until: now + lease}, synchronize_session=False)
+            # SQL: UPDATE job SET locked_until={NOW} + {LEASE} WHERE id IN ({IDS}) AND locked_by={WORKER_ID};
+            db.session.commit()
+        free = workers - len(running)
+        for job_id in claim(self.worker_id, now, lease, free) if free > 0 else []:
+            with self.lock:
+                self.running.add(job_id)
+            executor.submit(self.execute, app, job_id)
+
+    def execute(self, app, job_id):
+        with app.app_context():
+            try:
+                execute(job_id, self.worker_id)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception(f'Recording the outcome of job {job_id} failed.')
+            finally:
+                db.session.remove()
+        with self.lock:
+            self.running.discard(job_id)
+        # a thread is free for the next due job
+        self.wake.set()
+
+    def start(self, app, workers, interval):
+        """
+        Starts workers threads for jobs and a dispatcher thread that hands
+        them due jobs every interval seconds and whenever wake is set.
+        Returns the dispatcher thread.
+        """
+        # taken here rather than in __init__, which runs before a preforking server forks its workers
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.schedule = {}
+        for name, every in app.config['JOBS_SCHEDULE'].items():
+            if name in TASKS:
+                self.schedule[name] = every
+            else:
+                app.logger.warning(f'JOBS_SCHEDULE names unknown task {name}; it is not scheduled.')
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        self.dispatch(app, executor, workers)
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Job dispatch failed.')
+                    finally:
+                        db.session.remove()
+                self.wake.wait(interval)
+                self.wake.clear()
+
+        thread = threading.Thread(target=run, name='jobs', daemon=True)
+        thread.start()
+        return thread
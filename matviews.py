@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import event
+from models import db
+
+#----------------------------------------------------------------------------#
+# View models.
+#----------------------------------------------------------------------------#
+
+# The view is created by migration e0b6a4d93f15 and given venue.version by
+# 1f7b3c9e5d62. Its table lives in its own MetaData so that db.create_all()
+# and autogenerate leave it alone.
+views_metadata = db.MetaData()
+
+# SQL: CREATE MATERIALIZED VIEW venue_area_summary AS SELECT venue.id AS venue_id, venue.name AS venue_name, venue.city, venue.state,
+# venue.version, COUNT(show.id) FILTER (WHERE show.start_time > LOCALTIMESTAMP) AS upcoming_shows_count
+# FROM venue LEFT OUTER JOIN show ON show.venue_id = venue.id GROUP BY venue.id;
+
+
+class VenueAreaSummary(db.Model):
+
+    """
+    A read-only model of the venue_area_summary materialized view, one row per
+    venue, used for the /venues listing grouped by state and city
+    ...
+
+    Attributes
+    ----------
+    venue_id : int
+        the venue's primary key
+    venue_name : str
+        the name of the venue
+    city : str
+        the city where the venue is located
+    state : str
+        the state where the venue is located
+    version : int
+        the venue's version when the view was refreshed
+    upcoming_shows_count : int
+        the number of upcoming shows at the venue when the view was refreshed
+    """
+
+    __table__ = db.Table(
+        'venue_area_summary', views_metadata,
+        db.Column('venue_id', db.Integer, primary_key=True),
+        db.Column('venue_name', db.String),
+        db.Column('city', db.String(120)),
+        db.Column('state', db.String(120)),
+        db.Column('version', db.Integer),
+        db.Column('upcoming_shows_count', db.Integer),
+    )
+
+
+VIEW_MODELS = (VenueAreaSummary,)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _reject_view_writes(session, flush_context, instances):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, VIEW_MODELS):
+            raise TypeError(f'{type(instance).__name__} maps a materialized view and is read-only.')
+
+#----------------------------------------------------------------------------#
+# Refreshing.
+#----------------------------------------------------------------------------#
+
+# pg_try_advisory_xact_lock key, so only one worker refreshes at a time
+REFRESH_LOCK_KEY = 726311
+
+
+def available():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def refresh_views(concurrently=True):
+    """
+    Refreshes every view and returns their names, or returns [] without
+    refreshing when another session already holds the refresh lock.
+
+    CONCURRENTLY uses the views' unique indexes to swap in the new rows
+    without blocking readers.
+    """
+    if not db.session.execute(db.text('SELECT pg_try_advisory_xact_lock(:key)'),
+                              {'key': REFRESH_LOCK_KEY}).scalar():
+        db.session.rollback()
+        return []
+    names = [model.__table__.name for model in VIEW_MODELS]
+    for name in names:
+        db.session.execute(db.text(
+            f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}{name}'))
+        # SQL: REFRESH MATERIALIZED VIEW CONCURRENTLY venue_area_summary;
+    db.session.commit()
+    return names
@@ -0,0 +1,307 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import Response, g, request
+from jinja2 import Template
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+# name: (type, help)
+METRICS = {
+    'fyyur_http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'fyyur_http_request_duration_seconds': ('histogram', 'Request latency, by endpoint.'),
+    'fyyur_http_requests_in_flight': ('gauge', 'Requests currently being handled, by endpoint.'),
+    'fyyur_template_render_seconds': ('histogram', 'Template render time, by template.'),
+    'fyyur_db_pool_checked_out': ('gauge', 'Database connections checked out of the pool.'),
+    'fyyur_db_pool_overflow': ('gauge', 'Database connections open beyond the pool size.'),
+    'fyyur_db_pool_size': ('gauge', 'Configured database pool size.'),
+    'fyyur_cache_hits_total': ('counter', 'Cache lookups that found an entry, by cache.'),
+    'fyyur_cache_misses_total': ('counter', 'Cache lookups that found nothing, by cache.'),
+    'fyyur_cache_hit_ratio': ('gauge', 'Cache hits over lookups across all workers, by cache.'),
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# the summed counters and histograms of exited workers, and the lock taken to update them
+ARCHIVE = 'metrics_archive.json'
+ARCHIVE_LOCK = 'metrics_archive.lock'
+
+
+class Registry:
+
+    """
+    The metrics of one worker process, periodically written to a file so that
+    /metrics in any worker can report the sum over all of them
+    ...
+
+    Attributes
+    ----------
+    directory : str
+        the directory shared by all workers, holding one file per process and
+        the archived totals of the processes that have exited
+    flush_interval : float
+        the minimum number of seconds between writes of this process's file
+    values : dict
+        maps (name, labels) to a number for counters and gauges, or to
+        [bucket counts..., sum, count] for histograms
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.values = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+        self.started = None
+        self.samplers = []
+        os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name, labels=(), amount=1):
+        with self.lock:
+            key = (name, tuple(labels))
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        with self.lock:
+            self.values[(name, tuple(labels))] = value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            key = (name, tuple(labels))
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def _path(self):
+        # keyed by pid and the time this process first flushed, so a worker reusing the pid of one
+        # that exited doesn't overwrite its totals; set here since a preforking server forks after __init__
+        pid = os.getpid()
+        if self.started is None or self.started[0] != pid:
+            self.started = (pid, time.time_ns())
+        return os.path.join(self.directory, 'metrics_%d_%d.json' % self.started)
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.flushed_at < self.flush_interval:
+            return
+        self.flushed_at = now
+        for sampler in self.samplers:
+            sampler(self)
+        with self.lock:
+            data = [[name, list(labels), value] for (name, labels), value in self.values.items()]
+        _write(self._path(), data)
+
+    def collect(self):
+        """
+        Returns the values summed over every worker's file. Gauges only count
+        workers that are still running; the counters and histograms of exited
+        workers are folded into the archive file, and their files deleted, so
+        totals never go backwards.
+        """
+        self.flush(force=True)
+        # one collect at a time, so each exited worker's file is folded once
+        with open(os.path.join(self.directory, ARCHIVE_LOCK), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            live, exited = self._files()
+            archive_path = os.path.join(self.directory, ARCHIVE)
+            archived = _read(archive_path) or []
+            if exited:
+                totals = _sum([archived] + [_read(path) or [] for path in exited], gauges=False)
+                archived = [[name, list(labels), value] for (name, labels), value in totals.items()]
+                _write(archive_path, archived)
+                for path in exited:
+                    os.remove(path)
+            return _sum([archived] + [_read(path) or [] for path in live])
+
+    def _files(self):
+        """
+        Returns the paths of the files of running workers and of exited ones.
+        Of several files with the same pid, only the newest can belong to a
+        running worker.
+        """
+        files = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*_*.json')):
+            try:
+                pid, started = map(int, os.path.basename(path)[len('metrics_'):-len('.json')].split('_'))
+            except ValueError:
+                continue
+            files.setdefault(pid, []).append((started, path))
+        live, exited = [], []
+        for pid, paths in files.items():
+            paths.sort()
+            exited.extend(path for _, path in paths[:-1])
+            (live if _is_alive(pid) else exited).append(paths[-1][1])
+        return live, exited
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    # write to a temporary file and rename it, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _sum(files, gauges=True):
+    totals = {}
+    for data in files:
+        for name, labels, value in data:
+            if METRICS[name][0] == 'gauge' and not gauges:
+                continue
+            key = (name, tuple(labels))
+            if isinstance(value, list):
+                total = totals.setdefault(key, [0] * len(value))
+                totals[key] = [a + b for a, b in zip(total, value)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+# labels per metric, in the order they are stored
+LABELS = {
+    'fyyur_http_requests_total': ('endpoint', 'method', 'status'),
+    'fyyur_http_request_duration_seconds': ('endpoint',),
+    'fyyur_http_requests_in_flight': ('endpoint',),
+    'fyyur_template_render_seconds': ('template',),
+    'fyyur_cache_hits_total': ('cache',),
+    'fyyur_cache_misses_total': ('cache',),
+    'fyyur_cache_hit_ratio': ('cache',),
+}
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(totals):
+    # hit ratios can't be summed across workers, so they are derived from the summed counters
+    for (name, labels), hits in list(totals.items()):
+        if name == 'fyyur_cache_hits_total':
+            lookups = hits + totals.get(('fyyur_cache_misses_total', labels), 0)
+            if lookups:
+                totals[('fyyur_cache_hit_ratio', labels)] = hits / lookups
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in totals.items() if metric == name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            pairs = list(zip(LABELS.get(name, ()), labels))
+            if kind == 'histogram':
+                for bound, count in zip(BUCKETS, value):
+                    lines.append(f'{name}_bucket{_format_labels(pairs + [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{_format_labels(pairs + [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{_format_labels(pairs)} {value[-2]}')
+                lines.append(f'{name}_count{_format_labels(pairs)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(pairs)} {value}')
+    return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Flask integration.
+#----------------------------------------------------------------------------#
+
+
+def init_app(app, db, caches):
+    """
+    Records request, template, pool and cache metrics for app and serves them
+    at /metrics in the Prometheus text format. caches maps a cache name to an
+    object with hits and misses attributes.
+    """
+    registry = Registry(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
+    class TimedTemplate(Template):
+        def render(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().render(*args, **kwargs)
+            finally:
+                registry.observe('fyyur_template_render_seconds', [self.name or '<string>'],
+                                 time.perf_counter() - started)
+
+    app.jinja_env.template_class = TimedTemplate
+
+    def sample_pool(registry):
+        pool = db.engine.pool
+        # only QueuePool reports these; SQLite's pools don't
+        for name, method in (('fyyur_db_pool_checked_out', 'checkedout'),
+                             ('fyyur_db_pool_overflow', 'overflow'), ('fyyur_db_pool_size', 'size')):
+            if hasattr(pool, method):
+                registry.set(name, [], getattr(pool, method)())
+
+    def sample_caches(registry):
+        for name, cache in caches.items():
+            registry.set('fyyur_cache_hits_total', [name], cache.hits)
+            registry.set('fyyur_cache_misses_total', [name], cache.misses)
+
+    registry.samplers.extend([sample_pool, sample_caches])
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unknown'
+        registry.inc('fyyur_http_requests_in_flight', [g.metrics_endpoint])
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started' in g:
+            registry.observe('fyyur_http_request_duration_seconds', [g.metrics_endpoint],
+                             time.perf_counter() - g.metrics_started)
+            registry.inc('fyyur_http_requests_total',
+                         [g.metrics_endpoint, request.method, str(response.status_code)])
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is not None:
+            registry.inc('fyyur_http_requests_in_flight', [endpoint], -1)
+            registry.flush()
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(registry.collect()), mimetype='text/plain; version=0.0.4')
+
+    return registry
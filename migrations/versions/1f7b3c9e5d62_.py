@@ -0,0 +1,44 @@
+"""add version columns for cached cards
+
+Revision ID: 1f7b3c9e5d62
+Revises: 5d2e9b7c1a46
+Create Date: 2026-10-19 09:31:18.204671
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f7b3c9e5d62'
+down_revision = '5d2e9b7c1a46'
+branch_labels = None
+depends_on = None
+
+TABLES = ['venue', 'artist', 'show']
+
+
+def _create_area_summary(with_version):
+    version = 'venue.version, ' if with_version else ''
+    op.execute('CREATE MATERIALIZED VIEW venue_area_summary AS '
+               f'SELECT venue.id AS venue_id, venue.name AS venue_name, venue.city, venue.state, {version}'
+               'COUNT(show.id) FILTER (WHERE show.start_time > LOCALTIMESTAMP) AS upcoming_shows_count '
+               'FROM venue LEFT OUTER JOIN show ON show.venue_id = venue.id '
+               f'GROUP BY venue.id, venue.name, venue.city, venue.state{", venue.version" if with_version else ""}')
+    op.create_index('UX_Venue_Area_Summary', 'venue_area_summary', ['venue_id'], unique=True)
+    op.create_index('IX_Venue_Area_Summary_Area', 'venue_area_summary', ['state', 'city', 'venue_id'])
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    # the view carries the version its counts were computed at, so cards rendered from it are keyed by it
+    op.execute('DROP MATERIALIZED VIEW venue_area_summary')
+    _create_area_summary(with_version=True)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_area_summary')
+    _create_area_summary(with_version=False)
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
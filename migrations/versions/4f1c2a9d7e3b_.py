@@ -0,0 +1,56 @@
+"""add indexes for show lookups and ilike searches
+
+Revision ID: 4f1c2a9d7e3b
+Revises: 3b25c77db12a
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9d7e3b'
+down_revision = '3b25c77db12a'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) for the show lookups by venue/artist and start_time
+BTREE_INDEXES = [
+    ('IX_Show_Venue_Start', 'show', ['venue_id', 'start_time']),
+    ('IX_Show_Artist_Start', 'show', ['artist_id', 'start_time']),
+]
+
+# (index name, table, column) for the ilike '%term%' searches
+TRGM_INDEXES = [
+    ('IX_Venue_Name_Trgm', 'venue', 'name'),
+    ('IX_Venue_City_Trgm', 'venue', 'city'),
+    ('IX_Venue_State_Trgm', 'venue', 'state'),
+    ('IX_Artist_Name_Trgm', 'artist', 'name'),
+    ('IX_Artist_City_Trgm', 'artist', 'city'),
+    ('IX_Artist_State_Trgm', 'artist', 'state'),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so every
+    # statement runs in autocommit mode and the tables stay writable while building.
+    with op.get_context().autocommit_block():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, columns in BTREE_INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True)
+            # SQL: CREATE INDEX CONCURRENTLY {NAME} ON show (venue_id, start_time);
+        for name, table, column in TRGM_INDEXES:
+            op.create_index(name, table, [column], unique=False,
+                            postgresql_concurrently=True,
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+            # SQL: CREATE INDEX CONCURRENTLY {NAME} ON venue USING gin (name gin_trgm_ops);
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in reversed(TRGM_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        for name, table, columns in reversed(BTREE_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
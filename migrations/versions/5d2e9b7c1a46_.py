@@ -0,0 +1,47 @@
+"""run deletion jobs on the job runner
+
+Revision ID: 5d2e9b7c1a46
+Revises: c4f81a07e925
+Create Date: 2026-10-18 21:04:12.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e9b7c1a46'
+down_revision = 'c4f81a07e925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('deletion_job', sa.Column('job_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('deletion_job_job_id_fkey', 'deletion_job', 'job', ['job_id'], ['id'], ondelete='SET NULL')
+    # unfinished deletions get the job that now does the removal
+    op.execute("""
+        INSERT INTO job(name, args, key, status, attempts, max_attempts, run_at, created_at)
+        SELECT 'remove-deleted', '{"deletion_id": ' || id || '}', 'deletion:' || id, 'pending', 0, 5,
+               LOCALTIMESTAMP, created_at
+        FROM deletion_job WHERE status != 'done'
+    """)
+    op.execute("""
+        UPDATE deletion_job SET job_id = (SELECT job.id FROM job WHERE job.key = 'deletion:' || deletion_job.id)
+        WHERE status != 'done'
+    """)
+    # status, error and heartbeat_at are now the job's
+    op.drop_index('IX_Deletion_Job_Status', table_name='deletion_job')
+    op.drop_column('deletion_job', 'heartbeat_at')
+    op.drop_column('deletion_job', 'error')
+    op.drop_column('deletion_job', 'status')
+
+
+def downgrade():
+    op.add_column('deletion_job', sa.Column('status', sa.String(length=10), server_default='pending', nullable=False))
+    op.execute("UPDATE deletion_job SET status='done' WHERE finished_at IS NOT NULL")
+    op.add_column('deletion_job', sa.Column('error', sa.Text(), nullable=True))
+    op.add_column('deletion_job', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    op.create_index('IX_Deletion_Job_Status', 'deletion_job', ['status', 'id'], unique=False)
+    op.drop_constraint('deletion_job_job_id_fkey', 'deletion_job', type_='foreignkey')
+    op.drop_column('deletion_job', 'job_id')
@@ -0,0 +1,42 @@
+"""add generated search_vector columns for full-text search
+
+Revision ID: 9a3e5c1f0b72
+Revises: 4f1c2a9d7e3b
+Create Date: 2026-10-18 10:41:07.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3e5c1f0b72'
+down_revision = '4f1c2a9d7e3b'
+branch_labels = None
+depends_on = None
+
+# name ranks above city and state, which rank above genres
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', city), 'B') || "
+    "setweight(to_tsvector('simple', state), 'B') || "
+    "setweight(to_tsvector('simple', genres), 'C')"
+)
+
+
+def upgrade():
+    # a STORED generated column is kept up to date by postgres on every insert and update
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(),
+                                       sa.Computed(SEARCH_VECTOR, persisted=True)))
+        # SQL: ALTER TABLE venue ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (...) STORED;
+        op.create_index(f'IX_{table.capitalize()}_Search_Vector', table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+        # SQL: CREATE INDEX IX_Venue_Search_Vector ON venue USING gin (search_vector);
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index(f'IX_{table.capitalize()}_Search_Vector', table_name=table)
+        op.drop_column(table, 'search_vector')
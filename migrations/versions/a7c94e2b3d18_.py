@@ -0,0 +1,46 @@
+"""add show_series and show.series_id
+
+Revision ID: a7c94e2b3d18
+Revises: f3a8c61d27e5
+Create Date: 2026-10-18 16:40:12.531906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c94e2b3d18'
+down_revision = 'f3a8c61d27e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('show_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('frequency', sa.String(length=10), nullable=False),
+    sa.Column('every', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('until', sa.Date(), nullable=True),
+    sa.Column('occurrence_count', sa.Integer(), nullable=True),
+    sa.Column('dates', sa.Text(), nullable=True),
+    sa.Column('duration', sa.Integer(), nullable=False),
+    sa.Column('cancelled_at', sa.DateTime(), nullable=True),
+    sa.CheckConstraint("frequency IN ('weekly', 'monthly', 'dates')", name='CK_Show_Series_Frequency'),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('show', sa.Column('series_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('show_series_id_fkey', 'show', 'show_series', ['series_id'], ['id'], ondelete='SET NULL')
+    op.create_index('IX_Show_Series_Start', 'show', ['series_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('IX_Show_Series_Start', table_name='show')
+    op.drop_constraint('show_series_id_fkey', 'show', type_='foreignkey')
+    op.drop_column('show', 'series_id')
+    op.drop_table('show_series')
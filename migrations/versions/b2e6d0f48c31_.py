@@ -0,0 +1,43 @@
+"""soft delete for venues and artists, with deletion_job
+
+Revision ID: b2e6d0f48c31
+Revises: a7c94e2b3d18
+Create Date: 2026-10-18 17:52:36.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e6d0f48c31'
+down_revision = 'a7c94e2b3d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('artist', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table('deletion_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=6), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('total_shows', sa.Integer(), nullable=False),
+    sa.Column('removed_shows', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('IX_Deletion_Job_Status', 'deletion_job', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('IX_Deletion_Job_Status', table_name='deletion_job')
+    op.drop_table('deletion_job')
+    op.drop_column('artist', 'deleted_at')
+    op.drop_column('venue', 'deleted_at')
@@ -0,0 +1,31 @@
+"""add upcoming_shows_count to venue and artist
+
+Revision ID: c7d21e8b4a90
+Revises: 9a3e5c1f0b72
+Create Date: 2026-10-18 12:03:55.671204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d21e8b4a90'
+down_revision = '9a3e5c1f0b72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    # backfill from the show table; afterwards the app keeps the counters current
+    op.execute('UPDATE venue SET upcoming_shows_count = '
+               '(SELECT COUNT(*) FROM show WHERE show.venue_id = venue.id AND show.start_time > LOCALTIMESTAMP)')
+    op.execute('UPDATE artist SET upcoming_shows_count = '
+               '(SELECT COUNT(*) FROM show WHERE show.artist_id = artist.id AND show.start_time > LOCALTIMESTAMP)')
+
+
+def downgrade():
+    op.drop_column('artist', 'upcoming_shows_count')
+    op.drop_column('venue', 'upcoming_shows_count')
@@ -0,0 +1,96 @@
+"""add genre table and venue/artist genre links
+
+Revision ID: d58f3b6a21c4
+Revises: c7d21e8b4a90
+Create Date: 2026-10-18 13:27:40.905317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58f3b6a21c4'
+down_revision = 'c7d21e8b4a90'
+branch_labels = None
+depends_on = None
+
+# rows read from venue/artist per backfill batch
+BATCH_SIZE = 1000
+
+# the choices previously hard-coded in forms.py
+DEFAULT_GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+]
+
+genre = sa.table('genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def backfill(connection, table, link_table, fk, genre_ids):
+    # walks the table in id order, BATCH_SIZE rows at a time, so no single statement holds locks for long
+    source = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+    links = sa.table(link_table, sa.column(fk, sa.Integer), sa.column('genre_id', sa.Integer))
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select(source.c.id, source.c.genres).where(
+            source.c.id > last_id).order_by(source.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        values = []
+        for entity_id, genres in rows:
+            names = []
+            for name in (genres or '').split(','):
+                name = name.strip()
+                if name and name not in names:
+                    names.append(name)
+            for name in names:
+                if name not in genre_ids:
+                    genre_ids[name] = connection.execute(
+                        genre.insert().values(name=name).returning(genre.c.id)).scalar()
+                values.append({fk: entity_id, 'genre_id': genre_ids[name]})
+        if values:
+            connection.execute(links.insert(), values)
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('IX_Venue_Genre_Genre', 'venue_genre', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('IX_Artist_Genre_Genre', 'artist_genre', ['genre_id', 'artist_id'], unique=False)
+
+    connection = op.get_bind()
+    genre_ids = {}
+    for name in DEFAULT_GENRES:
+        genre_ids[name] = connection.execute(
+            genre.insert().values(name=name).returning(genre.c.id)).scalar()
+    backfill(connection, 'venue', 'venue_genre', 'venue_id', genre_ids)
+    backfill(connection, 'artist', 'artist_genre', 'artist_id', genre_ids)
+
+
+def downgrade():
+    op.drop_index('IX_Artist_Genre_Genre', table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_index('IX_Venue_Genre_Genre', table_name='venue_genre')
+    op.drop_table('venue_genre')
+    op.drop_table('genre')
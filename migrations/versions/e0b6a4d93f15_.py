@@ -0,0 +1,30 @@
+"""add the venue_area_summary materialized view
+
+Revision ID: e0b6a4d93f15
+Revises: d58f3b6a21c4
+Create Date: 2026-10-18 14:21:07.318542
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e0b6a4d93f15'
+down_revision = 'd58f3b6a21c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE MATERIALIZED VIEW venue_area_summary AS '
+               'SELECT venue.id AS venue_id, venue.name AS venue_name, venue.city, venue.state, '
+               'COUNT(show.id) FILTER (WHERE show.start_time > LOCALTIMESTAMP) AS upcoming_shows_count '
+               'FROM venue LEFT OUTER JOIN show ON show.venue_id = venue.id '
+               'GROUP BY venue.id, venue.name, venue.city, venue.state')
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY requires a unique index covering every row
+    op.create_index('UX_Venue_Area_Summary', 'venue_area_summary', ['venue_id'], unique=True)
+    op.create_index('IX_Venue_Area_Summary_Area', 'venue_area_summary', ['state', 'city', 'venue_id'])
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_area_summary')
@@ -0,0 +1,68 @@
+"""add show end_time with overlap exclusion constraints
+
+Revision ID: f3a8c61d27e5
+Revises: e0b6a4d93f15
+Create Date: 2026-10-18 15:02:44.907163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c61d27e5'
+down_revision = 'e0b6a4d93f15'
+branch_labels = None
+depends_on = None
+
+# (constraint name, column) for the no-double-booking rules
+EXCLUSIONS = [
+    ('XC_Show_Venue_Overlap', 'venue_id'),
+    ('XC_Show_Artist_Overlap', 'artist_id'),
+]
+
+# (index name, table, columns) for the upcoming show range scans and the /venues grouping
+INDEXES = [
+    ('IX_Show_Start', 'show', ['start_time', 'id']),
+    ('IX_Venue_State_City', 'venue', ['state', 'city']),
+]
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows get the default duration of two hours
+    op.execute("UPDATE show SET end_time = start_time + interval '2 hours'")
+    op.alter_column('show', 'end_time', nullable=False)
+    op.create_check_constraint(
+        'CK_Show_Duration', 'show',
+        "end_time > start_time AND end_time <= start_time + interval '24 hours'")
+    conn = op.get_bind()
+    for name, column in EXCLUSIONS:
+        overlaps = conn.execute(sa.text(
+            f'SELECT a.id, b.id FROM show a JOIN show b ON a.{column} = b.{column} AND a.id < b.id '
+            'AND a.start_time < b.end_time AND b.start_time < a.end_time ORDER BY a.id, b.id')).fetchall()
+        if overlaps:
+            pairs = ', '.join(f'{a}/{b}' for a, b in overlaps[:20])
+            raise RuntimeError(f'Cannot add {name}: overlapping shows (show ids) {pairs}. '
+                               'Move or delete them and run the migration again.')
+    # btree_gist provides the gist = operator for the integer columns
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in EXCLUSIONS:
+        op.execute(f'ALTER TABLE show ADD CONSTRAINT "{name}" EXCLUDE USING gist '
+                   f"({column} WITH =, tsrange(start_time, end_time, '[)') WITH &&)")
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so the indexes are built
+    # in autocommit mode, after the changes above commit, and the tables stay writable meanwhile.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+            # SQL: CREATE INDEX CONCURRENTLY {NAME} ON show (start_time, id);
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    for name, _ in reversed(EXCLUSIONS):
+        op.drop_constraint(name, 'show')
+    op.drop_constraint('CK_Show_Duration', 'show', type_='check')
+    op.drop_column('show', 'end_time')
@@ -1,11 +1,124 @@
 
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from datetime import timedelta
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CheckConstraint, CreateColumn, CreateIndex, DropIndex
+# the session sends read-only requests to a replica when READ_REPLICAS_ENABLED is set (see routing.py)
+from routing import RoutingSQLAlchemy
+db = RoutingSQLAlchemy()
+
+# a show lasts DEFAULT_SHOW_DURATION unless given an end_time, and never longer than
+# MAX_SHOW_DURATION, which bounds the index range scanned by booking checks
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+# the full-text search document of venues and artists (see migration 9a3e5c1f0b72): name ranks
+# above city and state, which rank above genres
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', city), 'B') || "
+    "setweight(to_tsvector('simple', state), 'B') || "
+    "setweight(to_tsvector('simple', genres), 'C')"
+)
+
+#----------------------------------------------------------------------------#
+# PostgreSQL-only schema.
+#----------------------------------------------------------------------------#
+
+# Columns, indexes and check constraints with info={'postgresql_only': True} are declared so that
+# autogenerate sees them, but db.create_all() leaves them out on other databases (the tests' SQLite).
+
+
+@compiles(CreateColumn)
+def _create_column(element, compiler, **kw):
+    if element.element.info.get('postgresql_only') and compiler.dialect.name != 'postgresql':
+        return None
+    return compiler.visit_create_column(element, **kw)
+
+
+@compiles(CreateIndex)
+@compiles(DropIndex)
+def _create_index(element, compiler, **kw):
+    if element.element.info.get('postgresql_only') and compiler.dialect.name != 'postgresql':
+        return ''
+    return getattr(compiler, f'visit_{element.__visit_name__}')(element, **kw)
+
+
+@compiles(CheckConstraint)
+def _check_constraint(element, compiler, **kw):
+    if element.info.get('postgresql_only') and compiler.dialect.name != 'postgresql':
+        return None
+    return compiler.visit_check_constraint(element, **kw)
+
+
+def search_vector_column():
+    # deferred, so that loading a venue or artist does not fetch its tsvector
+    return db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR, persisted=True),
+                                 info={'postgresql_only': True}))
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# SQL: CREATE TABLE genre(id integer PRIMARY KEY, name varchar(120) NOT NULL UNIQUE);
+
+
+class Genre(db.Model):
+
+    """
+    A model class used to represent a Genre
+    ...
+
+    Attributes
+    ----------
+    id : int
+        the genre's primary key
+    name : str
+        the name of the genre
+    """
+
+    __tablename__ = 'genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @staticmethod
+    def from_names(names):
+        """
+        Returns the Genre rows for names, adding any that don't exist yet to the session.
+        """
+        genres = {genre.name: genre for genre in Genre.query.filter(
+            Genre.name.in_(names)).all()} if names else {}
+        # SQL: SELECT * FROM genre WHERE name IN ({NAMES});
+        for name in names:
+            if name not in genres:
+                genres[name] = Genre(name=name)
+                db.session.add(genres[name])
+        return [genres[name] for name in names]
+
+
+# SQL: CREATE TABLE venue_genre(venue_id integer REFERENCES venue(id) ON DELETE CASCADE,
+# genre_id integer REFERENCES genre(id), PRIMARY KEY(venue_id, genre_id));
+venue_genre = db.Table(
+    'venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey(
+        'venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(
+        'genre.id'), primary_key=True),
+    db.Index('IX_Venue_Genre_Genre', 'genre_id', 'venue_id'),
+)
+
+# SQL: CREATE TABLE artist_genre(artist_id integer REFERENCES artist(id) ON DELETE CASCADE,
+# genre_id integer REFERENCES genre(id), PRIMARY KEY(artist_id, genre_id));
+artist_genre = db.Table(
+    'artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey(
+        'artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(
+        'genre.id'), primary_key=True),
+    db.Index('IX_Artist_Genre_Genre', 'genre_id', 'artist_id'),
+)
+
 # SQL: CREATE TABLE venue(id integer PRIMARY KEY, name varchar, genres varchar(120), city varchar(120), state varchar(120),
 # address varchar(120), phone varchar(120), website_link varchar(120), image_link varchar(120), facebook_link varchar(120),
 # seeking_talent boolean NOT NULL, seeking_description varchar(120));
@@ -24,7 +137,9 @@ class Venue(db.Model):
     name : str
         the name of the venue
     genres : str
-        the list of genres preferred by the venue
+        the list of genres preferred by the venue, comma-joined for display and search
+    genre_list : list
+        the venue's Genre rows, used for browsing by genre
     city : str
         the city where the venue is located
     state : str
@@ -45,6 +160,16 @@ class Venue(db.Model):
         indicator for whether the venue is seeking artists or not
     seeking_description:
         description of type of artists the venue is seeking
+    upcoming_shows_count : int
+        the number of shows at the venue that have not started yet
+    version : int
+        bumped by every write that changes what the listings show of the
+        venue, including its upcoming show count; cached cards are keyed by it
+    deleted_at : datetime
+        when the venue was deleted; its shows, and then the row itself, are
+        removed in the background (see deletions.py)
+    search_vector : str
+        the generated tsvector searched by full-text search (PostgreSQL only)
     """
 
     __tablename__ = 'venue'
@@ -61,7 +186,24 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False)
     seeking_description = db.Column(db.String(), nullable=True)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    deleted_at = db.Column(db.DateTime, nullable=True)
     shows = db.relationship('Show', backref='venue', lazy=True)
+    genre_list = db.relationship('Genre', secondary=venue_genre, lazy=True)
+    search_vector = search_vector_column()
+    __table_args__ = (
+        db.Index('IX_Venue_Search_Vector', 'search_vector', postgresql_using='gin',
+                 info={'postgresql_only': True}),
+        db.Index('IX_Venue_Name_Trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('IX_Venue_City_Trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('IX_Venue_State_Trgm', 'state', postgresql_using='gin',
+                 postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('IX_Venue_State_City', 'state', 'city'),
+    )
 
     def __repr__(self) -> str:
         return f"<city {self.id}> {self.name}, {self.genres}, {self.city}, {self.state}, {self.address}, {self.phone}, {self.website_link}, {self.image_link}, {self.facebook_link}, {self.seeking_talent}, {self.seeking_description}"
@@ -88,7 +230,9 @@ class Artist(db.Model):
     name : str
         the name of the artist
     genres : str
-        the list of genres of the artist's music
+        the list of genres of the artist's music, comma-joined for display and search
+    genre_list : list
+        the artist's Genre rows, used for browsing by genre
     city : str
         the city where the artist resides
     state : str
@@ -109,6 +253,16 @@ class Artist(db.Model):
         indicator for whether the artist is seeking artists or not
     seeking_description:
         description of type of venues that the artist is seeking
+    upcoming_shows_count : int
+        the number of shows by the artist that have not started yet
+    version : int
+        bumped by every write that changes what the listings show of the
+        artist, including its upcoming show count; cached cards are keyed by it
+    deleted_at : datetime
+        when the artist was deleted; its shows, and then the row itself, are
+        removed in the background (see deletions.py)
+    search_vector : str
+        the generated tsvector searched by full-text search (PostgreSQL only)
     """
 
     __tablename__ = 'artist'
@@ -124,7 +278,23 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False)
     seeking_description = db.Column(db.String(), nullable=True)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    deleted_at = db.Column(db.DateTime, nullable=True)
     shows = db.relationship('Show', backref='artist', lazy=True)
+    genre_list = db.relationship('Genre', secondary=artist_genre, lazy=True)
+    search_vector = search_vector_column()
+    __table_args__ = (
+        db.Index('IX_Artist_Search_Vector', 'search_vector', postgresql_using='gin',
+                 info={'postgresql_only': True}),
+        db.Index('IX_Artist_Name_Trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('IX_Artist_City_Trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('IX_Artist_State_Trgm', 'state', postgresql_using='gin',
+                 postgresql_ops={'state': 'gin_trgm_ops'}),
+    )
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -149,6 +319,15 @@ class Show(db.Model):
         the primary key of the venue
     start_time : datetime
         the show's starting time
+    end_time : datetime
+        the show's ending time; on postgres, exclusion constraints reject
+        shows whose [start_time, end_time) overlaps another show at the same
+        venue or by the same artist (see migration f3a8c61d27e5)
+    series_id : int
+        the primary key of the ShowSeries the show is an occurrence of, if any
+    version : int
+        bumped when the show is moved; its cached card is keyed by it and by
+        the versions of its artist and venue
     """
 
     __tablename__ = "show"
@@ -159,5 +338,245 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=lambda context: (
+        context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION))
+    series_id = db.Column(db.Integer, db.ForeignKey(
+        'show_series.id', ondelete='SET NULL'), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     db.UniqueConstraint(artist_id, venue_id, start_time,
                         name='UX_Artist_Venue')
+    __table_args__ = (
+        db.Index('IX_Show_Venue_Start', 'venue_id', 'start_time'),
+        db.Index('IX_Show_Artist_Start', 'artist_id', 'start_time'),
+        db.Index('IX_Show_Start', 'start_time', 'id'),
+        db.Index('IX_Show_Series_Start', 'series_id', 'start_time'),
+        # MAX_SHOW_DURATION, as in migration f3a8c61d27e5
+        db.CheckConstraint("end_time > start_time AND end_time <= start_time + interval '24 hours'",
+                           name='CK_Show_Duration', info={'postgresql_only': True}),
+    )
+
+# SQL: CREATE TABLE show_series(id integer PRIMARY KEY, artist_id integer NOT NULL REFERENCES artist(id) ON DELETE CASCADE,
+# venue_id integer NOT NULL REFERENCES venue(id) ON DELETE CASCADE, frequency varchar(10) NOT NULL, every integer NOT NULL,
+# start_time timestamp NOT NULL, until date, occurrence_count integer, dates text, duration integer NOT NULL,
+# cancelled_at timestamp);
+
+
+class ShowSeries(db.Model):
+
+    """
+    A model class used to represent a recurring series of Shows, such as a residency
+    ...
+
+    Attributes
+    ----------
+    id : int
+        the series' primary key
+    artist_id : int
+        the primary key of the artist
+    venue_id : int
+        the primary key of the venue
+    frequency : str
+        'weekly', 'monthly' or 'dates' (the explicit list in dates)
+    every : int
+        the number of weeks or months between occurrences
+    start_time : datetime
+        the first occurrence; later weekly/monthly ones share its weekday or day of month and time
+    until : date
+        the last day a weekly/monthly occurrence may fall on, if limited by date
+    occurrence_count : int
+        the number of weekly/monthly occurrences, if limited by count
+    dates : str
+        the comma-joined ISO start times of a 'dates' series
+    duration : int
+        the length of each occurrence in minutes
+    cancelled_at : datetime
+        when the series was cancelled, removing its upcoming shows
+    shows : list
+        the series' occurrences
+    """
+
+    __tablename__ = 'show_series'
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'venue.id', ondelete='CASCADE'), nullable=False)
+    frequency = db.Column(db.String(10), nullable=False)
+    every = db.Column(db.Integer, nullable=False, default=1)
+    start_time = db.Column(db.DateTime, nullable=False)
+    until = db.Column(db.Date, nullable=True)
+    occurrence_count = db.Column(db.Integer, nullable=True)
+    dates = db.Column(db.Text, nullable=True)
+    duration = db.Column(db.Integer, nullable=False)
+    cancelled_at = db.Column(db.DateTime, nullable=True)
+    shows = db.relationship('Show', backref='series', lazy=True)
+    artist = db.relationship('Artist', lazy=True)
+    venue = db.relationship('Venue', lazy=True)
+    __table_args__ = (
+        db.CheckConstraint("frequency IN ('weekly', 'monthly', 'dates')", name='CK_Show_Series_Frequency'),
+    )
+
+# SQL: CREATE TABLE deletion_job(id integer PRIMARY KEY, entity_type varchar(6) NOT NULL, entity_id integer NOT NULL,
+# job_id integer REFERENCES job(id) ON DELETE SET NULL, total_shows integer NOT NULL, removed_shows integer NOT NULL,
+# created_at timestamp NOT NULL, started_at timestamp, finished_at timestamp);
+
+
+class DeletionJob(db.Model):
+
+    """
+    A model class used to represent the background removal of a deleted venue or artist
+    ...
+
+    Attributes
+    ----------
+    id : int
+        the deletion's primary key
+    entity_type : str
+        'venue' or 'artist'
+    entity_id : int
+        the primary key of the deleted venue or artist
+    job_id : int
+        the remove-deleted job doing the removal, whose status, attempts and
+        error are the deletion's; None once the finished job is archived
+    total_shows : int
+        the number of shows the entity had when it was deleted
+    removed_shows : int
+        the number of those shows removed so far
+    created_at : datetime
+        when the entity was deleted
+    started_at : datetime
+        when a worker first picked the job up
+    finished_at : datetime
+        when the entity and all its shows were gone
+    """
+
+    __tablename__ = 'deletion_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(6), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id', ondelete='SET NULL'), nullable=True)
+    total_shows = db.Column(db.Integer, nullable=False, default=0)
+    removed_shows = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    job = db.relationship('Job', lazy=True)
+
+
+class Job(db.Model):
+
+    """
+    A model class used to represent a unit of background work run by jobs.Runner
+    ...
+
+    Attributes
+    ----------
+    id : int
+        the job's primary key
+    name : str
+        the name of the task to run (a key of jobs.TASKS)
+    args : str
+        the task's keyword arguments, as a JSON object
+    key : str
+        unique among jobs; scheduled jobs use it so each run is queued once by all workers
+    status : str
+        'pending', 'running', 'done' or 'failed'
+    attempts : int
+        the number of times the job has been started
+    max_attempts : int
+        the number of attempts after which a failing job is marked failed
+    run_at : datetime
+        the earliest time the job (or its next attempt) may start
+    locked_by : str
+        the worker running the job
+    locked_until : datetime
+        when the worker's lease on the job runs out; running jobs whose lease has run
+        out are picked up again by other workers
+    error : str
+        the error of the last failed attempt
+    created_at : datetime
+        when the job was queued
+    started_at : datetime
+        when its last attempt started
+    finished_at : datetime
+        when the job succeeded or failed for good
+    """
+
+    __tablename__ = 'job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(60), nullable=False)
+    args = db.Column(db.Text, nullable=False, default='{}')
+    key = db.Column(db.String(120), nullable=True, unique=True)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(80), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('IX_Job_Status_Run_At', 'status', 'run_at'),
+    )
+
+# SQL: CREATE TABLE job_archive(id integer PRIMARY KEY, name varchar(60) NOT NULL, args text NOT NULL, key varchar(120),
+# status varchar(10) NOT NULL, attempts integer NOT NULL, max_attempts integer NOT NULL, error text,
+# created_at timestamp NOT NULL, started_at timestamp, finished_at timestamp, archived_at timestamp NOT NULL);
+
+
+class JobArchive(db.Model):
+
+    """
+    A model class used to represent a finished job moved out of the job table by the archive-jobs task
+    ...
+
+    Attributes
+    ----------
+    id : int
+        the job's primary key in the job table
+    name : str
+        the name of the task it ran
+    args : str
+        the task's keyword arguments, as a JSON object
+    key : str
+        the job's unique key, if it had one
+    status : str
+        'done' or 'failed'
+    attempts : int
+        the number of times the job was started
+    max_attempts : int
+        the number of attempts it was allowed
+    error : str
+        the error of its last failed attempt
+    created_at : datetime
+        when the job was queued
+    started_at : datetime
+        when its last attempt started
+    finished_at : datetime
+        when the job succeeded or failed for good
+    archived_at : datetime
+        when it was moved here
+    """
+
+    __tablename__ = 'job_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(60), nullable=False)
+    args = db.Column(db.Text, nullable=False)
+    key = db.Column(db.String(120), nullable=True)
+    status = db.Column(db.String(10), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('IX_Job_Archive_Finished_At', 'finished_at'),
+    )
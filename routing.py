@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+#----------------------------------------------------------------------------#
+# Replica routing.
+#----------------------------------------------------------------------------#
+
+# requests with these methods (and views marked read_only) may read from a replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# replica i is configured as the SQLALCHEMY_BINDS entry REPLICA_BIND + str(i)
+REPLICA_BIND = 'replica_'
+
+
+def read_only(view):
+    # marks a view that never writes, so it may use a replica whatever its method (the search forms POST)
+    view.read_only = True
+    return view
+
+
+def pinned():
+    # whether this request's client wrote recently (or this request did), so it reads from the primary
+    return has_request_context() and bool(g.get('db_wrote') or session.get('db_pinned_until', 0) > time.time())
+
+
+def on_replica():
+    return has_request_context() and g.get('db_replica') is not None
+
+
+class RoutingSession(SignallingSession):
+
+    """
+    A session that sends the statements of read-only requests to the replica
+    chosen for the request, and everything else to the primary
+    ...
+
+    Attributes
+    ----------
+    db : RoutingSQLAlchemy
+        the extension the session belongs to, used to look up replica engines
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        # flushes and INSERT/UPDATE/DELETE statements always go to the primary
+        replica = g.get('db_replica') if has_request_context() else None
+        if replica is not None and not self._flushing and not getattr(clause, 'is_dml', False):
+            return self.db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    """
+    Flask-SQLAlchemy with RoutingSession as its session class
+    ...
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(db_session):
+    # the client that wrote is pinned to the primary (see init_app), so it reads its own writes
+    if has_request_context() and g.get('db_replica') is None:
+        g.db_wrote = True
+
+
+def init_app(app):
+    """
+    Adds a bind for each of SQLALCHEMY_REPLICA_URIS and the request hooks
+    that pick one at random for every read-only request. A client whose
+    request committed a write reads from the primary for the next
+    REPLICA_PIN_SECONDS. Does nothing unless READ_REPLICAS_ENABLED is set.
+    Must be called before the first database access.
+    """
+    if not app.config['READ_REPLICAS_ENABLED'] or not app.config['SQLALCHEMY_REPLICA_URIS']:
+        return []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    names = []
+    for i, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+        names.append(f'{REPLICA_BIND}{i}')
+        binds[names[-1]] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+    pin_seconds = app.config['REPLICA_PIN_SECONDS']
+
+    @app.before_request
+    def choose_replica():
+        # g outlives the request when an app context was already pushed (as in the tests)
+        g.db_replica = None
+        g.db_wrote = False
+        view = app.view_functions.get(request.endpoint)
+        if request.method not in READ_METHODS and not getattr(view, 'read_only', False):
+            return
+        if session.get('db_pinned_until', 0) > time.time():
+            return
+        g.db_replica = random.choice(names)
+
+    @app.after_request
+    def pin_to_primary(response):
+        if g.get('db_wrote'):
+            session['db_pinned_until'] = time.time() + pin_seconds
+        return response
+
+    return names
@@ -0,0 +1,237 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+from flask import current_app
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Query syntax.
+#----------------------------------------------------------------------------#
+
+# words are runs of letters and digits, matching how to_tsvector('simple', ...) splits text
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+SearchQuery = namedtuple('SearchQuery', ['terms', 'city', 'state'])
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def parse_query(search_term, model):
+    """
+    Parses the search box syntax shared by /venues/search and /artists/search.
+
+    "San Francisco, CA" restricts results to that city and state (either side
+    may be left empty) when some venue/artist (model) is in that city and
+    state. Anything else, "Jazz, Blues" included, is split into words, and
+    every word must prefix-match a word in the name, city, state or genres
+    of a result.
+    """
+    search_term = (search_term or '').strip()
+    if ',' in search_term:
+        city, _, state = search_term.partition(',')
+        location = SearchQuery(terms=[], city=city.strip() or None, state=state.strip() or None)
+        if (location.city or location.state) and _known_location(model, location):
+            return location
+    return SearchQuery(terms=tokenize(search_term), city=None, state=None)
+
+
+def _known_location(model, query):
+    known = db.session.query(_filter_location(
+        db.session.query(model.id).filter(model.deleted_at.is_(None)), model, query).exists()).scalar()
+    # SQL: SELECT EXISTS (SELECT id FROM venue WHERE deleted_at IS NULL AND lower(city)={CITY} AND lower(state)={STATE});
+    return known
+
+#----------------------------------------------------------------------------#
+# Postgres full-text backend.
+#----------------------------------------------------------------------------#
+
+
+def _filter_location(q, model, query):
+    if query.city:
+        q = q.filter(db.func.lower(model.city) == query.city.lower())
+    if query.state:
+        q = q.filter(db.func.lower(model.state) == query.state.lower())
+    return q
+
+
+def _search_fulltext(model, query, limit, offset):
+    # search_vector is a generated tsvector column maintained by postgres (see models.SEARCH_VECTOR)
+    q = _filter_location(model.query.filter(model.deleted_at.is_(None)), model, query)
+    if query.terms:
+        vector = model.search_vector
+        tsquery = db.func.to_tsquery(
+            'simple', ' & '.join(f'{term}:*' for term in query.terms))
+        q = q.filter(vector.op('@@')(tsquery)).order_by(
+            db.func.ts_rank(vector, tsquery).desc(), model.id)
+    else:
+        q = q.order_by(model.name, model.id)
+    total = q.order_by(None).count()
+    # SQL: SELECT COUNT(*) FROM venue WHERE deleted_at IS NULL AND search_vector @@ to_tsquery('simple', '{TERM}:*');
+    results = q.limit(limit).offset(offset).all()
+    # SQL: SELECT * FROM venue WHERE deleted_at IS NULL AND search_vector @@ to_tsquery('simple', '{TERM}:*')
+    # ORDER BY ts_rank(search_vector, to_tsquery('simple', '{TERM}:*')) DESC, id LIMIT {LIMIT} OFFSET {OFFSET};
+    return results, total
+
+#----------------------------------------------------------------------------#
+# In-process fallback backend.
+#----------------------------------------------------------------------------#
+
+
+class InvertedIndex:
+
+    """
+    An in-process inverted index used when the database has no full-text search
+    ...
+
+    Attributes
+    ----------
+    model : db.Model
+        the model (Venue or Artist) being indexed
+    postings : dict
+        maps a word to {entity id: weight} for every entity containing it
+    words : list
+        the sorted keys of postings, used for prefix lookups
+    docs : dict
+        maps an entity id to its (name, city, state, words)
+    """
+
+    # mirrors the setweight() classes used for the postgres tsvector
+    FIELD_WEIGHTS = (('name', 1.0), ('city', 0.4), ('state', 0.4), ('genres', 0.2))
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.words = []
+        self.docs = {}
+        self.built_at = None
+
+    def build(self):
+        rows = db.session.query(self.model.id, self.model.name, self.model.city,
+                                self.model.state, self.model.genres).filter(self.model.deleted_at.is_(None)).all()
+        # SQL: SELECT id, name, city, state, genres FROM venue WHERE deleted_at IS NULL;
+        with self.lock:
+            self.built_at = None
+            self.postings = {}
+            self.docs = {}
+            for row in rows:
+                self._add(row.id, row._asdict())
+            self.words = sorted(self.postings)
+            self.built_at = time.monotonic()
+
+    def _add(self, entity_id, fields):
+        weights = {}
+        for field, weight in self.FIELD_WEIGHTS:
+            for word in tokenize(fields[field]):
+                weights[word] = weights.get(word, 0) + weight
+        for word, weight in weights.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                if self.built_at is not None:
+                    insort(self.words, word)
+            self.postings[word][entity_id] = weight
+        self.docs[entity_id] = (fields['name'], fields['city'].lower(),
+                                fields['state'].lower(), list(weights))
+
+    def _remove(self, entity_id):
+        doc = self.docs.pop(entity_id, None)
+        if doc is None:
+            return
+        for word in doc[3]:
+            postings = self.postings[word]
+            postings.pop(entity_id, None)
+            if not postings:
+                del self.postings[word]
+                self.words.pop(bisect_left(self.words, word))
+
+    def update(self, entity):
+        if self.built_at is None:
+            return
+        fields = {field: getattr(entity, field) for field, _ in self.FIELD_WEIGHTS}
+        with self.lock:
+            self._remove(entity.id)
+            self._add(entity.id, fields)
+
+    def remove(self, entity_id):
+        if self.built_at is None:
+            return
+        with self.lock:
+            self._remove(entity_id)
+
+    def _prefix_scores(self, term):
+        scores = {}
+        i = bisect_left(self.words, term)
+        while i < len(self.words) and self.words[i].startswith(term):
+            for entity_id, weight in self.postings[self.words[i]].items():
+                scores[entity_id] = scores.get(entity_id, 0) + weight
+            i += 1
+        return scores
+
+    def search(self, query, limit, offset, ttl):
+        # rebuilding after ttl seconds lets writes made by other worker processes become searchable
+        if self.built_at is None or time.monotonic() - self.built_at > ttl:
+            self.build()
+        with self.lock:
+            if query.terms:
+                scores = None
+                for term in query.terms:
+                    term_scores = self._prefix_scores(term)
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {entity_id: score + term_scores[entity_id]
+                                  for entity_id, score in scores.items() if entity_id in term_scores}
+            else:
+                scores = dict.fromkeys(self.docs, 0)
+            city = query.city.lower() if query.city else None
+            state = query.state.lower() if query.state else None
+            matches = [(-score, self.docs[entity_id][0].lower(), entity_id) for entity_id, score in scores.items()
+                       if (city is None or self.docs[entity_id][1] == city)
+                       and (state is None or self.docs[entity_id][2] == state)]
+        matches.sort()
+        ids = [entity_id for _, _, entity_id in matches[offset:offset + limit]]
+        # rows deleted by other workers since the last build are dropped here
+        entities = {entity.id: entity for entity in self.model.query.filter(
+            self.model.id.in_(ids), self.model.deleted_at.is_(None)).all()} if ids else {}
+        # SQL: SELECT * FROM venue WHERE id IN ({IDS}) AND deleted_at IS NULL;
+        return [entities[entity_id] for entity_id in ids if entity_id in entities], len(matches)
+
+
+indexes = {Venue: InvertedIndex(Venue), Artist: InvertedIndex(Artist)}
+
+#----------------------------------------------------------------------------#
+# Public interface.
+#----------------------------------------------------------------------------#
+
+
+def uses_fulltext():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def search(model, search_term, limit, offset=0):
+    """
+    Returns (entities, total) for one page of ranked results for search_term.
+    """
+    query = parse_query(search_term, model)
+    if uses_fulltext():
+        return _search_fulltext(model, query, limit, offset)
+    return indexes[model].search(query, limit, offset, current_app.config['SEARCH_INDEX_TTL'])
+
+
+def index_entity(entity):
+    # postgres keeps search_vector up to date itself
+    if not uses_fulltext():
+        indexes[type(entity)].update(entity)
+
+
+def unindex_entity(model, entity_id):
+    if not uses_fulltext():
+        indexes[model].remove(int(entity_id))
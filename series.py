@@ -0,0 +1,184 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, Show, ShowSeries
+import bookings
+import counters
+
+#----------------------------------------------------------------------------#
+# Recurrence rules.
+#----------------------------------------------------------------------------#
+
+FREQUENCIES = ('weekly', 'monthly', 'dates')
+
+
+def parse_dates(text, start_time):
+    """
+    Parses the explicit dates of a 'dates' series, separated by commas or
+    newlines. Each is a date (taking start_time's time of day) or a date and
+    time. Raises ValueError for anything else.
+    """
+    times = set()
+    for part in text.replace('\n', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        value = datetime.fromisoformat(part.replace('T', ' '))
+        if len(part) <= 10:
+            value = datetime.combine(value.date(), start_time.time())
+        times.add(value)
+    return sorted(times)
+
+
+def occurrences(frequency, start_time, every=1, until=None, count=None, dates=(), limit=None):
+    """
+    Expands a recurrence rule into its sorted start times: every `every` weeks
+    or months from start_time, up to the date until and/or count occurrences,
+    or the explicit dates. Raises ValueError when a weekly/monthly rule has
+    neither bound, or when there are more than limit occurrences.
+    """
+    if frequency == 'dates':
+        times = sorted(set(dates))
+    elif frequency in ('weekly', 'monthly'):
+        if until is None and count is None:
+            raise ValueError('A weekly or monthly series needs an end date or a number of occurrences.')
+        times = []
+        while count is None or len(times) < count:
+            # each occurrence is computed from start_time, so a series starting on the 31st falls on the
+            # last day of shorter months and returns to the 31st afterwards
+            offset = len(times) * every
+            start = start_time + (timedelta(weeks=offset) if frequency == 'weekly' else relativedelta(months=offset))
+            if until is not None and start.date() > until:
+                break
+            times.append(start)
+            if limit is not None and len(times) > limit:
+                break
+    else:
+        raise ValueError(f'Unknown frequency {frequency}.')
+    if limit is not None and len(times) > limit:
+        raise ValueError(f'A series can have at most {limit} occurrences.')
+    return times
+
+#----------------------------------------------------------------------------#
+# Writes.
+#----------------------------------------------------------------------------#
+
+
+def _conflict_kind(error):
+    # the show constraint a row broke: XC_Show_Artist_Overlap is the artist's; XC_Show_Venue_Overlap
+    # and UX_Artist_Venue (the same show again) are the venue's
+    return 'artist' if 'XC_Show_Artist_Overlap' in str(error.orig) else 'venue'
+
+
+def _insert_occurrences(series, times, duration):
+    """
+    Inserts the occurrences in one multi-row statement and returns the start
+    times left out, as in create(). find_conflicts_many() has already left out
+    the overlapping ones, so the statement only fails when a show was booked
+    in between (on postgres the XC_Show_*_Overlap constraints reject it); the
+    rows are then inserted one at a time, each in a savepoint, and those that
+    fail are reported as venue or artist conflicts.
+    """
+    table = Show.__table__
+    rows = [{'artist_id': series.artist_id, 'venue_id': series.venue_id, 'series_id': series.id,
+             'start_time': start, 'end_time': start + duration} for start in times]
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(rows))
+            # SQL: INSERT INTO show(artist_id, venue_id, series_id, start_time, end_time) VALUES (...), (...), ...;
+        return {}
+    except IntegrityError:
+        pass
+    conflicts = {}
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(row))
+                # SQL: SAVEPOINT sp; INSERT INTO show(artist_id, venue_id, series_id, start_time, end_time) VALUES (...);
+        except IntegrityError as e:
+            conflicts[row['start_time']] = [(_conflict_kind(e), None)]
+    return conflicts
+
+
+def create(artist_id, venue_id, frequency, start_time, duration, every=1, until=None, count=None,
+           dates=(), limit=None):
+    """
+    Adds a ShowSeries and inserts its occurrences, leaving out those that
+    overlap another show of the venue or artist. Returns (series, created,
+    conflicts), where created is the number of shows inserted and conflicts
+    maps each left out start time to its (kind, show) pairs as in
+    bookings.find_conflicts_many(); show is None for rows a constraint
+    rejected. The caller commits.
+    """
+    times = occurrences(frequency, start_time, every=every, until=until, count=count, dates=dates, limit=limit)
+    series = ShowSeries(artist_id=artist_id, venue_id=venue_id, frequency=frequency, every=every,
+                        start_time=times[0] if times else start_time, until=until, occurrence_count=count,
+                        dates=','.join(start.isoformat() for start in times) if frequency == 'dates' else None,
+                        duration=int(duration.total_seconds()) // 60)
+    db.session.add(series)
+    db.session.flush()
+    # SQL: INSERT INTO show_series(artist_id, venue_id, frequency, every, start_time, until, occurrence_count, dates, duration)
+    # VALUES ({ARTIST_ID}, {VENUE_ID}, {FREQUENCY}, {EVERY}, {START_TIME}, {UNTIL}, {COUNT}, {DATES}, {DURATION}) RETURNING id;
+    conflicts = bookings.find_conflicts_many(venue_id, artist_id, [(start, start + duration) for start in times])
+    free = [start for start in times if start not in conflicts]
+    rejected = _insert_occurrences(series, free, duration) if free else {}
+    conflicts.update(rejected)
+    counters.recount(venue_id, artist_id, datetime.now())
+    return series, len(free) - len(rejected), conflicts
+
+
+def upcoming(series, now):
+    shows = Show.query.filter(Show.series_id == series.id, Show.start_time > now).order_by(Show.start_time).all()
+    # SQL: SELECT * FROM show WHERE series_id={SERIES_ID} AND start_time > {NOW} ORDER BY start_time;
+    return shows
+
+
+def update(series, duration, time_of_day, now):
+    """
+    Moves every upcoming occurrence to time_of_day (on the same date) and
+    gives it the new duration, in one batched UPDATE. Nothing is changed if
+    any moved occurrence would overlap another show; the conflicts are
+    returned as in create(). The caller commits.
+    """
+    shows = upcoming(series, now)
+    moved = []
+    for show in shows:
+        start = datetime.combine(show.start_time.date(), time_of_day) if time_of_day else show.start_time
+        moved.append({'id': show.id, 'start_time': start, 'end_time': start + duration,
+                      'version': show.version + 1})
+    ranges = [(row['start_time'], row['end_time']) for row in moved]
+    conflicts = bookings.find_conflicts_many(series.venue_id, series.artist_id, ranges, exclude_series_id=series.id)
+    if conflicts:
+        return 0, conflicts
+    try:
+        with db.session.begin_nested():
+            db.session.bulk_update_mappings(Show, moved)
+            # SQL: UPDATE show SET start_time={START_TIME}, end_time={END_TIME}, version={VERSION} WHERE id={ID}; (executemany)
+    except IntegrityError as e:
+        # a show booked in between broke an XC_Show_*_Overlap constraint; checking again finds it
+        conflicts = bookings.find_conflicts_many(
+            series.venue_id, series.artist_id, ranges, exclude_series_id=series.id)
+        return 0, conflicts or {ranges[0][0]: [(_conflict_kind(e), None)]}
+    if time_of_day:
+        series.start_time = datetime.combine(series.start_time.date(), time_of_day)
+    series.duration = int(duration.total_seconds()) // 60
+    counters.recount(series.venue_id, series.artist_id, now)
+    return len(moved), {}
+
+
+def cancel(series, now):
+    """
+    Deletes the upcoming occurrences of the series in one statement and marks
+    it cancelled; shows that have already started are kept. Returns the number
+    of shows deleted. The caller commits.
+    """
+    deleted = Show.query.filter(Show.series_id == series.id, Show.start_time > now).delete(
+        synchronize_session=False)
+    # SQL: DELETE FROM show WHERE series_id={SERIES_ID} AND start_time > {NOW};
+    series.cancelled_at = now
+    counters.recount(series.venue_id, series.artist_id, now)
+    return deleted
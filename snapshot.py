@@ -0,0 +1,92 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Snapshots.
+#----------------------------------------------------------------------------#
+
+
+class Snapshot:
+
+    """
+    Data rebuilt by a background thread, so that requests reading it never
+    touch the database
+    ...
+
+    Attributes
+    ----------
+    build : callable
+        returns the fresh data; called inside an app context
+    data : object
+        the last data built, or None before the first build
+    built_at : float
+        time.monotonic() of the last build
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.data = None
+        self.built_at = None
+        self.wake = threading.Event()
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self, app, interval):
+        """
+        Starts the refresher, which rebuilds every interval seconds and
+        whenever refresh_soon() is called.
+        """
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        self.data = self.build()
+                        self.built_at = time.monotonic()
+                        self.ready.set()
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Snapshot refresh failed.')
+                    finally:
+                        db.session.remove()
+                self.wake.wait(interval)
+                self.wake.clear()
+
+        self.thread = threading.Thread(target=run, name='snapshot', daemon=True)
+        self.thread.start()
+
+    def refresh_soon(self):
+        # called after writes; only wakes this worker's refresher, others catch up on their interval
+        self.wake.set()
+
+    def get(self, first_wait, max_staleness):
+        """
+        Returns the snapshot, waiting up to first_wait seconds for the first
+        build, or None if there is none yet. A snapshot older than
+        max_staleness (its refresher keeps failing) isn't served either; it
+        wakes the refresher for another try.
+        """
+        if not self.ready.wait(first_wait):
+            return None
+        if time.monotonic() - self.built_at > max_staleness:
+            self.wake.set()
+            return None
+        return self.data
+
+
+def build_home():
+    artists = db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None)).order_by(
+        Artist.id.desc()).limit(10).all()
+    # SQL: SELECT id, name FROM artist WHERE deleted_at IS NULL ORDER BY id DESC LIMIT 10;
+    venues = db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count).filter(
+        Venue.deleted_at.is_(None)).order_by(Venue.id.desc()).limit(10).all()
+    # SQL: SELECT id, name, upcoming_shows_count FROM venue WHERE deleted_at IS NULL ORDER BY id DESC LIMIT 10;
+    return {
+        "artist_data": [{"id": artist.id, "name": artist.name} for artist in artists],
+        "venue_data": [{"id": venue.id, "name": venue.name, "num_upcoming_shows": venue.upcoming_shows_count}
+                       for venue in venues]
+    }
@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "fyyur.db"}',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'BACKGROUND_THREADS': False,
+        'JINJA_BYTECODE_CACHE_DIR': None,
+        'PAGE_CACHE_BACKEND': 'memory',
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """
+    The SQL statements run by the test's own thread (requests made with the
+    test client run in it too); clear it before the request to count.
+    """
+    seen = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            seen.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield seen
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def add_venue(name, **fields):
+    values = dict(name=name, genres='Jazz', city='San Francisco', state='CA', address='1 Main St',
+                  seeking_talent=False, image_link=f'https://example.com/{name}.png')
+    values.update(fields)
+    venue = Venue(**values)
+    db.session.add(venue)
+    db.session.commit()
+    return venue
+
+
+def add_artist(name, **fields):
+    values = dict(name=name, genres='Jazz', city='San Francisco', state='CA', seeking_venue=False,
+                  image_link=f'https://example.com/{name}.png')
+    values.update(fields)
+    artist = Artist(**values)
+    db.session.add(artist)
+    db.session.commit()
+    return artist
+
+
+def add_show(venue, artist, start_time):
+    show = Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time)
+    db.session.add(show)
+    db.session.commit()
+    return show
@@ -0,0 +1,98 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import counters
+from cache import FileBackend, MemoryBackend
+from conftest import add_artist, add_show, add_venue
+from models import db, Show
+
+ARTIST_FORM = {
+    'name': 'Guns N Roses', 'city': 'San Francisco', 'state': 'CA', 'phone': '3265552424',
+    'genres': ['Rock n Roll'], 'facebook_link': 'https://www.facebook.com/gnr',
+    'website_link': 'https://gnr.example.com', 'image_link': 'https://example.com/gnr.png',
+}
+
+
+def test_editing_an_artist_clears_the_pages_of_its_venues(client):
+    venue = add_venue('The Musical Hop')
+    artist = add_artist('Guns N Petals')
+    add_show(venue, artist, datetime.now() + timedelta(days=7))
+    # requests close the session, detaching the rows added above
+    venue_id, artist_id = venue.id, artist.id
+
+    assert 'Guns N Petals' in client.get(f'/venues/{venue_id}').get_data(as_text=True)
+    # following the redirect shows (and so clears) the flash, which would make the next page bypass the cache
+    response = client.post(f'/artists/{artist_id}/edit', data=ARTIST_FORM, follow_redirects=True)
+    assert response.status_code == 200
+
+    page = client.get(f'/venues/{venue_id}').get_data(as_text=True)
+    assert 'Guns N Roses' in page
+    assert 'Guns N Petals' not in page
+
+
+def test_file_backend_sweeps_expired_entries(tmp_path):
+    backend = FileBackend(str(tmp_path), ttl=600)
+    backend.set('fresh', 'value')
+    backend.set('stale', 'value', ttl=1)
+    # a writer that died between mkstemp and the rename
+    orphan = tmp_path / f'abandoned{FileBackend.TMP_SUFFIX}'
+    orphan.write_bytes(b'')
+    assert len(backend) == 2
+
+    later = time.time() + FileBackend.TMP_MAX_AGE + 5
+    assert backend.sweep(now=later) == 2
+    assert backend.get('fresh') == 'value'
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(backend._path('fresh'))]
+
+
+def test_cards_are_rendered_again_when_their_entity_changes(client):
+    venue = add_venue('The Musical Hop')
+    artist = add_artist('Guns N Petals')
+    venue_id, artist_id = venue.id, artist.id
+    assert 'Upcoming Shows: 0' in client.get('/venues').get_data(as_text=True)
+    assert 'Guns N Petals' in client.get('/artists').get_data(as_text=True)
+
+    response = client.post(f'/artists/{artist_id}/edit', data=ARTIST_FORM, follow_redirects=True)
+    assert response.status_code == 200
+    assert 'Guns N Roses' in client.get('/artists').get_data(as_text=True)
+
+    show = Show(venue_id=venue_id, artist_id=artist_id, start_time=datetime.now() + timedelta(days=7))
+    db.session.add(show)
+    counters.record_new_show(show, datetime.now())
+    db.session.commit()
+
+    assert 'Upcoming Shows: 1' in client.get('/venues').get_data(as_text=True)
+    page = client.get('/shows').get_data(as_text=True)
+    assert 'Guns N Roses' in page
+    assert f'/venues/{venue_id}' in page
+
+
+def test_fragment_keys_with_colons_do_not_collide(app):
+    template = "{% cache (kind, 'x') %}{{ kind }}{% endcache %}"
+    with app.test_request_context():
+        assert app.jinja_env.from_string(template).render(kind='a:b') == 'a:b'
+        assert app.jinja_env.from_string("{% cache ('a', 'b:x') %}other{% endcache %}").render() == 'other'
+
+
+def test_namespaces_have_their_own_budget(tmp_path):
+    pages = MemoryBackend(maxsize=2)
+    pages.set('venue:1', 'page')
+    fragments = pages.namespace('fragments', 2)
+    for i in range(10):
+        fragments.set(f'card:{i}', 'card')
+    assert pages.get('venue:1') == 'page'
+    assert len(fragments) == 2
+
+    pages = FileBackend(str(tmp_path), ttl=600)
+    pages.set('venue:1', 'page')
+    fragments = pages.namespace('fragments', 4)
+    for i in range(10):
+        fragments.set(f'card:{i}', 'card', ttl=600 + i)
+    assert pages.get('venue:1') == 'page'
+    assert len(pages) == 1
+    fragments.sweep()
+    # the entries closest to expiring go first
+    assert len(fragments) == 4
+    assert fragments.get('card:9') == 'card'
+    assert fragments.get('card:0') is None
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+import deletions
+import jobs
+from conftest import add_artist, add_show, add_venue
+from models import DeletionJob, Venue
+
+LEASE = timedelta(seconds=300)
+
+
+def test_failed_deletions_back_off_and_can_be_retried(app, client, monkeypatch):
+    app.config.update(JOBS_MAX_ATTEMPTS=3, JOBS_RETRY_BASE=30, DELETION_BATCH_PAUSE=0)
+    venue = add_venue('The Musical Hop')
+    add_show(venue, add_artist('Guns N Petals'), datetime.now() + timedelta(days=7))
+    venue_id = venue.id
+
+    response = client.delete(f'/venues/{venue_id}')
+    assert response.status_code == 202
+    deletion_id = DeletionJob.query.filter_by(entity_id=venue_id).one().id
+    assert response.get_json()['status_url'] == f'/deletions/{deletion_id}'
+
+    def fail(job, batch_size, pause):
+        raise RuntimeError('gone')
+
+    run_job = deletions.run_job
+    monkeypatch.setattr(deletions, 'run_job', fail)
+    now = datetime.now()
+    for wait in (30, 60):
+        [job_id] = jobs.claim('worker', now, LEASE, 5)
+        assert jobs.execute(job_id, 'worker', now) == 'pending'
+        # not due again until the backoff has passed
+        assert jobs.claim('worker', now + timedelta(seconds=wait - 1), LEASE, 5) == []
+        now += timedelta(seconds=wait)
+    assert jobs.claim('worker', now, LEASE, 5) == [job_id]
+    assert jobs.execute(job_id, 'worker', now) == 'failed'
+    status = client.get(f'/deletions/{deletion_id}').get_json()
+    assert (status['status'], status['attempts'], status['error']) == ('failed', 3, 'RuntimeError: gone')
+
+    assert client.post(f'/deletions/{deletion_id}/retry').status_code == 202
+    assert client.post(f'/deletions/{deletion_id}/retry').status_code == 409
+    assert client.get(f'/deletions/{deletion_id}').get_json()['attempts'] == 0
+
+    monkeypatch.setattr(deletions, 'run_job', run_job)
+    assert jobs.claim('worker', datetime.now(), LEASE, 5) == [job_id]
+    assert jobs.execute(job_id, 'worker') == 'done'
+    status = client.get(f'/deletions/{deletion_id}').get_json()
+    assert (status['status'], status['removed_shows']) == ('done', 1)
+    assert Venue.query.get(venue_id) is None
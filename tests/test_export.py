@@ -0,0 +1,28 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+
+from conftest import add_artist, add_show, add_venue
+
+
+def test_show_export_has_end_times(client):
+    start = datetime(2030, 5, 21, 21, 30)
+    show = add_show(add_venue('The Musical Hop'), add_artist('Guns N Petals'), start)
+    end = show.end_time
+
+    response = client.get('/export/shows.csv?gzip=0')
+    assert response.headers.get('Content-Encoding') is None
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    header, row = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert header[:3] == ['id', 'start_time', 'end_time']
+    assert row[1:3] == [start.isoformat(), end.isoformat()]
+
+
+def test_gzip_follows_the_flag_then_accept_encoding(client):
+    assert client.get('/export/venues.csv?gzip=1').headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in client.get('/export/venues.csv?gzip=0',
+                                                headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get('/export/venues.csv', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.get_data()).startswith(b'id,name')
+    assert 'Content-Encoding' not in client.get('/export/venues.csv').headers
@@ -0,0 +1,28 @@
+import pytest
+
+import importer
+from models import Venue
+
+
+def venue(name, city):
+    return {'name': name, 'city': city, 'state': 'CA', 'address': '1 Main St', 'phone': '4155550100',
+            'genres': ['Jazz'], 'image_link': 'https://example.com/venue.png',
+            'website_link': 'https://example.com', 'facebook_link': 'https://www.facebook.com/venue'}
+
+
+@pytest.mark.parametrize('on_conflict', [True, False])
+def test_batch_upsert_creates_then_updates_by_name(app, client, monkeypatch, on_conflict):
+    if not on_conflict:
+        # databases without INSERT ... ON CONFLICT
+        monkeypatch.setattr(importer, '_upsert_statement', lambda table, records: None)
+
+    response = client.post('/api/venues:batch', json=[venue('The Musical Hop', 'San Francisco')])
+    assert response.status_code == 200, response.get_json()
+    [created] = response.get_json()['results']
+    assert created['status'] == 'created'
+
+    response = client.post('/api/venues:batch', json=[venue('The Musical Hop', 'Oakland'),
+                                                      venue('Park Square Live Music', 'San Francisco')])
+    assert [result['status'] for result in response.get_json()['results']] == ['updated', 'created']
+    updated = Venue.query.get(created['id'])
+    assert (updated.city, updated.version) == ('Oakland', 2)
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from models import db, Job, JobArchive
+
+LEASE = timedelta(seconds=300)
+
+
+@pytest.fixture
+def failures():
+    # exceptions the next runs of the 'test' task raise, in order
+    return []
+
+
+@pytest.fixture
+def calls(monkeypatch, failures):
+    """
+    The args of each run of the 'test' task, which is registered for the
+    test's duration.
+    """
+    seen = []
+
+    def run(**args):
+        seen.append(args)
+        if failures:
+            raise failures.pop(0)
+
+    monkeypatch.setitem(jobs.TASKS, 'test', (run, None))
+    return seen
+
+
+def test_a_due_job_is_claimed_by_one_worker(app, calls):
+    now = datetime.now()
+    due = jobs.enqueue('test', {'n': 1}, now=now).id
+    jobs.enqueue('test', {'n': 2}, run_at=now + timedelta(minutes=5), now=now)
+    db.session.commit()
+
+    assert jobs.claim('a', now, LEASE, 5) == [due]
+    assert jobs.claim('b', now, LEASE, 5) == []
+    job = Job.query.get(due)
+    assert (job.status, job.attempts, job.locked_by) == ('running', 1, 'a')
+
+    assert jobs.execute(due, 'a', now) == 'done'
+    assert calls == [{'n': 1}]
+    assert Job.query.get(due).locked_by is None
+
+
+def test_a_job_whose_lease_ran_out_is_taken_over(app, calls):
+    now = datetime.now()
+    job_id = jobs.enqueue('test', now=now).id
+    db.session.commit()
+    assert jobs.claim('a', now, LEASE, 5) == [job_id]
+
+    # still leased to a
+    assert jobs.claim('b', now + LEASE - timedelta(seconds=1), LEASE, 5) == []
+    later = now + LEASE + timedelta(seconds=1)
+    assert jobs.claim('b', later, LEASE, 5) == [job_id]
+    assert Job.query.get(job_id).attempts == 2
+
+    # a finishing late records nothing over b's attempt
+    assert jobs.execute(job_id, 'a', later) is None
+    assert Job.query.get(job_id).status == 'running'
+    assert jobs.execute(job_id, 'b', later) == 'done'
+
+
+def test_a_job_whose_workers_keep_stopping_fails(app, calls):
+    now = datetime.now()
+    job_id = jobs.enqueue('test', max_attempts=1, now=now).id
+    db.session.commit()
+    assert jobs.claim('a', now, LEASE, 5) == [job_id]
+
+    assert jobs.claim('b', now + LEASE * 2, LEASE, 5) == []
+    job = Job.query.get(job_id)
+    assert (job.status, job.error) == ('failed', 'a stopped while running the job.')
+    assert calls == []
+
+
+def test_failing_jobs_back_off_then_fail(app, calls, failures):
+    app.config.update(JOBS_RETRY_BASE=30, JOBS_RETRY_MAX=45)
+    now = datetime.now()
+    job_id = jobs.enqueue('test', max_attempts=3, now=now).id
+    db.session.commit()
+    failures.extend([RuntimeError('first'), RuntimeError('second'), RuntimeError('third')])
+
+    # 30 seconds after the first failure, then doubling, capped at JOBS_RETRY_MAX
+    for wait in (30, 45):
+        assert jobs.claim('a', now, LEASE, 5) == [job_id]
+        assert jobs.execute(job_id, 'a', now) == 'pending'
+        assert jobs.claim('a', now + timedelta(seconds=wait - 1), LEASE, 5) == []
+        now += timedelta(seconds=wait)
+    assert jobs.claim('a', now, LEASE, 5) == [job_id]
+    assert jobs.execute(job_id, 'a', now) == 'failed'
+    job = Job.query.get(job_id)
+    assert (job.attempts, job.error) == (3, 'RuntimeError: third')
+
+    assert jobs.requeue(job_id, now)
+    db.session.commit()
+    assert not jobs.requeue(job_id, now)
+    assert jobs.claim('a', now, LEASE, 5) == [job_id]
+    assert jobs.execute(job_id, 'a', now) == 'done'
+
+
+def test_a_scheduled_run_is_queued_once_per_slot(app, calls):
+    now = datetime(2026, 10, 18, 12, 0, 10)
+    slot = jobs.enqueue_scheduled('test', 60, now)
+    # another worker, later in the same minute
+    assert jobs.enqueue_scheduled('test', 60, now + timedelta(seconds=40)) == slot
+    assert Job.query.count() == 1
+    assert Job.query.one().key == f'test@{slot.isoformat()}'
+
+    jobs.enqueue_scheduled('test', 60, now + timedelta(seconds=60))
+    assert Job.query.count() == 2
+
+
+def test_finished_jobs_are_archived(app, calls):
+    old = datetime.now() - timedelta(days=10)
+    finished = jobs.enqueue('test', now=old)
+    finished.status, finished.finished_at = 'done', old
+    pending = jobs.enqueue('test', now=old)
+    recent = jobs.enqueue('test')
+    recent.status, recent.finished_at = 'failed', datetime.now()
+    db.session.commit()
+    finished_id, pending_id, recent_id = finished.id, pending.id, recent.id
+
+    jobs.archive_jobs_task(days=7, batch_size=1)
+    assert {job.id for job in Job.query} == {pending_id, recent_id}
+    archived = JobArchive.query.one()
+    assert (archived.id, archived.name, archived.status) == (finished_id, 'test', 'done')
+
+
+def test_jobs_cli(app, calls, failures):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['jobs', 'enqueue', 'test', '--args', '{"n": 3}'])
+    assert result.exit_code == 0, result.output
+    job_id = Job.query.one().id
+    assert result.output == f'Queued job {job_id}.\n'
+    assert runner.invoke(args=['jobs', 'enqueue', 'nope']).exit_code != 0
+    assert runner.invoke(args=['jobs', 'enqueue', 'test', '--args', '[]']).exit_code != 0
+
+    assert 'test' in runner.invoke(args=['jobs', 'tasks']).output
+    assert '1 pending' in runner.invoke(args=['jobs', 'list', '--status', 'pending']).output
+
+    # only failed jobs can be retried
+    assert runner.invoke(args=['jobs', 'retry', str(job_id)]).exit_code != 0
+    failures.append(RuntimeError('boom'))
+    assert jobs.claim('a', datetime.now(), LEASE, 5) == [job_id]
+    Job.query.filter_by(id=job_id).update({Job.max_attempts: 1})
+    db.session.commit()
+    assert jobs.execute(job_id, 'a') == 'failed'
+    assert 'error: RuntimeError: boom' in runner.invoke(args=['jobs', 'list']).output
+    result = runner.invoke(args=['jobs', 'retry', str(job_id)])
+    assert result.output == f'Job {job_id} will run again.\n'
+    assert Job.query.get(job_id).status == 'pending'
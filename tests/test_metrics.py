@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+from metrics import ARCHIVE, Registry
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write(directory, pid, started, requests, in_flight):
+    with open(os.path.join(directory, f'metrics_{pid}_{started}.json'), 'w') as f:
+        json.dump([['fyyur_http_requests_total', ['index', 'GET', '200'], requests],
+                   ['fyyur_http_requests_in_flight', ['index'], in_flight]], f)
+
+
+def test_exited_workers_are_folded_into_the_archive(tmp_path):
+    directory = str(tmp_path)
+    registry = Registry(directory, 1.0)
+    registry.inc('fyyur_http_requests_total', ['index', 'GET', '200'], 1)
+    # an exited worker, and one that exited before this process took over its pid
+    write(directory, exited_pid(), 1, 10, 3)
+    write(directory, os.getpid(), 1, 100, 5)
+
+    for _ in range(2):
+        totals = registry.collect()
+        assert totals[('fyyur_http_requests_total', ('index', 'GET', '200'))] == 111
+        assert ('fyyur_http_requests_in_flight', ('index',)) not in totals
+        assert sorted(name for name in os.listdir(directory) if name.endswith('.json')) == sorted(
+            [ARCHIVE, os.path.basename(registry._path())])
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from conftest import add_artist, add_show, add_venue
+
+
+def seed():
+    venue = add_venue('The Musical Hop')
+    artist = add_artist('Guns N Petals')
+    other_venue = add_venue('Park Square Live Music & Coffee')
+    other_artist = add_artist('Matt Quevedo')
+    now = datetime.now()
+    for days in (-30, -7, 7, 30):
+        add_show(venue, artist, now + timedelta(days=days))
+    add_show(venue, other_artist, now - timedelta(days=14))
+    add_show(other_venue, artist, now + timedelta(days=14))
+    # requests close the session, detaching the rows added above
+    return venue.id, artist.id
+
+
+def test_venue_page_runs_one_statement(client, statements):
+    venue_id, _ = seed()
+
+    del statements[:]
+    response = client.get(f'/venues/{venue_id}')
+
+    assert response.status_code == 200
+    # the venue, its shows and their artists come from one joined query, not a lazy load per show
+    assert len(statements) == 1
+    assert 'JOIN artist' in statements[0]
+    page = response.get_data(as_text=True)
+    assert '2 Upcoming Shows' in page
+    assert '3 Past Shows' in page
+    assert 'Matt Quevedo' in page
+
+
+def test_artist_page_runs_one_statement(client, statements):
+    _, artist_id = seed()
+
+    del statements[:]
+    response = client.get(f'/artists/{artist_id}')
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert 'JOIN venue' in statements[0]
+    page = response.get_data(as_text=True)
+    assert '3 Upcoming Shows' in page
+    assert '2 Past Shows' in page
+    assert 'Park Square Live Music &amp; Coffee' in page
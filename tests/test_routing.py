@@ -0,0 +1,84 @@
+import shutil
+import time
+
+import pytest
+
+import routing
+from app import create_app
+from conftest import add_venue
+from models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+        'READ_REPLICAS_ENABLED': True,
+        'SQLALCHEMY_REPLICA_URIS': [f'sqlite:///{replica}'],
+        'REPLICA_PIN_SECONDS': 10,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'BACKGROUND_THREADS': False,
+        'JINJA_BYTECODE_CACHE_DIR': None,
+        'PAGE_CACHE_BACKEND': 'memory',
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+    })
+    with app.app_context():
+        db.create_all()
+        add_venue('The Musical Hop')
+        # the replica is a copy of the primary that hasn't caught up with what follows
+        db.session.remove()
+        db.get_engine(app).dispose()
+        shutil.copy(primary, replica)
+        add_venue('Only On The Primary')
+        yield app
+        db.session.remove()
+
+
+def test_reads_go_to_the_replica(client):
+    page = client.get('/venues').get_data(as_text=True)
+
+    assert 'The Musical Hop' in page
+    assert 'Only On The Primary' not in page
+
+
+def test_the_client_that_wrote_reads_from_the_primary(app, monkeypatch):
+    writer, other = app.test_client(), app.test_client()
+
+    response = writer.delete('/venues/1')
+    assert response.status_code == 202
+
+    # the deletion and the venue added after the copy are only on the primary
+    page = writer.get('/venues').get_data(as_text=True)
+    assert 'The Musical Hop' not in page
+    assert 'Only On The Primary' in page
+    page = other.get('/venues').get_data(as_text=True)
+    assert 'The Musical Hop' in page
+    assert 'Only On The Primary' not in page
+
+    # once REPLICA_PIN_SECONDS have passed, the writer is back on the replica
+    now = time.time()
+    monkeypatch.setattr(routing.time, 'time', lambda: now + 11)
+    page = writer.get('/venues').get_data(as_text=True)
+    assert 'The Musical Hop' in page
+
+
+def test_replica_pages_do_not_refill_the_cache_after_an_edit(app):
+    from app import page_cache
+    from models import Venue
+    writer, other = app.test_client(), app.test_client()
+    assert 'The Musical Hop' in other.get('/venues/1').get_data(as_text=True)
+
+    # an edit the replica hasn't caught up with yet
+    Venue.query.filter_by(id=1).update({Venue.name: 'The Musical Hop Reopened'})
+    db.session.commit()
+    page_cache.invalidate('venue:1')
+    assert 'Reopened' not in other.get('/venues/1').get_data(as_text=True)
+    assert page_cache.get('venue:1') is None
+
+    # a client pinned to the primary skips the cache, and its page may fill it
+    assert writer.delete('/venues/2').status_code == 202
+    page_cache.set('venue:1', 'stale')
+    assert 'Reopened' in writer.get('/venues/1').get_data(as_text=True)
+    assert 'Reopened' in page_cache.get('venue:1')
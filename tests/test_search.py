@@ -0,0 +1,17 @@
+import search
+from conftest import add_artist, add_venue
+from models import Venue
+
+
+def test_commas_only_search_known_locations(app):
+    add_venue('The Musical Hop', city='San Francisco', state='CA', genres='Jazz,Blues')
+    add_artist('Guns N Petals', city='New York', state='NY')
+
+    assert search.parse_query('San Francisco, CA', Venue) == search.SearchQuery([], 'San Francisco', 'CA')
+    assert search.parse_query(', ca', Venue) == search.SearchQuery([], None, 'ca')
+    # New York only has an artist
+    assert search.parse_query('New York, NY', Venue).terms == ['new', 'york', 'ny']
+    assert search.parse_query('Jazz, Blues', Venue).terms == ['jazz', 'blues']
+
+    venues, total = search.search(Venue, 'musical, hop', 10)
+    assert (total, venues[0].name) == (1, 'The Musical Hop')
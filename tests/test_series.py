@@ -0,0 +1,62 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import add_artist, add_venue
+from models import db, Show
+
+
+@pytest.fixture
+def csrf_token(app, client):
+    # the series form renders its csrf_token field, which only exists with CSRF on
+    app.config['WTF_CSRF_ENABLED'] = True
+    page = client.get('/series/create').get_data(as_text=True)
+    return re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+
+def series_form(csrf_token, artist_id, venue_id):
+    start = (datetime.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+    return {'csrf_token': csrf_token, 'artist_id': artist_id, 'venue_id': venue_id,
+            'start_time': f'{start:%Y-%m-%d %H:%M:%S}', 'duration': 120, 'frequency': 'weekly',
+            'every': 1, 'count': 3}
+
+
+def test_non_numeric_ids_fail_validation(client, csrf_token):
+    venue_id = add_venue('The Musical Hop').id
+
+    response = client.post('/series/create', data=series_form(csrf_token, 'guns', venue_id))
+
+    assert response.status_code == 400
+    assert Show.query.count() == 0
+
+
+def test_series_is_created_and_cancelled(client, csrf_token):
+    artist_id = add_artist('Guns N Petals').id
+    venue_id = add_venue('The Musical Hop').id
+
+    response = client.post('/series/create', data=series_form(csrf_token, artist_id, venue_id))
+    assert response.status_code == 302
+    assert Show.query.count() == 3
+
+    response = client.delete(response.headers['Location'])
+    assert response.status_code == 200
+    assert response.get_json()['deleted'] == 3
+
+
+def test_rows_a_constraint_rejects_are_reported_as_conflicts(app, monkeypatch):
+    import series
+    artist_id = add_artist('Guns N Petals').id
+    venue_id = add_venue('The Musical Hop').id
+    start = datetime(2030, 5, 21, 21, 30)
+    db.session.add(Show(artist_id=artist_id, venue_id=venue_id, start_time=start + timedelta(weeks=1)))
+    db.session.commit()
+    # as if the show was booked after the overlap check: only UX_Artist_Venue catches it
+    monkeypatch.setattr(series.bookings, 'find_conflicts_many', lambda *args, **kwargs: {})
+
+    _, created, conflicts = series.create(artist_id, venue_id, 'weekly', start, timedelta(hours=2), count=3)
+    db.session.commit()
+
+    assert created == 2
+    assert conflicts == {start + timedelta(weeks=1): [('venue', None)]}
+    assert Show.query.count() == 3
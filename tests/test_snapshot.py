@@ -0,0 +1,24 @@
+import snapshot
+from app import home_snapshot
+
+
+def test_stale_snapshot_is_not_served(monkeypatch):
+    home = snapshot.Snapshot(lambda: {'venue_data': []})
+    # not built yet: only the short first wait is spent
+    assert home.get(0.1, 300) is None
+
+    home.data, home.built_at = home.build(), snapshot.time.monotonic()
+    home.ready.set()
+    assert home.get(0.1, 300) == {'venue_data': []}
+
+    # past the staleness limit the snapshot isn't served, and the refresher is woken for another try
+    monkeypatch.setattr(snapshot.time, 'monotonic', lambda: home.built_at + 301)
+    assert home.get(0.1, 300) is None
+    assert home.wake.is_set()
+
+
+def test_home_page_answers_503_without_a_snapshot(app, client, monkeypatch):
+    app.config['HOME_SNAPSHOT_FIRST_WAIT'] = 0.1
+    monkeypatch.setattr(home_snapshot, 'ready', snapshot.threading.Event())
+
+    assert client.get('/').status_code == 503
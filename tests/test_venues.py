@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from conftest import add_venue
+
+
+def test_venues_listing_runs_one_statement(client, statements):
+    add_venue('The Musical Hop', upcoming_shows_count=2)
+    add_venue('Park Square Live Music & Coffee', city='New York', state='NY', upcoming_shows_count=1)
+    add_venue('The Dueling Pianos Bar', upcoming_shows_count=0)
+    add_venue('Closed Down', deleted_at=datetime(2026, 1, 1))
+
+    del statements[:]
+    response = client.get('/venues')
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert 'upcoming_shows_count' in statements[0]
+    page = response.get_data(as_text=True)
+    assert 'The Musical Hop' in page
+    assert 'Park Square Live Music &amp; Coffee' in page
+    assert 'Closed Down' not in page
+    # areas are grouped by state and city in one pass over the sorted rows
+    assert page.index('San Francisco') < page.index('The Dueling Pianos Bar')